@@ -1,6 +1,8 @@
 import backtrader as bt
 import pandas as pd
 
+from volatility_regime_bt import VolatilityRegime
+
 class PandasData(bt.feeds.PandasData):
     params = (
         ('datetime', 'datetime'),
@@ -41,7 +43,8 @@ class ImprovedStrategy(bt.Strategy):
         self.crossover = bt.indicators.CrossOver(self.ma_short, self.ma_mid)
         
         # ATR和成交量过滤器
-        self.atr = bt.indicators.ATR(self.data, period=self.p.atr_period)
+        self.vol = VolatilityRegime(self.data, atr_period=self.p.atr_period)
+        self.atr = self.vol.atr
         self.volume_ma = bt.indicators.SMA(self.data.volume, period=20)
         
         # 记录上一次的MA值用于计算斜率
@@ -59,7 +62,7 @@ class ImprovedStrategy(bt.Strategy):
             return
             
         # 检查波动是否正常
-        if self.atr[0] > self.data.close[0] * self.p.atr_thresh / 100:
+        if self.vol.atr_pct[0] > self.p.atr_thresh:
             return
         
         # 判断趋势（通过25H MA的斜率）
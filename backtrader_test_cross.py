@@ -5,7 +5,8 @@ import os.path  # To manage paths
 import sys  # To find out the script name (in argv[0])
 import backtrader as bt
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from volatility_regime_bt import VolatilityRegime
 
 class DualMAStrategy(bt.Strategy):
     params = (
@@ -15,6 +16,7 @@ class DualMAStrategy(bt.Strategy):
         ('trend_thresh', 0),    # 趋势判断阈值
         ('atr_period', 40),     # ATR周期
         ('atr_thresh', 30),    # ATR阈值（百分比）
+        ('instrument', None),  # instruments.Instrument，设置后按合约张数取整下单数量
     )
 
     def log(self, txt, dt=None):
@@ -40,8 +42,9 @@ class DualMAStrategy(bt.Strategy):
         # 趋势判断
         self.trend_slope = (self.trend_ma - self.trend_ma(-1)) / self.trend_ma(-1) * 100
         
-        # ATR
-        self.atr = bt.indicators.ATR(self.data, period=self.params.atr_period)
+        # ATR及波动率状态（整段数据向量化预计算）
+        self.vol = VolatilityRegime(self.data, atr_period=self.params.atr_period)
+        self.atr = self.vol.atr
 
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
@@ -73,7 +76,7 @@ class DualMAStrategy(bt.Strategy):
             return
 
         # 检查波动率是否过大
-        if self.atr[0] >self.dataclose[0] * self.params.atr_thresh / 100:
+        if self.vol.atr_pct[0] > self.params.atr_thresh:
             return
             
         if not self.position:  # 没有持仓
@@ -86,7 +89,10 @@ class DualMAStrategy(bt.Strategy):
                 # 计算购买数量
                 cash = self.broker.getcash()
                 size = cash * 0.75 / self.dataclose[0]  # 使用95%的现金
-                size = round(size, 3)  # 四舍五入到3位小数
+                if self.p.instrument is not None:
+                    size = self.p.instrument.round_size(size, self.dataclose[0])
+                else:
+                    size = round(size, 3)  # 四舍五入到3位小数
                 
                 if size > 0.001:  # 确保交易量大于最小限制
                     self.log(f'BUY CREATE, Price: {self.dataclose[0]:.2f}, Size: {size:.3f}, Cash: {cash:.2f}')
@@ -106,6 +112,8 @@ class DualMAStrategy(bt.Strategy):
 
 
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
     cerebro = bt.Cerebro()
     
     # 添加策略
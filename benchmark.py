@@ -0,0 +1,282 @@
+"""
+性能基准：数据读取、指标计算和整段回测的吞吐量（K线/秒）与峰值内存
+    python benchmark.py                          # 运行全部用例并与基准比较
+    python benchmark.py --cases higher_low_fast --sizes 10000 100000
+    python benchmark.py --save                   # 把本次结果写入基准文件
+与基准相比吞吐量下降或内存增加超过 --tolerance（默认30%）的用例记为回退，退出码为1
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BASELINE_FILE = 'benchmark_baseline.json'
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+
+def synthetic_frame(n, seed=0):
+    """合成1分钟K线（GBM + 跳跃 + 波动率状态），结果只取决于seed"""
+    from synthetic_data import generate_frame
+    return generate_frame(n, seed=seed)
+
+
+def fixture_frame(n, inst_id='DOGE-USDT-SWAP'):
+    """本地真实K线，不够n根时循环拼接（时间戳顺延）"""
+    from candle_store import CandleStore
+
+    store = CandleStore()
+    dates = store.dates(inst_id)
+    if not dates:
+        return None
+    df = store.load_frame(inst_id, dates[0], dates[-1])
+    if len(df) >= n:
+        return df.iloc[:n].reset_index(drop=True)
+    reps = -(-n // len(df))
+    span = df['datetime'].iloc[-1] - df['datetime'].iloc[0] + pd.Timedelta(minutes=1)
+    parts = []
+    for k in range(reps):
+        part = df.copy()
+        part['datetime'] = part['datetime'] + span * k
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True).iloc[:n]
+
+
+# ---------------- 用例 ----------------
+# 每个用例: (名称, 最大K线数(None不限), setup(df) -> 状态, run(状态) -> None)
+# setup 不计时；run 计时并统计峰值内存
+
+def _setup_files(df):
+    """把数据按天写成CSV，返回(临时仓库, instId, 起止日期)"""
+    import atexit
+    import shutil
+    import tempfile
+    from candle_store import CandleStore
+
+    root = tempfile.mkdtemp(prefix='okxbench_')
+    atexit.register(shutil.rmtree, root, True)
+    store = CandleStore(root)
+    inst_id = 'BENCH-USDT-SWAP'
+    os.makedirs(store.folder(inst_id), exist_ok=True)
+    days = df['datetime'].dt.strftime('%Y%m%d')
+    for day, part in df.groupby(days):
+        out = part.copy()
+        out['datetime'] = out['datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        out.to_csv(store.path(inst_id, day), index=False)
+    return root, inst_id, days.iloc[0], days.iloc[-1]
+
+
+def load_csv_setup(df):
+    return _setup_files(df)
+
+
+def load_csv_run(state):
+    from candle_store import CandleStore
+    root, inst_id, start, end = state
+    CandleStore(root, cache=False).load(inst_id, start, end)
+
+
+def load_npy_setup(df):
+    from candle_store import CandleStore
+    state = _setup_files(df)
+    root, inst_id, start, end = state
+    CandleStore(root).load(inst_id, start, end)   # 生成 .npy 缓存
+    return state
+
+
+def load_npy_run(state):
+    from candle_store import CandleStore
+    root, inst_id, start, end = state
+    CandleStore(root).load(inst_id, start, end)
+
+
+def pivots_run(df):
+    from pivot_points import PivotPointsFinder
+    PivotPointsFinder(n_period=40, std_multiplier=2.0, min_gap=10).find_pivot_points(df.copy())
+
+
+def bollinger_run(df):
+    from pivot_detector import bollinger_bands
+    bollinger_bands(df['close'].to_numpy(), 40, 2.0)
+
+
+def fast_bollinger_setup(df):
+    import fast_engine as fe
+    return fe.DataFeed.from_dataframe(df)
+
+
+def fast_bollinger_run(feed):
+    import fast_engine as fe
+    ind = fe.BollingerBands(feed, period=40, devfactor=2.0)
+    ind.compute(feed.size)
+
+
+def _bt_data(df):
+    import backtrader as bt
+    return bt.feeds.PandasData(dataname=df, datetime='datetime', open='open', high='high',
+                               low='low', close='close', volume='vol', openinterest=None)
+
+
+def bt_bollinger_run(df):
+    import backtrader as bt
+
+    class Bands(bt.Strategy):
+        def __init__(self):
+            self.boll = bt.indicators.BollingerBands(self.data, period=40, devfactor=2.0)
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.addstrategy(Bands)
+    cerebro.adddata(_bt_data(df))
+    cerebro.run()
+
+
+def regression_run(df):
+    import backtrader as bt
+    from btc_regression_trend import LinearRegressionStrategy
+
+    class Trend(LinearRegressionStrategy):
+        # 只测detect_trend，不下单
+        def next(self):
+            self.detect_trend()
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.addstrategy(Trend)
+    cerebro.adddata(_bt_data(df))
+    cerebro.run()
+
+
+def higher_low_fast_run(df):
+    from higher_low_fast import run_fast_backtest
+    run_fast_backtest(df)
+
+
+def higher_low_bt_run(df):
+    from okxquant import run_backtrader
+    run_backtrader(df, 'DOGE-USDT-SWAP')
+
+
+def higher_low_kernel_run(df):
+    from higher_low_kernel import higher_low_signals
+    higher_low_signals(df)
+
+
+CASES = {
+    'load_csv': (None, load_csv_setup, load_csv_run),
+    'load_npy': (None, load_npy_setup, load_npy_run),
+    'pivots': (None, None, pivots_run),
+    'bollinger': (None, None, bollinger_run),
+    'bollinger_fast': (None, fast_bollinger_setup, fast_bollinger_run),
+    'bollinger_bt': (100000, None, bt_bollinger_run),
+    'detect_trend': (10000, None, regression_run),
+    'higher_low_fast': (None, None, higher_low_fast_run),
+    'higher_low_bt': (100000, None, higher_low_bt_run),
+    'higher_low_kernel': (None, None, higher_low_kernel_run),
+}
+
+
+def measure(run, state, repeat):
+    """
+    第一次运行统计峰值内存（tracemalloc），之后至少repeat次取最短耗时；
+    很快的用例重复到累计0.5秒（最多100次），减少计时抖动
+    """
+    gc.collect()
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = float('inf')
+    total = 0.0
+    runs = 0
+    while runs < repeat or (total < 0.5 and runs < 100):
+        gc.collect()
+        t0 = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - t0
+        best = min(best, elapsed)
+        total += elapsed
+        runs += 1
+    return best, peak
+
+
+def run_suite(cases, sizes, source='synthetic', repeat=3, full=False, seed=0):
+    """返回 {用例@K线数: {seconds, bars_per_sec, peak_mb}}"""
+    results = {}
+    frames = {}
+    for n in sizes:
+        df = fixture_frame(n) if source == 'fixture' else None
+        frames[n] = df if df is not None else synthetic_frame(n, seed)
+    for name in cases:
+        max_bars, setup, run = CASES[name]
+        for n in sizes:
+            if max_bars and n > max_bars and not full:
+                continue
+            state = setup(frames[n]) if setup else frames[n]
+            # 大数据量的慢用例只计时一次
+            seconds, peak = measure(run, state, repeat if n <= 100000 else 1)
+            key = f'{name}@{n}'
+            results[key] = {'seconds': seconds, 'bars_per_sec': n / seconds, 'peak_mb': peak / 2 ** 20}
+            print(f"{key:<28}{seconds:>10.3f}s{n / seconds:>14,.0f} K线/秒{peak / 2 ** 20:>10.1f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """与基准比较，返回回退的用例列表"""
+    regressions = []
+    for key, row in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        ratio = row['bars_per_sec'] / base['bars_per_sec']
+        mem_ratio = row['peak_mb'] / base['peak_mb'] if base['peak_mb'] else 1.0
+        flag = ''
+        if ratio < 1 - tolerance or mem_ratio > 1 + tolerance:
+            flag = '  <-- 回退'
+            regressions.append(key)
+        print(f"{key:<28}吞吐 {ratio:>6.2f}x  内存 {mem_ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='数据读取/指标/回测性能基准')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument('--source', choices=('synthetic', 'fixture'), default='synthetic',
+                        help='synthetic=随机生成, fixture=本地DOGE 1分钟K线')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--full', action='store_true', help='backtrader用例也跑最大数据量')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save', action='store_true', help='把结果写入基准文件')
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.cases, args.sizes, args.source, args.repeat, args.full)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if args.save:
+        baseline.setdefault('results', {}).update(results)
+        baseline['machine'] = {'python': sys.version.split()[0], 'platform': platform.platform(),
+                               'numpy': np.__version__, 'pandas': pd.__version__}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"基准已保存到 {args.baseline}")
+        return 0
+    if not baseline:
+        print("没有基准文件，使用 --save 生成")
+        return 0
+    regressions = compare(results, baseline.get('results', {}), args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} 个用例性能回退")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,26 @@
 import backtrader as bt
 import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
+
+from regression_trend import RegressionTrend
 
 class LinearRegressionStrategy(bt.Strategy):
     params = (
         ('window', 260),           # 回归窗口
-        ('slope_thresh', 0.2),    # 斜率阈值
+        ('slope_thresh', 0.2),    # 斜率阈值，单位由slope_mode决定
+        ('slope_mode', 'abs'),    # abs=价格/每根K线, pct=占收盘价%/每根K线, atr=ATR倍数/每根K线
+        ('min_r2', 0.0),          # R²低于此值视为无趋势
         ('stop_loss', 0.05),      # 5%止损
         ('trailing_stop', 0.01),   # 2%移动止损
         ('break_even', 0.01),      # 1%保本线
+        ('instrument', None),      # instruments.Instrument，设置后按合约张数取整下单数量
     )
 
     def __init__(self):
         self.dataclose = self.datas[0].close
         self.order = None
+        self.trend = RegressionTrend(self.datas[0], window=self.p.window)
+        self.slope_line = {'abs': self.trend.slope, 'pct': self.trend.slope_pct,
+                           'atr': self.trend.slope_atr}[self.p.slope_mode]
         self.buyprice = None
         self.buycomm = None
         
@@ -35,15 +41,10 @@ class LinearRegressionStrategy(bt.Strategy):
     def detect_trend(self):
         if len(self) < self.params.window:
             return 0
-        
-        prices = np.array([self.dataclose.get(i, size=1)[0] 
-                          for i in range(-self.params.window+1, 1)])
-        x = np.arange(self.params.window).reshape(-1, 1)
-        y = prices.reshape(-1, 1)
-        
-        lr = LinearRegression().fit(x, y)
-        slope = lr.coef_[0][0]
-        
+
+        slope = self.slope_line[0]
+        if self.trend.r2[0] < self.params.min_r2:
+            return 0
         if slope > self.params.slope_thresh:
             return 1
         elif slope < -self.params.slope_thresh:
@@ -102,6 +103,8 @@ class LinearRegressionStrategy(bt.Strategy):
         else:
             if self.current_trend > 0:  # 上升趋势买入
                 size = 0.5  # 使用固定仓位
+                if self.p.instrument is not None:
+                    size = self.p.instrument.round_size(size, self.dataclose[0])
                 self.log(f'BUY CREATE, Price: {self.dataclose[0]:.2f}, Size: {size:.3f}')
                 self.order = self.buy(size=size)
 
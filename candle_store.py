@@ -0,0 +1,111 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+CANDLE_DTYPE = np.dtype([
+    ('ts', 'i8'),       # 毫秒时间戳
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('vol', 'f8'),
+])
+
+
+def parse_date(value):
+    """'20220428' / '2022-04-28' / date / datetime 统一转成 datetime"""
+    if isinstance(value, datetime):
+        return value
+    if hasattr(value, 'year'):
+        return datetime(value.year, value.month, value.day)
+    value = str(value).replace('-', '')
+    return datetime.strptime(value, '%Y%m%d')
+
+
+def date_range(start, end):
+    """[start, end] 内的所有日期字符串 YYYYmmdd"""
+    day = parse_date(start)
+    end = parse_date(end)
+    dates = []
+    while day <= end:
+        dates.append(day.strftime('%Y%m%d'))
+        day += timedelta(days=1)
+    return dates
+
+
+class CandleStore:
+    """
+    本地K线仓库，目录结构与fetch_history_1m的输出一致：
+        data/<币种小写><周期>/<instId>_<YYYYmmdd>.csv   例如 data/doge1m/DOGE-USDT-SWAP_20220428.csv
+    第一次读取某天的CSV时在旁边写一个同名 .npy 缓存（结构化数组），
+    之后只要CSV没有更新就直接读缓存，批量扫描时省掉CSV解析的开销；
+    没有CSV只有 .npy 的日期也可以读取
+    """
+    def __init__(self, root='data', bar='1m', cache=True):
+        self.root = root
+        self.bar = bar
+        self.cache = cache
+
+    def folder(self, inst_id):
+        base = inst_id.split('-')[0].lower()
+        return os.path.join(self.root, f'{base}{self.bar}')
+
+    def path(self, inst_id, date_str):
+        return os.path.join(self.folder(inst_id), f'{inst_id}_{date_str}.csv')
+
+    def dates(self, inst_id):
+        """本地已有的日期列表"""
+        folder = self.folder(inst_id)
+        if not os.path.isdir(folder):
+            return []
+        prefix = inst_id + '_'
+        return sorted({f[len(prefix):-4] for f in os.listdir(folder)
+                       if f.startswith(prefix) and f.endswith(('.csv', '.npy'))})
+
+    def read_day(self, inst_id, date_str):
+        """读取一天的K线，文件不存在返回None"""
+        path = self.path(inst_id, date_str)
+        cache_path = path[:-4] + '.npy'
+        if not os.path.exists(path):
+            # 只有列式文件（synthetic_data --format npy 生成的数据）
+            return np.load(cache_path) if os.path.exists(cache_path) else None
+        if self.cache and os.path.exists(cache_path) and \
+                os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            return np.load(cache_path)
+
+        df = pd.read_csv(path)
+        arr = np.empty(len(df), dtype=CANDLE_DTYPE)
+        arr['ts'] = pd.to_datetime(df['datetime']).to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        for col in ('open', 'high', 'low', 'close', 'vol'):
+            arr[col] = df[col].to_numpy(dtype=np.float64)
+        if self.cache:
+            np.save(cache_path, arr)
+        return arr
+
+    def load(self, inst_id, start, end):
+        """读取[start, end]内的K线，按时间排序后返回结构化数组"""
+        parts = [self.read_day(inst_id, d) for d in date_range(start, end)]
+        parts = [p for p in parts if p is not None and len(p)]
+        if not parts:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        arr = np.concatenate(parts)
+        return arr[np.argsort(arr['ts'], kind='stable')]
+
+    def load_frame(self, inst_id, start, end):
+        """与load相同，返回回测用的DataFrame（datetime, open, high, low, close, vol）"""
+        arr = self.load(inst_id, start, end)
+        df = pd.DataFrame({col: arr[col] for col in ('open', 'high', 'low', 'close', 'vol')})
+        df.insert(0, 'datetime', pd.to_datetime(arr['ts'], unit='ms'))
+        return df
+
+
+def load_instruments(path=os.path.join('data', 'swap产品信息.csv'), state='live', settle_ccy=None):
+    """读取get_data.py保存的永续合约列表，返回instId列表"""
+    df = pd.read_csv(path)
+    if state:
+        df = df[df['state'] == state]
+    if settle_ccy:
+        df = df[df['settleCcy'] == settle_ccy]
+    return df['instId'].tolist()
@@ -0,0 +1,221 @@
+"""
+长时间回测的断点续跑（fast_engine）
+定期把 引擎位置 + 账户/持仓/挂单 + 策略状态 写入磁盘，中断或崩溃后从最近的断点继续；
+指标在续跑时对整段数据重新向量化计算（只取决于K线，与断点无关），不需要保存。
+backtrader的Cerebro内部状态（line buffer、元类生成的对象）无法序列化，
+需要续跑的长回测请使用fast_engine版策略（结果与backtrader一致）。
+"""
+import os
+import pickle
+import signal
+import threading
+import zlib
+
+import numpy as np
+
+import fast_engine as fe
+
+CHECKPOINT_VERSION = 1
+_MISSING = object()
+
+
+class CheckpointMixin:
+    """
+    策略状态快照，与fe.Strategy一起继承
+    checkpoint_attrs: 需要保存的策略属性；引用挂单的属性（例如self.order）自动按订单编号保存
+    checkpoint_lines: 策略在next中写入的输出指标，保存已运行部分的数值
+    """
+    checkpoint_attrs = ()
+    checkpoint_lines = ()
+
+    def get_state(self):
+        attrs = {}
+        orders = {}
+        for name in self.checkpoint_attrs:
+            value = getattr(self, name, _MISSING)
+            if value is _MISSING:
+                continue
+            if isinstance(value, fe.Order):
+                orders[name] = value.ref
+            else:
+                attrs[name] = value
+        n = self.data.idx + 1
+        lines = {}
+        for name in self.checkpoint_lines:
+            ind = getattr(self, name)
+            for line in type(ind).lines:
+                lines[f'{name}.{line}'] = getattr(ind.lines, line).array[:n].copy()
+        return {'attrs': attrs, 'orders': orders, 'lines': lines}
+
+    def set_state(self, state, orders_by_ref):
+        for name, value in state['attrs'].items():
+            setattr(self, name, value)
+        for name, ref in state['orders'].items():
+            setattr(self, name, orders_by_ref.get(ref))
+        for key, values in state['lines'].items():
+            name, line = key.split('.')
+            getattr(getattr(self, name).lines, line).array[:len(values)] = values
+        self.after_restore()
+
+    def after_restore(self):
+        """恢复状态后重新建立属性之间的引用（子类按需重写）"""
+        pass
+
+
+def _order_state(order):
+    return (order.ref, order.size, order.created_idx, order.status)
+
+
+def broker_state(broker):
+    pos = broker.position
+    trade = broker.trade
+    state = {
+        'startingcash': broker.startingcash,
+        'cash': broker.cash,
+        'value': broker.value,
+        'position': (pos.size, pos.price, pos.datetime),
+        'trade': {name: getattr(trade, name) for name in fe.Trade.__slots__},
+        'pending': [_order_state(o) for o in broker.pending],
+    }
+    if broker.comminfo is not None and hasattr(broker.comminfo, 'funding_paid'):
+        state['funding_paid'] = broker.comminfo.funding_paid
+    return state
+
+
+def restore_broker(broker, state, owner):
+    """恢复账户状态，返回 {订单编号: 订单}（挂单重新绑定到新的策略对象）"""
+    broker.startingcash = state['startingcash']
+    broker.cash = state['cash']
+    broker.value = state['value']
+    pos = broker.position
+    pos.size, pos.price, pos.datetime = state['position']
+    for name, value in state['trade'].items():
+        setattr(broker.trade, name, value)
+    broker.pending = []
+    orders = {}
+    for ref, size, created_idx, status in state['pending']:
+        order = fe.Order(owner, size, created_idx)
+        order.ref = ref
+        order.status = status
+        broker.pending.append(order)
+        orders[ref] = order
+    if 'funding_paid' in state:
+        broker.comminfo.funding_paid = state['funding_paid']
+    return orders
+
+
+def fingerprint(feed, strategy_cls, params):
+    """数据和参数的指纹，续跑时必须一致"""
+    n = feed.size
+    ts = feed.datetime.array[:n]
+    close = np.ascontiguousarray(feed.close.array[:n])
+    return {
+        'strategy': strategy_cls.__name__,
+        'params': {k: repr(v) for k, v in sorted(params.items())},
+        'bars': n,
+        'first_ts': int(ts[0]) if n else None,
+        'last_ts': int(ts[-1]) if n else None,
+        'close_crc': zlib.crc32(close.tobytes()),
+    }
+
+
+def save_checkpoint(engine, path, meta=None):
+    """写入当前已完成K线之后的状态（先写临时文件再替换，写到一半中断不会损坏旧断点）"""
+    strat = engine.strategy
+    idx = engine.feed.idx
+    state = {
+        'version': CHECKPOINT_VERSION,
+        'meta': meta,
+        'idx': idx,
+        'equity': engine.equity[:idx + 1].copy(),
+        'broker': broker_state(engine.broker),
+        'strategy': strat.get_state(),
+        'next_ref': fe.Order._next_ref,
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return state
+
+
+def load_checkpoint(path):
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"断点文件版本不兼容: {path}")
+    return state
+
+
+def restore(engine, state):
+    """把断点状态写回已setup并计算好指标的引擎，返回下一根要运行的K线序号"""
+    idx = state['idx']
+    engine.feed.idx = idx
+    engine.equity[:idx + 1] = state['equity']
+    strat = engine.strategy
+    orders = restore_broker(engine.broker, state['broker'], strat)
+    strat.set_state(state['strategy'], orders)
+    fe.Order._next_ref = max(fe.Order._next_ref, state['next_ref'])
+    return idx + 1
+
+
+class _StopFlag:
+    """Ctrl+C时只设置标志，等当前K线处理完再写断点退出，避免保存到一半的状态"""
+    def __init__(self):
+        self.stop = False
+        self._old = None
+
+    def __enter__(self):
+        if threading.current_thread() is threading.main_thread():
+            self._old = signal.signal(signal.SIGINT, self._handle)
+        return self
+
+    def _handle(self, signum, frame):
+        self.stop = True
+
+    def __exit__(self, *exc):
+        if self._old is not None:
+            signal.signal(signal.SIGINT, self._old)
+
+
+def run_checkpointed(engine, strategy_cls, feed, path, every=100000, resume=True, keep=False,
+                     end=None, **params):
+    """
+    带断点的批量回测，用法与Engine.run相同
+    every:  每运行多少根K线写一次断点
+    resume: 断点存在且数据/参数一致时从断点继续
+    keep:   跑完后保留最终断点（默认删除）
+    end:    只运行到第end根（不含）并写断点，用于分段预热
+    """
+    strat = engine.setup(strategy_cls, feed, **params)
+    n = feed.size
+    for ind in feed.indicators:
+        ind.compute(n)
+    meta = fingerprint(feed, strategy_cls, params)
+    start = 0
+    if resume and os.path.exists(path):
+        state = load_checkpoint(path)
+        if state['meta'] == meta:
+            start = restore(engine, state)
+            print(f"从断点继续: 第{start}根K线（共{n}根）")
+        else:
+            print("断点与当前数据或参数不一致，从头开始")
+    stop = n if end is None else min(end, n)
+    with _StopFlag() as flag:
+        for i in range(start, stop):
+            engine._step(i)
+            if (i + 1) % every == 0:
+                save_checkpoint(engine, path, meta)
+            if flag.stop:
+                save_checkpoint(engine, path, meta)
+                raise KeyboardInterrupt(f"已在第{i + 1}根K线写入断点: {path}")
+    if stop < n:
+        save_checkpoint(engine, path, meta)
+        return strat
+    strat.stop()
+    if keep:
+        save_checkpoint(engine, path, meta)
+    elif os.path.exists(path):
+        os.remove(path)
+    return strat
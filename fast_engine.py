@@ -0,0 +1,668 @@
+"""
+轻量事件驱动回测引擎
+策略写法与backtrader相同（next/notify_order/buy/sell/close/position/params），
+但K线和指标保存在预分配的numpy数组中，订单和持仓使用__slots__对象，
+避免backtrader的line buffer和元类开销。
+
+批量回测(run)时指标一次性向量化计算；实盘/回放(on_bar)时逐根增量更新，两者只有浮点舍入上的差别。
+"""
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+EPOCH = datetime(1970, 1, 1)
+NAN = float('nan')
+
+
+class Line:
+    """一条数据线，ago=0表示当前K线，-1表示上一根"""
+    __slots__ = ('feed', 'array', '_mv')
+
+    def __init__(self, feed, capacity):
+        self.feed = feed
+        self.set_array(np.full(capacity, np.nan))
+
+    def set_array(self, array):
+        self.array = array
+        self._mv = memoryview(array)
+
+    def __getitem__(self, ago):
+        return self._mv[self.feed.idx + ago]
+
+    def __setitem__(self, ago, value):
+        self._mv[self.feed.idx + ago] = value
+
+    def get(self, ago=0, size=1):
+        end = self.feed.idx + ago + 1
+        return self.array[end - size:end]
+
+    def __len__(self):
+        return self.feed.idx + 1
+
+
+class DateTimeLine(Line):
+    """毫秒时间戳线，datetime(ago)返回对应的datetime"""
+    __slots__ = ()
+
+    def __init__(self, feed, capacity):
+        self.feed = feed
+        self.set_array(np.zeros(capacity, dtype=np.int64))
+
+    def datetime(self, ago=0):
+        return EPOCH + timedelta(milliseconds=self._mv[self.feed.idx + ago])
+
+    def date(self, ago=0):
+        return self.datetime(ago).date()
+
+
+class Lines:
+    """指标的输出线集合，支持 ind.lines.name 和 ind.name 两种访问方式"""
+    pass
+
+
+class DataFeed:
+    """预分配数组存放OHLCV，容量不足时按倍数扩容"""
+    def __init__(self, capacity=1024, name=''):
+        self.name = self._name = name
+        self.capacity = capacity
+        self.size = 0
+        self.idx = -1
+        self.datetime = DateTimeLine(self, capacity)
+        self.open = Line(self, capacity)
+        self.high = Line(self, capacity)
+        self.low = Line(self, capacity)
+        self.close = Line(self, capacity)
+        self.volume = Line(self, capacity)
+        self.lines = [self.datetime, self.open, self.high, self.low, self.close, self.volume]
+        self.indicators = []
+
+    @classmethod
+    def from_arrays(cls, ts, open_, high, low, close, volume=None, name=''):
+        n = len(ts)
+        feed = cls(max(n, 1), name)
+        feed.datetime.array[:n] = ts
+        feed.open.array[:n] = open_
+        feed.high.array[:n] = high
+        feed.low.array[:n] = low
+        feed.close.array[:n] = close
+        feed.volume.array[:n] = volume if volume is not None else 0.0
+        feed.size = n
+        return feed
+
+    @classmethod
+    def from_dataframe(cls, df, name=''):
+        ts = df['datetime'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        volume = df['vol'].to_numpy(dtype=np.float64) if 'vol' in df else None
+        return cls.from_arrays(ts, df['open'].to_numpy(dtype=np.float64),
+                               df['high'].to_numpy(dtype=np.float64),
+                               df['low'].to_numpy(dtype=np.float64),
+                               df['close'].to_numpy(dtype=np.float64), volume, name)
+
+    def register(self, line):
+        self.lines.append(line)
+
+    def _grow(self):
+        self.capacity *= 2
+        for line in self.lines:
+            old = line.array
+            new = np.full(self.capacity, np.nan) if old.dtype.kind == 'f' else \
+                np.zeros(self.capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            line.set_array(new)
+
+    def append(self, ts, o, h, l, c, v=0.0):
+        """追加一根K线（实盘/回放用）"""
+        if self.size >= self.capacity:
+            self._grow()
+        i = self.size
+        self.datetime.array[i] = ts
+        self.open.array[i] = o
+        self.high.array[i] = h
+        self.low.array[i] = l
+        self.close.array[i] = c
+        self.volume.array[i] = v
+        self.size += 1
+        return i
+
+    def __len__(self):
+        return self.idx + 1
+
+
+class Indicator:
+    """
+    指标基类
+    子类声明 lines，并实现 update(i)（增量计算第i根）；
+    可选实现 compute(n) 对前n根做向量化计算，默认逐根调用update
+    """
+    lines = ()
+    minperiod = 1
+
+    def __init__(self, feed):
+        self.feed = feed
+        self.lines = Lines()
+        for name in type(self).lines:
+            line = Line(feed, feed.capacity)
+            feed.register(line)
+            setattr(self.lines, name, line)
+            setattr(self, name, line)
+        self.line = getattr(self.lines, type(self).lines[0]) if type(self).lines else None
+        feed.indicators.append(self)
+
+    def __getitem__(self, ago):
+        return self.line[ago]
+
+    def update(self, i):
+        pass
+
+    def compute(self, n):
+        for i in range(n):
+            self.update(i)
+
+
+def _source(src):
+    """指标输入可以是Line或单线指标"""
+    return src.line if isinstance(src, Indicator) else src
+
+
+class SMA(Indicator):
+    lines = ('sma',)
+
+    def __init__(self, src, period=30):
+        self.src = _source(src)
+        self.period = period
+        self.minperiod = period + getattr(src, 'minperiod', 1) - 1
+        super().__init__(self.src.feed)
+
+    def update(self, i):
+        start = i - self.period + 1
+        if i + 1 >= self.minperiod:
+            self.sma.array[i] = math.fsum(self.src.array[start:i + 1]) / self.period
+
+    def compute(self, n):
+        if n >= self.minperiod:
+            windows = sliding_window_view(self.src.array[:n], self.period)
+            self.sma.array[self.period - 1:n] = windows.sum(axis=1) / self.period
+            self.sma.array[:self.minperiod - 1] = np.nan
+
+
+class BollingerBands(Indicator):
+    """与higher_low_strategy中的BollingerBands一致：SMA ± devfactor * sqrt(|E[x²] - E[x]²|)"""
+    lines = ('ma', 'upper', 'lower')
+
+    def __init__(self, feed, period=20, devfactor=2.0):
+        self.period = period
+        self.devfactor = devfactor
+        self.minperiod = period
+        self.src = feed.close
+        super().__init__(feed)
+
+    def update(self, i):
+        if i + 1 < self.period:
+            return
+        window = self.src.array[i - self.period + 1:i + 1]
+        mean = math.fsum(window) / self.period
+        meansq = math.fsum(window * window) / self.period
+        std = abs(meansq - mean * mean) ** 0.5
+        self.ma.array[i] = mean
+        self.upper.array[i] = mean + self.devfactor * std
+        self.lower.array[i] = mean - self.devfactor * std
+
+    def compute(self, n):
+        if n < self.period:
+            return
+        x = self.src.array[:n]
+        mean = sliding_window_view(x, self.period).sum(axis=1) / self.period
+        meansq = sliding_window_view(x * x, self.period).sum(axis=1) / self.period
+        std = np.abs(meansq - mean * mean) ** 0.5
+        self.ma.array[self.period - 1:n] = mean
+        self.upper.array[self.period - 1:n] = mean + self.devfactor * std
+        self.lower.array[self.period - 1:n] = mean - self.devfactor * std
+
+
+class ATR(Indicator):
+    """Wilder平滑的真实波幅，首个值为前period个TR的简单平均（与backtrader一致）"""
+    lines = ('atr',)
+
+    def __init__(self, feed, period=14):
+        self.period = period
+        self.minperiod = period + 1
+        super().__init__(feed)
+
+    def _tr(self, i):
+        prev_close = self.feed.close.array[i - 1]
+        return (max(self.feed.high.array[i], prev_close)
+                - min(self.feed.low.array[i], prev_close))
+
+    def update(self, i):
+        if i + 1 < self.minperiod:
+            return
+        if i + 1 == self.minperiod:
+            self.atr.array[i] = math.fsum(self._tr(j) for j in range(1, i + 1)) / self.period
+        else:
+            alpha = 1.0 / self.period
+            self.atr.array[i] = self.atr.array[i - 1] * (1.0 - alpha) + self._tr(i) * alpha
+
+    def compute(self, n):
+        if n < self.minperiod:
+            return
+        high = self.feed.high.array[1:n]
+        low = self.feed.low.array[1:n]
+        prev_close = self.feed.close.array[:n - 1]
+        tr = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+        out = self.atr.array
+        p = self.period
+        alpha = 1.0 / p
+        alpha1 = 1.0 - alpha
+        value = math.fsum(tr[:p]) / p
+        out[p] = value
+        for j, x in enumerate(tr[p:].tolist(), start=p + 1):
+            value = value * alpha1 + x * alpha
+            out[j] = value
+
+
+class CrossOver(Indicator):
+    """1=上穿，-1=下穿，0=无交叉（使用上一个非零差值判断，与backtrader一致）"""
+    lines = ('crossover',)
+
+    def __init__(self, a, b):
+        self.a = _source(a)
+        self.b = _source(b)
+        self.minperiod = max(getattr(a, 'minperiod', 1), getattr(b, 'minperiod', 1)) + 1
+        self._nzd = NAN
+        super().__init__(self.a.feed)
+
+    def update(self, i):
+        diff = self.a.array[i] - self.b.array[i]
+        prev = self._nzd
+        if diff == diff and diff != 0:
+            self._nzd = diff
+        elif prev != prev:
+            self._nzd = diff
+        if i + 1 < self.minperiod:
+            return
+        if prev < 0 and diff > 0:
+            self.crossover.array[i] = 1.0
+        elif prev > 0 and diff < 0:
+            self.crossover.array[i] = -1.0
+        else:
+            self.crossover.array[i] = 0.0
+
+
+class Execution:
+    __slots__ = ('price', 'size', 'value', 'comm', 'pnl')
+
+    def __init__(self):
+        self.price = 0.0
+        self.size = 0.0
+        self.value = 0.0
+        self.comm = 0.0
+        self.pnl = 0.0
+
+
+class Order:
+    """市价单，下单后在下一根K线开盘成交"""
+    __slots__ = ('ref', 'size', 'created_idx', 'status', 'executed', 'owner', 'info')
+
+    Created, Submitted, Accepted, Partial, Completed, Canceled, Expired, Margin, Rejected = range(9)
+
+    _next_ref = 1
+
+    def __init__(self, owner, size, created_idx):
+        self.ref = Order._next_ref
+        Order._next_ref += 1
+        self.owner = owner
+        self.size = size
+        self.created_idx = created_idx
+        self.status = Order.Submitted
+        self.executed = Execution()
+        self.info = {}
+
+    def isbuy(self):
+        return self.size > 0
+
+    def issell(self):
+        return self.size < 0
+
+    def alive(self):
+        return self.status in (Order.Created, Order.Submitted, Order.Accepted, Order.Partial)
+
+
+class Position:
+    __slots__ = ('size', 'price', 'datetime')
+
+    def __init__(self):
+        self.size = 0.0
+        self.price = 0.0
+        self.datetime = None
+
+    def __bool__(self):
+        return bool(self.size)
+
+    __nonzero__ = __bool__
+
+
+class Trade:
+    __slots__ = ('size', 'price', 'pnl', 'pnlcomm', 'commission', 'isclosed', 'isopen')
+
+    def __init__(self):
+        self.size = 0.0
+        self.price = 0.0
+        self.pnl = 0.0
+        self.pnlcomm = 0.0
+        self.commission = 0.0
+        self.isclosed = False
+        self.isopen = False
+
+
+class Broker:
+    """
+    现货式资金账户：开多扣除现金，开空增加现金，权益 = 现金 + 持仓数量 * 收盘价
+    手续费/滑点设置与backtrader的 setcommission / set_slippage_perc 相同
+    """
+    def __init__(self, cash=100000.0):
+        self.startingcash = cash
+        self.cash = cash
+        self.commission = 0.0
+        self.comminfo = None
+        self.slip_perc = 0.0
+        self.position = Position()
+        self.pending = []
+        self.trade = Trade()
+        self.value = cash
+        self.risk = None
+        self.risk_inst = None
+        self.rejected = []
+
+    def setcash(self, cash):
+        self.startingcash = self.cash = self.value = cash
+
+    set_cash = setcash
+
+    def getcash(self):
+        return self.cash
+
+    get_cash = getcash
+
+    def getvalue(self):
+        return self.value
+
+    get_value = getvalue
+
+    def setcommission(self, commission=0.0):
+        self.commission = commission
+
+    def addcommissioninfo(self, comminfo):
+        """手续费对象（funding.SwapFees或backtrader的CommInfo），资金费同样生效"""
+        self.comminfo = comminfo
+
+    def set_slippage_perc(self, perc):
+        self.slip_perc = perc
+
+    def set_risk(self, risk, inst_id=None):
+        """下单前风控（risk_engine.RiskEngine），未通过的订单状态为Rejected，下一根K线通知策略"""
+        self.risk = risk
+        self.risk_inst = inst_id
+
+    def getposition(self, data=None):
+        return self.position
+
+    def _getcommission(self, size, price):
+        if self.comminfo is not None:
+            return self.comminfo.getcommission(size, price)
+        return abs(size) * price * self.commission
+
+    def submit(self, order):
+        if self.risk is not None:
+            reason = self.risk.check_order(self, order, self.risk_inst)
+            if reason is not None:
+                order.status = Order.Rejected
+                order.info['risk'] = reason
+                self.rejected.append(order)
+                return order
+        self.pending.append(order)
+        return order
+
+    def cancel(self, order):
+        if order.alive():
+            order.status = Order.Canceled
+            if order in self.pending:
+                self.pending.remove(order)
+            return True
+        return False
+
+    def execute_pending(self, feed, i, notify):
+        """在第i根K线开盘撮合之前提交的订单"""
+        if self.rejected:
+            rejected = self.rejected
+            self.rejected = []
+            for order in rejected:
+                notify(order)
+        if not self.pending:
+            return
+        orders = self.pending
+        self.pending = []
+        popen = feed.open[0]
+        ts = feed.datetime.array
+        for order in orders:
+            # 与backtrader相同，只能在下单时间之后的K线成交（数据中存在重复时间戳）
+            if ts[i] <= ts[order.created_idx]:
+                self.pending.append(order)
+                continue
+            if order.size > 0:
+                price = popen * (1 + self.slip_perc)
+                price = min(price, feed.high[0])
+            else:
+                price = popen * (1 - self.slip_perc)
+                price = max(price, feed.low[0])
+            self._fill(order, price, feed, i)
+            notify(order)
+
+    def _fill(self, order, price, feed, i):
+        size = order.size
+        pos = self.position
+        comm = self._getcommission(size, price)
+        opening = pos.size == 0 or (pos.size > 0) == (size > 0)
+        if opening and size > 0 and size * price + comm > self.cash:
+            order.status = Order.Margin
+            return
+
+        pnl = 0.0
+        if not opening:
+            closed = size if abs(size) <= abs(pos.size) else -pos.size
+            pnl = -closed * (price - pos.price)
+        self.cash -= size * price + comm
+
+        new_size = pos.size + size
+        if opening:
+            pos.price = (pos.size * pos.price + size * price) / new_size
+        elif new_size and (new_size > 0) != (pos.size > 0):
+            pos.price = price  # 反手，剩余部分按成交价开仓
+        if abs(new_size) < 1e-12:
+            new_size = 0.0
+        pos.size = new_size
+        pos.datetime = EPOCH + timedelta(milliseconds=int(feed.datetime.array[i]))
+
+        ex = order.executed
+        ex.price = price
+        ex.size = size
+        ex.value = abs(size) * price
+        ex.comm = comm
+        ex.pnl = pnl
+        order.status = Order.Completed
+
+        trade = self.trade
+        trade.commission += comm
+        trade.pnl += pnl
+        trade.pnlcomm = trade.pnl - trade.commission
+        trade.isopen = pos.size != 0
+        trade.isclosed = pos.size == 0
+
+    def pop_closed_trade(self):
+        """仓位归零时返回已完成的交易并开始新的交易记录"""
+        trade = self.trade
+        if trade.isclosed:
+            self.trade = Trade()
+            return trade
+        return None
+
+    def settle_funding(self, feed):
+        """按backtrader的顺序，在撮合之前结算上次结算以来的资金费"""
+        pos = self.position
+        if pos.size and self.comminfo is not None and getattr(self.comminfo.p, 'funding', None):
+            dt = feed.datetime.datetime(0)
+            self.cash -= self.comminfo.get_credit_interest(feed, pos, dt)
+            pos.datetime = dt
+
+    def mark(self, feed):
+        """收盘后更新权益"""
+        self.value = self.cash + self.position.size * feed.close[0]
+        return self.value
+
+
+class Strategy:
+    """
+    策略基类，写法与bt.Strategy一致：
+    在 __init__ 中创建指标，在 next 中交易，通过 notify_order/notify_trade 接收回报
+    """
+    params = ()
+
+    def _setup(self, engine, feed, **kwargs):
+        values = {}
+        for klass in reversed(type(self).__mro__):
+            values.update(dict(getattr(klass, 'params', ()) or ()))
+        for key, value in kwargs.items():
+            if key not in values:
+                raise TypeError(f'未知参数: {key}')
+            values[key] = value
+        self.params = self.p = type('Params', (), {})()
+        for key, value in values.items():
+            setattr(self.p, key, value)
+        self.engine = engine
+        self.broker = engine.broker
+        self.data = self.data0 = feed
+        self.datas = [feed]
+        self.position = engine.broker.position
+
+    def __len__(self):
+        return self.data.idx + 1
+
+    def log(self, txt, dt=None):
+        dt = dt or self.datas[0].datetime.datetime(0)
+        print(f'{dt.strftime("%Y-%m-%d %H:%M")}, {txt}')
+
+    def buy(self, size):
+        return self.broker.submit(Order(self, abs(size), self.data.idx))
+
+    def sell(self, size):
+        return self.broker.submit(Order(self, -abs(size), self.data.idx))
+
+    def close(self):
+        size = self.position.size
+        if not size:
+            return None
+        return self.broker.submit(Order(self, -size, self.data.idx))
+
+    def cancel(self, order):
+        return self.broker.cancel(order)
+
+    def notify_order(self, order):
+        pass
+
+    def notify_trade(self, trade):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def prenext(self):
+        pass
+
+    def next(self):
+        pass
+
+
+class Engine:
+    """
+    单品种事件驱动回测引擎
+    用法:
+        engine = Engine(cash=100000.0)
+        engine.broker.setcommission(0.001)
+        engine.broker.set_slippage_perc(0.001)
+        strat = engine.run(MyStrategy, df, **params)
+    """
+    def __init__(self, cash=100000.0):
+        self.broker = Broker(cash)
+        self.feed = None
+        self.strategy = None
+        self.minperiod = 1
+        self.equity = None
+
+    def setup(self, strategy_cls, feed, **params):
+        """创建策略并建立指标，实盘/回放模式在调用on_bar之前先调用setup"""
+        self.feed = feed
+        strat = strategy_cls.__new__(strategy_cls)
+        strat._setup(self, feed, **params)
+        strat.__init__()
+        self.strategy = strat
+        self.minperiod = max([ind.minperiod for ind in feed.indicators] or [1])
+        self.equity = np.full(feed.capacity, np.nan)
+        strat.start()
+        return strat
+
+    def _notify(self, order):
+        strat = self.strategy
+        strat.notify_order(order)
+        trade = self.broker.pop_closed_trade()
+        if trade is not None:
+            strat.notify_trade(trade)
+
+    def _step(self, i):
+        feed = self.feed
+        feed.idx = i
+        broker = self.broker
+        broker.settle_funding(feed)
+        broker.execute_pending(feed, i, self._notify)
+        self.equity[i] = broker.mark(feed)
+        if i + 1 >= self.minperiod:
+            self.strategy.next()
+        else:
+            self.strategy.prenext()
+
+    def run(self, strategy_cls, df=None, feed=None, **params):
+        """批量回测：指标先整体向量化计算，再逐根驱动策略"""
+        if feed is None:
+            feed = DataFeed.from_dataframe(df)
+        strat = self.setup(strategy_cls, feed, **params)
+        n = feed.size
+        for ind in feed.indicators:
+            ind.compute(n)
+        for i in range(n):
+            self._step(i)
+        strat.stop()
+        return strat
+
+    def on_bar(self, ts, o, h, l, c, v=0.0):
+        """实盘/回放：追加一根K线，增量更新指标后驱动策略"""
+        feed = self.feed
+        i = feed.append(ts, o, h, l, c, v)
+        if len(self.equity) < feed.capacity:
+            equity = np.full(feed.capacity, np.nan)
+            equity[:len(self.equity)] = self.equity
+            self.equity = equity
+        for ind in feed.indicators:
+            ind.update(i)
+        self._step(i)
+
+    def max_drawdown(self):
+        """根据权益曲线计算最大回撤(%)"""
+        equity = self.equity[:self.feed.idx + 1]
+        equity = equity[~np.isnan(equity)]
+        if not len(equity):
+            return 0.0
+        peak = np.maximum.accumulate(equity)
+        return float(((peak - equity) / peak).max() * 100)
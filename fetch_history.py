@@ -1,52 +1,24 @@
-import requests
 import pandas as pd
 import time
 
+from okx_rest import OKXRestError, get_client
+
 def fetch_and_save(instId, filename, bar='1H', days=365):
     all_data = []
     now = int(time.time() * 1000)  
     end_time = now - days * 24 * 60 * 60 * 1000
-    after = now
-    index = 1
-    
-    base_url = "https://www.okx.com"
     endpoint = "/api/v5/market/history-mark-price-candles"
-    
-    while True:
-        params = {
-            'instId': instId,
-            'bar': bar,
-            'limit': 100,
-            'after': str(after)
-        }
-        
-        url = base_url + endpoint
-        response = requests.get(url, params=params)
-        
-        if response.status_code != 200:
-            print(f"请求失败: {response.status_code}")
-            break
-            
-        result = response.json()
-        data = result['data']
-        print(data)
-        if not data:
-            print(f"第{index}页无数据，结束获取")
-            break
-            
-        all_data.extend(data)
-        last_ts = int(data[-1][0])
-        
-        print(f"第{index}页获取到{len(data)}条数据，最早时间：{pd.to_datetime(last_ts, unit='ms')}")
-        
-        if last_ts <= end_time:
-            print(f"已达到目标时间：{pd.to_datetime(end_time, unit='ms')}")
-            break
-            
-        after = last_ts
-        index += 1
-        time.sleep(0.5)  # 增加延迟避免被限制
-    
+    params = {'instId': instId, 'bar': bar, 'after': str(now)}
+
+    # 连接复用和限速由okx_rest统一处理，不需要每页sleep
+    try:
+        for index, data in enumerate(get_client().paginate(endpoint, params, stop_ms=end_time), 1):
+            all_data.extend(data)
+            last_ts = int(data[-1][0])
+            print(f"第{index}页获取到{len(data)}条数据，最早时间：{pd.to_datetime(last_ts, unit='ms')}")
+    except OKXRestError as e:
+        print(e)
+
     if not all_data:
         print("未获取到任何数据")
         return
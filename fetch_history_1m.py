@@ -1,49 +1,24 @@
-import requests
 import pandas as pd
 import time
 from datetime import datetime, timedelta
 import os
 
+from okx_rest import OKXRestError, get_client
+
 def fetch_one_day(instId, date, bar='1m'):
     """获取某一天的分钟数据"""
     all_data = []
     # 计算目标日期的起始和结束时间戳
     start_time = int(datetime.combine(date, datetime.min.time()).timestamp() * 1000)
     end_time = int((datetime.combine(date, datetime.max.time())).timestamp() * 1000)
-    after = end_time
-    
-    base_url = "https://www.okx.com"
     endpoint = "/api/v5/market/history-mark-price-candles"
-    
-    while True:
-        params = {
-            'instId': instId,
-            'bar': bar,
-            'limit': 100,
-            'after': str(after)
-        }
-        
-        url = base_url + endpoint
-        response = requests.get(url, params=params)
-        
-        if response.status_code != 200:
-            print(f"请求失败: {response.status_code}")
-            break
-            
-        result = response.json()
-        data = result['data']
-        
-        if not data:
-            break
-            
-        all_data.extend(data)
-        last_ts = int(data[-1][0])
-        
-        if last_ts <= start_time:
-            break
-            
-        after = last_ts
-        time.sleep(0.2)  # 避免请求过快
+    params = {'instId': instId, 'bar': bar, 'after': str(end_time)}
+
+    try:
+        for data in get_client().paginate(endpoint, params, stop_ms=start_time):
+            all_data.extend(data)
+    except OKXRestError as e:
+        print(e)
     
     return all_data
 
@@ -0,0 +1,237 @@
+import math
+import os
+
+import backtrader as bt
+import numpy as np
+
+
+class BarLiquidity:
+    """
+    每根K线的预计算流动性数组，与回测用的DataFrame逐行对齐
+    depth_buy: 买单可吃的卖盘深度（币数量）
+    depth_sell: 卖单可吃的买盘深度（币数量）
+    half_spread: 半个买卖价差（相对价格）
+    bar_ms: K线周期（毫秒），用于把延迟换算成K线内的位置
+    """
+    def __init__(self, ts, depth_buy, depth_sell, half_spread, bar_ms):
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.depth_buy = np.asarray(depth_buy, dtype=np.float64)
+        self.depth_sell = np.asarray(depth_sell, dtype=np.float64)
+        self.half_spread = np.asarray(half_spread, dtype=np.float64)
+        self.bar_ms = int(bar_ms)
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def from_volume(cls, df, vol_col='vol', spread=0.0005):
+        """
+        用K线成交量近似深度（标记价格K线的vol恒为1，此时应使用盘口或成交数据）
+        spread: 假设的固定买卖价差（相对价格）
+        """
+        ts = bar_timestamps(df)
+        vol = df[vol_col].to_numpy(dtype=np.float64)
+        half = np.full(len(df), spread / 2)
+        return cls(ts, vol, vol, half, infer_bar_ms(ts))
+
+    @classmethod
+    def from_orderbook(cls, df, reader, inst_id, contract_value=1.0, fallback_spread=0.0005):
+        """
+        用录制的books5快照计算每根K线的平均五档深度和平均价差
+        contract_value: 每张合约对应的币数量，盘口数量单位是张
+        没有快照的K线沿用上一根K线的数值
+        """
+        ts = bar_timestamps(df)
+        bar_ms = infer_bar_ms(ts)
+        books = reader.read_books(inst_id, int(ts[0]), int(ts[-1]) + bar_ms)
+        n = len(ts)
+        depth_buy = np.full(n, np.nan)
+        depth_sell = np.full(n, np.nan)
+        half = np.full(n, np.nan)
+        if len(books):
+            idx = np.searchsorted(ts, books['ts'], side='right') - 1
+            ok = idx >= 0
+            idx = idx[ok]
+            books = books[ok]
+            counts = np.bincount(idx, minlength=n)
+            ask_depth = books['ask_sz'].sum(axis=1).astype(np.float64) * contract_value
+            bid_depth = books['bid_sz'].sum(axis=1).astype(np.float64) * contract_value
+            bid0 = books['bid_px'][:, 0]
+            ask0 = books['ask_px'][:, 0]
+            spread = np.where(bid0 > 0, (ask0 - bid0) / (ask0 + bid0), fallback_spread / 2)
+            has = counts > 0
+            depth_buy[has] = np.bincount(idx, weights=ask_depth, minlength=n)[has] / counts[has]
+            depth_sell[has] = np.bincount(idx, weights=bid_depth, minlength=n)[has] / counts[has]
+            half[has] = np.bincount(idx, weights=spread, minlength=n)[has] / counts[has]
+        depth_buy = forward_fill(depth_buy, 0.0)
+        depth_sell = forward_fill(depth_sell, 0.0)
+        half = forward_fill(half, fallback_spread / 2)
+        return cls(ts, depth_buy, depth_sell, half, bar_ms)
+
+    @classmethod
+    def from_trades(cls, df, reader, inst_id, contract_value=1.0, spread=0.0005):
+        """用录制的逐笔成交汇总出每根K线真实成交量作为深度"""
+        ts = bar_timestamps(df)
+        bar_ms = infer_bar_ms(ts)
+        trades = reader.read_trades(inst_id, int(ts[0]), int(ts[-1]) + bar_ms)
+        n = len(ts)
+        idx = np.searchsorted(ts, trades['ts'], side='right') - 1
+        ok = idx >= 0
+        buy = trades['side'][ok] > 0
+        sz = trades['sz'][ok].astype(np.float64) * contract_value
+        # 主动买成交消耗卖盘，主动卖成交消耗买盘
+        depth_buy = np.bincount(idx[ok][buy], weights=sz[buy], minlength=n)
+        depth_sell = np.bincount(idx[ok][~buy], weights=sz[~buy], minlength=n)
+        return cls(ts, depth_buy, depth_sell, np.full(n, spread / 2), bar_ms)
+
+
+def bar_timestamps(df):
+    """DataFrame的datetime列转毫秒时间戳"""
+    return df['datetime'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+
+
+def infer_bar_ms(ts):
+    """K线周期取相邻时间差的中位数（本地数据存在重复时间戳，只看正的时间差）"""
+    diff = np.diff(ts)
+    diff = diff[diff > 0]
+    if len(diff) == 0:
+        return 60_000
+    return int(np.median(diff))
+
+
+def forward_fill(values, default):
+    """用上一个有效值填充NaN，开头的NaN用default填充"""
+    mask = np.isnan(values)
+    if not mask.any():
+        return values
+    idx = np.where(~mask, np.arange(len(values)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    out = values[idx]
+    out[np.isnan(out)] = default
+    return out
+
+
+class DepthAwareBroker(bt.brokers.BackBroker):
+    """
+    考虑盘口深度的撮合broker
+    - 市价单按平方根冲击模型计算成交价：参考价 * (1 ± (半价差 + impact * sqrt(成交量/深度)))
+    - 每根K线最多成交 participation * 深度，剩余部分留到后续K线继续成交（部分成交）
+    - latency_ms 模拟下单延迟：整K线部分推迟成交，不足一根的部分在开盘价和收盘价之间插值参考价
+    未设置流动性数据的品种按BackBroker原有逻辑撮合。
+    """
+    params = (
+        ('participation', 0.1),   # 单根K线最多吃掉的深度比例
+        ('impact', 0.1),          # 冲击系数
+        ('latency_ms', 0),        # 下单延迟（毫秒）
+    )
+
+    def __init__(self):
+        super(DepthAwareBroker, self).__init__()
+        self._liquidity = {}
+        self._eligible = {}
+        self._consumed = {}
+        self._fill_size = None
+
+    def start(self):
+        super(DepthAwareBroker, self).start()
+        self.p.filler = self._depth_filler
+
+    def next(self):
+        self._consumed.clear()
+        super(DepthAwareBroker, self).next()
+
+    def set_liquidity(self, data, liquidity):
+        """为某个数据源设置预计算的流动性数组"""
+        self._liquidity[data] = liquidity
+
+    def _depth_filler(self, order, price, ago):
+        if self._fill_size is None:
+            return abs(order.executed.remsize)
+        return self._fill_size
+
+    def _execute(self, order, *args, **kwargs):
+        # 限价单按maker费率收费，其余按taker（需要SwapCommInfo之类支持is_maker的手续费对象）
+        comminfo = self.getcommissioninfo(order.data)
+        if hasattr(comminfo, 'is_maker'):
+            comminfo.is_maker = order.exectype == bt.Order.Limit
+        return super(DepthAwareBroker, self)._execute(order, *args, **kwargs)
+
+    def _try_exec_market(self, order, popen, phigh, plow):
+        data = order.data
+        liq = self._liquidity.get(data)
+        if liq is None or self.p.coc:
+            return super(DepthAwareBroker, self)._try_exec_market(order, popen, phigh, plow)
+
+        if not self.p.coo and data.datetime[0] <= order.created.dt:
+            return  # 下单当根K线不能成交
+
+        idx = len(data) - 1
+        if idx >= len(liq):
+            return
+        delay_bars, frac = divmod(self.p.latency_ms, liq.bar_ms)
+        eligible = self._eligible.setdefault(order.ref, idx + int(delay_bars))
+        if idx < eligible:
+            return
+
+        # 同一根K线内多个订单共享可用深度
+        key = (data, idx)
+        isbuy = order.isbuy()
+        depth = liq.depth_buy[idx] if isbuy else liq.depth_sell[idx]
+        available = depth * self.p.participation - self._consumed.get(key, 0.0)
+        remaining = abs(order.executed.remsize)
+        size = min(remaining, available)
+        if size <= 0:
+            return
+
+        ref = popen + (data.close[0] - popen) * frac / liq.bar_ms
+        cost = liq.half_spread[idx] + self.p.impact * math.sqrt(size / depth)
+        if isbuy:
+            price = min(ref * (1 + cost), phigh)
+        else:
+            price = max(ref * (1 - cost), plow)
+
+        self._consumed[key] = self._consumed.get(key, 0.0) + size
+        self._fill_size = size
+        try:
+            self._execute(order, ago=0, price=price)
+        finally:
+            self._fill_size = None
+        if not order.alive():
+            self._eligible.pop(order.ref, None)
+
+
+def use_depth_broker(cerebro, data, liquidity, **kwargs):
+    """把cerebro的broker替换为DepthAwareBroker，保留原有资金设置"""
+    cash = cerebro.broker.getcash()
+    broker = DepthAwareBroker(**kwargs)
+    broker.setcash(cash)
+    broker.set_liquidity(data, liquidity)
+    cerebro.broker = broker
+    return broker
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from orderbook_recorder import OrderBookReader
+    from higher_low_strategy1_1 import HigherLowStrategy
+
+    csv_file = os.path.join('data', 'doge1m', 'DOGE-USDT-SWAP_20220428.csv')
+    df = pd.read_csv(csv_file)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+
+    reader = OrderBookReader()
+    liquidity = BarLiquidity.from_orderbook(df, reader, 'DOGE-USDT-SWAP', contract_value=1000)
+    if not liquidity.depth_buy.any():
+        print("没有盘口数据，使用成交量近似深度")
+        liquidity = BarLiquidity.from_volume(df)
+
+    cerebro = bt.Cerebro()
+    cerebro.addstrategy(HigherLowStrategy)
+    data = bt.feeds.PandasData(dataname=df, datetime='datetime', open='open', high='high',
+                               low='low', close='close', volume='vol', openinterest=None)
+    cerebro.adddata(data)
+    cerebro.broker.setcash(100000.0)
+    broker = use_depth_broker(cerebro, data, liquidity, participation=0.1, latency_ms=200)
+    broker.setcommission(commission=0.001)
+    cerebro.run()
+    print('最终资金: %.2f' % cerebro.broker.getvalue())
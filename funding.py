@@ -0,0 +1,170 @@
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+FUNDING_FOLDER = os.path.join('data', 'funding')
+FUNDING_INTERVAL_MS = 8 * 60 * 60 * 1000  # 资金费每8小时结算一次
+EPOCH = datetime(1970, 1, 1)
+
+# USDT本位永续合约手续费等级 (maker, taker)，以OKX官网费率表为准
+FEE_TIERS = {
+    'Lv1': (0.0002, 0.0005),
+    'Lv2': (0.00015, 0.0004),
+    'Lv3': (0.0001, 0.00035),
+    'VIP1': (0.00008, 0.0003),
+    'VIP2': (0.00005, 0.00028),
+    'VIP3': (0.0, 0.00025),
+}
+
+
+def funding_file(instId, folder=FUNDING_FOLDER):
+    return os.path.join(folder, f"{instId}_funding.csv")
+
+
+def fetch_funding_history(instId, since_ms=None):
+    """
+    获取资金费率历史，从最新往前翻页
+    since_ms: 只获取该时间之后的记录，None表示取到接口能提供的最早数据
+    """
+    from okx_rest import OKXRestError, get_client  # 只在拉取数据时加载
+
+    all_data = []
+    endpoint = "/api/v5/public/funding-rate-history"
+    try:
+        for data in get_client().paginate(endpoint, {'instId': instId}, stop_ms=since_ms,
+                                          ts_index='fundingTime'):
+            all_data.extend(data)
+    except OKXRestError as e:
+        print(e)
+
+    return all_data
+
+
+def update_funding(instId, folder=FUNDING_FOLDER):
+    """增量更新本地资金费率文件，返回合并后的DataFrame"""
+    os.makedirs(folder, exist_ok=True)
+    filename = funding_file(instId, folder)
+    old = load_funding(instId, folder)
+    since_ms = int(old['fundingTime'].max()) if len(old) else None
+
+    data = fetch_funding_history(instId, since_ms)
+    if not data and len(old) == 0:
+        print(f"{instId} 未获取到资金费率数据")
+        return old
+
+    new = pd.DataFrame(data, columns=['fundingTime', 'fundingRate', 'realizedRate'])
+    for col in ['fundingTime', 'fundingRate', 'realizedRate']:
+        new[col] = pd.to_numeric(new[col], errors='coerce')
+    df = pd.concat([old, new], ignore_index=True)
+    df = df.drop_duplicates('fundingTime').sort_values('fundingTime').reset_index(drop=True)
+    df['fundingTime'] = df['fundingTime'].astype(np.int64)
+    df['datetime'] = pd.to_datetime(df['fundingTime'], unit='ms')
+    df[['datetime', 'fundingTime', 'fundingRate', 'realizedRate']].to_csv(filename, index=False)
+    print(f"{instId} 资金费率已保存，共{len(df)}条，新增{len(new)}条")
+    return df
+
+
+def bulk_update_funding(instIds, folder=FUNDING_FOLDER):
+    """批量下载多个合约的资金费率"""
+    for instId in instIds:
+        try:
+            update_funding(instId, folder)
+        except Exception as e:
+            print(f"处理{instId}时出错: {str(e)}")
+
+
+def load_funding(instId, folder=FUNDING_FOLDER):
+    filename = funding_file(instId, folder)
+    if not os.path.exists(filename):
+        return pd.DataFrame(columns=['datetime', 'fundingTime', 'fundingRate', 'realizedRate'])
+    return pd.read_csv(filename)
+
+
+def to_ms(dt):
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+class FundingSchedule:
+    """
+    资金费结算时间表
+    预先计算费率的累计和，任意区间 (t0, t1] 内的费率之和只需两次二分查找
+    没有历史数据时按 default_rate 在每个8小时结算点收取
+    """
+    def __init__(self, times_ms=None, rates=None, default_rate=0.0001):
+        self.times = np.asarray(times_ms if times_ms is not None else [], dtype=np.int64)
+        rates = np.asarray(rates if rates is not None else [], dtype=np.float64)
+        self.cumrate = np.concatenate(([0.0], np.cumsum(rates)))
+        self.default_rate = default_rate
+
+    @classmethod
+    def from_store(cls, instId, folder=FUNDING_FOLDER, default_rate=0.0001):
+        df = load_funding(instId, folder)
+        rate = df['realizedRate'].fillna(df['fundingRate']) if len(df) else df['fundingRate']
+        return cls(df['fundingTime'].to_numpy(), rate.to_numpy(), default_rate)
+
+    def rate_between(self, t0, t1):
+        """(t0, t1] 区间内结算的资金费率之和（毫秒时间戳）"""
+        if t1 <= t0:
+            return 0.0
+        if not len(self.times):
+            return settlements_between(t0, t1) * self.default_rate
+        i0 = np.searchsorted(self.times, t0, side='right')
+        i1 = np.searchsorted(self.times, t1, side='right')
+        total = self.cumrate[i1] - self.cumrate[i0]
+        # 历史数据覆盖范围之外按默认费率计算
+        first = int(self.times[0])
+        last = int(self.times[-1])
+        total += settlements_between(t0, min(t1, first - 1)) * self.default_rate
+        total += settlements_between(max(t0, last), t1) * self.default_rate
+        return total
+
+
+def settlements_between(t0, t1):
+    """(t0, t1] 区间内的8小时结算点个数"""
+    if t1 <= t0:
+        return 0
+    return t1 // FUNDING_INTERVAL_MS - t0 // FUNDING_INTERVAL_MS
+
+
+class SwapFees:
+    """
+    USDT本位永续合约手续费，不依赖backtrader，供fast_engine使用（backtrader版见funding_bt.SwapCommInfo）
+    - 按maker/taker费率收取手续费，费率可直接给出或通过 tier 选择
+    - 在8小时结算点按持仓名义价值收取/支付资金费：多头在费率为正时支付，空头收取
+    broker在每根K线对持仓调用 get_credit_interest，这里用它结算上次结算后经过的资金费
+    """
+    def __init__(self, maker=None, taker=None, tier='Lv1', funding=None):
+        # 与backtrader的参数对象用法相同：self.p.funding
+        self.p = SimpleNamespace(maker=maker, taker=taker, tier=tier, funding=funding)
+        default_maker, default_taker = FEE_TIERS[tier]
+        self.maker_fee = maker if maker is not None else default_maker
+        self.taker_fee = taker if taker is not None else default_taker
+        self.is_maker = False     # 由broker在撮合限价单时设置
+        self.funding_paid = 0.0
+
+    def getcommission(self, size, price):
+        return self._getcommission(size, price, pseudoexec=True)
+
+    def _getcommission(self, size, price, pseudoexec):
+        fee = self.maker_fee if self.is_maker else self.taker_fee
+        return abs(size) * price * fee
+
+    def get_credit_interest(self, data, pos, dt):
+        if self.p.funding is None or not pos.size:
+            return 0.0
+        rate = self.p.funding.rate_between(to_ms(pos.datetime), to_ms(dt))
+        if not rate:
+            return 0.0
+        payment = pos.size * data.close[0] * rate
+        self.funding_paid += payment
+        return payment
+
+
+if __name__ == "__main__":
+    # 下载产品列表中所有USDT永续合约的资金费率
+    instruments = pd.read_csv(os.path.join('data', 'swap产品信息.csv'))
+    instIds = instruments.loc[instruments['settleCcy'] == 'USDT', 'instId'].tolist()
+    bulk_update_funding(instIds)
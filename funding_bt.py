@@ -0,0 +1,30 @@
+"""
+funding的backtrader手续费对象，单独成模块，fast_engine回测不需要加载backtrader
+"""
+import backtrader as bt
+
+from funding import FEE_TIERS, SwapFees
+
+
+class SwapCommInfo(bt.CommInfoBase):
+    """USDT本位永续合约手续费的backtrader版，手续费和资金费的计算直接复用funding.SwapFees"""
+    params = (
+        ('maker', None),
+        ('taker', None),
+        ('tier', 'Lv1'),
+        ('funding', None),        # FundingSchedule，为None时不计资金费
+        ('stocklike', True),
+        ('commtype', bt.CommInfoBase.COMM_PERC),
+        ('percabs', True),
+    )
+
+    def __init__(self):
+        super(SwapCommInfo, self).__init__()
+        maker, taker = FEE_TIERS[self.p.tier]
+        self.maker_fee = self.p.maker if self.p.maker is not None else maker
+        self.taker_fee = self.p.taker if self.p.taker is not None else taker
+        self.is_maker = False     # 由broker在撮合限价单时设置
+        self.funding_paid = 0.0
+
+    _getcommission = SwapFees._getcommission
+    get_credit_interest = SwapFees.get_credit_interest
@@ -1,13 +1,5 @@
-import okx.PublicData as PublicData
-import pandas as pd
-flag = "0"  # 实盘:0 , 模拟盘：1
+from instruments import get_registry
 
-publicDataAPI = PublicData.PublicAPI(flag=flag)
-
-# 获取交易产品基础信息
-result = publicDataAPI.get_instruments(
-    instType="SWAP"
-)
-df=pd.DataFrame(result['data'])
-df.to_csv('swap产品信息.csv')
-print(result)
\ No newline at end of file
+# 获取交易产品基础信息并保存到 data/swap产品信息.csv（InstrumentRegistry 的本地缓存）
+registry = get_registry().refresh()
+print(f"共 {len(registry.inst_ids(state=None))} 个永续合约")
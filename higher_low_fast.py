@@ -0,0 +1,124 @@
+import os
+import time
+
+import pandas as pd
+
+import fast_engine as fe
+from checkpoint import CheckpointMixin, run_checkpointed
+from higher_low_logic import PARAMS, HigherLowLogic
+from pivot_detector import PivotDetector
+from volatility_regime import FastVolatilityRegime
+
+
+class PivotPointIndicator(fe.Indicator):
+    """只用于记录关键点的输出线，不参与计算"""
+    lines = ('pivots',)
+
+
+class FastHigherLowStrategy(CheckpointMixin, HigherLowLogic, fe.Strategy):
+    """
+    HigherLowStrategy 在 fast_engine 上的移植版
+    只重写 __init__ 中的指标创建，交易逻辑与原策略共用HigherLowLogic
+    """
+    params = PARAMS
+    # 断点续跑需要保存的状态（关键点、入场点、止损位、挂单）
+    checkpoint_attrs = ('order', 'buyprice', 'stoplose', 'highest_price', 'detector',
+                        'confirmed_high', 'confirmed_low', 'show_pivot', 'pivot_price',
+                        'potential_entry', 'wait_count')
+    checkpoint_lines = ('pivot_indicator',)
+
+    def __init__(self):
+        # 基础数据
+        self.dataclose = self.datas[0].close
+        self.datahigh = self.datas[0].high
+        self.datalow = self.datas[0].low
+        # 技术指标（与原策略相同，保证从同一根K线开始运行）
+        self.fast_ma = fe.SMA(self.data.close, period=self.params.fast_period)
+        self.slow_ma = fe.SMA(self.data.close, period=self.params.slow_period)
+        self.trend_ma = fe.SMA(self.data.close, period=self.params.trend_period)
+        self.crossover = fe.CrossOver(self.fast_ma, self.slow_ma)
+        self.vol = FastVolatilityRegime(self.data, atr_period=self.params.atr_period)
+        self.atr = self.vol.atr
+        # 订单和位置管理
+        self.order = None
+        self.buyprice = None
+        self.stoplose = None
+        self.highest_price = 0
+
+        self.boll = fe.BollingerBands(self.data,
+                                      period=self.params.n_period,
+                                      devfactor=self.params.std_multiplier)
+
+        self.detector = PivotDetector(period=self.params.n_period,
+                                      devfactor=self.params.std_multiplier,
+                                      min_gap=self.params.min_gap)
+        self.pivot_points_high = self.detector.highs
+        self.pivot_points_low = self.detector.lows
+        self.confirmed_high = None
+        self.confirmed_low = None
+
+        self.show_pivot = False
+        self.pivot_price = None
+        self.pivot_indicator = PivotPointIndicator(self.data)
+        self.potential_entry = None
+
+    def after_restore(self):
+        self.pivot_points_high = self.detector.highs
+        self.pivot_points_low = self.detector.lows
+
+    def boundary_state(self, offset=0):
+        """
+        分段回测拼接用的状态：持仓/挂单、入场点和止损、关键点识别器的状态
+        K线序号换算为全局序号（本段第一根的全局序号为offset）
+        """
+        def key(p):
+            return None if p is None else (p.price, p.index + offset, p.type)
+        d = self.detector
+        entry = key(self.potential_entry)
+        return (bool(self.position), bool(self.broker.pending), entry,
+                getattr(self, 'wait_count', None) if entry else None,
+                self.stoplose, self.highest_price if self.position else 0,
+                d.trend, d.ext_price, None if d.ext_index is None else d.ext_index + offset,
+                key(d.last_pivot), tuple(map(key, d.highs)), tuple(map(key, d.lows)))
+
+
+def run_fast_backtest(df, inst_id='DOGE-USDT-SWAP', quiet=True, checkpoint=None, checkpoint_every=100000,
+                      **params):
+    """
+    用fast_engine回测HigherLowStrategy，资金/手续费/滑点设置与run_combined_backtest相同
+    checkpoint: 断点文件路径，设置后每checkpoint_every根K线写一次断点，再次运行时从断点继续
+    """
+    from funding import FundingSchedule, SwapFees
+    from instruments import get_instrument
+
+    engine = fe.Engine(cash=100000.0)
+    engine.broker.addcommissioninfo(SwapFees(funding=FundingSchedule.from_store(inst_id)))
+    engine.broker.set_slippage_perc(0.001)
+    strategy_cls = FastHigherLowStrategy
+    if quiet:
+        strategy_cls = type('QuietHigherLowStrategy', (FastHigherLowStrategy,),
+                            {'log': lambda self, txt, dt=None: None})
+    params.setdefault('instrument', get_instrument(inst_id, auto_refresh=False))
+    t0 = time.perf_counter()
+    if checkpoint:
+        strat = run_checkpointed(engine, strategy_cls, fe.DataFeed.from_dataframe(df), checkpoint,
+                                 every=checkpoint_every, **params)
+    else:
+        strat = engine.run(strategy_cls, df, **params)
+    elapsed = time.perf_counter() - t0
+    return engine, strat, elapsed
+
+
+if __name__ == "__main__":
+    data_path = os.path.join('data', 'doge1m')
+    files = sorted(f for f in os.listdir(data_path) if f.endswith('.csv'))
+    df = pd.concat([pd.read_csv(os.path.join(data_path, f)) for f in files], ignore_index=True)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    df = df.sort_values('datetime').reset_index(drop=True)
+
+    engine, strat, elapsed = run_fast_backtest(df)
+    final_value = engine.broker.getvalue()
+    print(f"总K线数: {len(df)}，耗时: {elapsed:.2f}秒，{len(df) / elapsed:,.0f} bars/s")
+    print(f"最终资金: {final_value:.2f}")
+    print(f"总收益率: {(final_value / 100000.0 - 1) * 100:.2f}%")
+    print(f"最大回撤: {engine.max_drawdown():.2f}%")
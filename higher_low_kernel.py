@@ -0,0 +1,390 @@
+import os
+import time
+
+import numpy as np
+
+from volatility_regime import compute_regime
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:  # 没有numba时退回纯Python，结果相同，只是慢
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# 信号编码
+BUY = 1
+EXIT_TRAILING = -1   # 移动止损
+EXIT_STOP = -2       # 固定止损
+
+
+@njit(cache=True)
+def _add_partial(partials, n, x):
+    """把x精确加到非重叠部分和partials[:n]中（CPython math.fsum的msum），返回新的n"""
+    i = 0
+    for j in range(n):
+        y = partials[j]
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo != 0.0:
+            partials[i] = lo
+            i += 1
+        x = hi
+    if x != 0.0:
+        partials[i] = x
+        i += 1
+    return i
+
+
+@njit(cache=True)
+def _round_partials(partials, n):
+    """部分和 -> 正确舍入的浮点数（与math.fsum的最后一步相同，含向偶数舍入的修正）"""
+    if n == 0:
+        return 0.0
+    n -= 1
+    hi = partials[n]
+    lo = 0.0
+    while n > 0:
+        x = hi
+        n -= 1
+        y = partials[n]
+        hi = x + y
+        lo = y - (hi - x)
+        if lo != 0.0:
+            break
+    if n > 0 and ((lo < 0.0 and partials[n - 1] < 0.0) or (lo > 0.0 and partials[n - 1] > 0.0)):
+        y = lo * 2.0
+        x = hi + y
+        if y == x - hi:
+            hi = x
+    return hi
+
+
+@njit(cache=True)
+def _rolling_fsum(x, period, out):
+    """滑动窗口的精确和：部分和中加入新值、减去移出的值，每根K线舍入一次"""
+    partials = np.zeros(64)
+    n = 0
+    for i in range(len(x)):
+        n = _add_partial(partials, n, x[i])
+        if i >= period:
+            n = _add_partial(partials, n, -x[i - period])
+        if i >= period - 1:
+            out[i] = _round_partials(partials, n)
+
+
+def rolling_fsum(x, period):
+    """每个窗口的 math.fsum，与backtrader的Average逐位相同，前period-1个值为nan"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    _rolling_fsum(x, period, out)
+    return out
+
+
+@njit(cache=True)
+def _pow(x, exponent, out):
+    for i in range(len(x)):
+        out[i] = x[i] ** exponent[0]
+
+
+def libm_pow(x, exponent):
+    """与Python的 ** 相同（C库pow）；numpy的 **2 / **0.5 走乘法/sqrt，末位可能不同"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty(len(x))
+    # 指数以数组传入，避免编译时按常数优化成乘法/sqrt
+    _pow(x, np.array([exponent], dtype=np.float64), out)
+    return out
+
+
+def bt_bollinger_bands(close, period=40, devfactor=2.0):
+    """
+    与HigherLowStrategy中的BollingerBands（backtrader的SMA ± devfactor * StdDev）逐位相同的布林带，
+    入场条件用它判断，结果才能与backtrader完全一致；前period-1个值为nan
+    """
+    close = np.asarray(close, dtype=np.float64)
+    ma = rolling_fsum(close, period) / period
+    meansq = rolling_fsum(libm_pow(close, 2.0), period) / period
+    std = libm_pow(np.abs(meansq - libm_pow(ma, 2.0)), 0.5)
+    return ma, ma + devfactor * std, ma - devfactor * std
+
+
+@njit(cache=True)
+def _detector_bands(x, period, devfactor, ref, upper, lower):
+    """PivotDetector._update_bands 的逐根递推（滑动和增量更新，每转一圈用math.fsum同样的精确和重置）"""
+    partials = np.zeros(64)
+    partials_sq = np.zeros(64)
+    total = 0.0
+    totalsq = 0.0
+    for i in range(len(x)):
+        v = x[i]
+        if (i + 1) % period == 0:
+            n = 0
+            nsq = 0
+            for j in range(i + 1 - period, i + 1):
+                n = _add_partial(partials, n, x[j])
+                nsq = _add_partial(partials_sq, nsq, x[j] * x[j])
+            total = _round_partials(partials, n)
+            totalsq = _round_partials(partials_sq, nsq)
+        else:
+            old = x[i - period] if i >= period else 0.0
+            total += v - old
+            totalsq += v * v - old * old
+        if i + 1 >= period:
+            mean = total / period
+            std = abs(totalsq / period - mean * mean) ** 0.5
+            ma = ref + mean
+            upper[i] = ma + devfactor * std
+            lower[i] = ma - devfactor * std
+
+
+def detector_bands(close, period=40, devfactor=2.0):
+    """与PivotDetector逐根更新得到的布林带上下轨逐位相同（关键点识别用），前period-1个值为nan"""
+    close = np.asarray(close, dtype=np.float64)
+    upper = np.full(len(close), np.nan)
+    lower = np.full(len(close), np.nan)
+    if len(close) < period:
+        return upper, lower
+    _detector_bands(close - close[0], period, float(devfactor), close[0], upper, lower)
+    return upper, lower
+
+
+@njit(cache=True)
+def _higher_low_kernel(ts, open_, high, low, close, pivot_upper, pivot_lower, ma, lower, atr_pct, start,
+                       period, min_gap, wait_bars, bounce_thresh, trailing_stop, atr_thresh, slippage,
+                       signals, fills):
+    """
+    HigherLowStrategy.next 的编译版状态机，一次遍历整段数据
+    关键点用pivot_upper/pivot_lower（PivotDetector的布林带），入场用ma/lower（策略BollingerBands）
+    signals[i]: 第i根K线收盘时发出的信号（BUY/EXIT_*），fills[i]: 第i根开盘成交价
+    订单在下单之后第一根时间戳更大的K线开盘成交，与backtrader/fast_engine相同
+    """
+    n = len(close)
+    # 关键点识别（与PivotDetector相同）
+    trend = 0
+    ext_price = 0.0
+    ext_index = 0
+    last_pivot_index = -1
+    hi_price = np.zeros(2)
+    hi_count = 0
+    lo_price = np.zeros(2)
+    lo_count = 0
+    # 持仓与订单
+    pending = 0            # 1=买单, -1=卖单
+    order_ts = 0
+    position = 0           # 1=持有多头
+    highest_price = 0.0
+    stoplose = np.nan
+    has_entry = False
+    entry_price = 0.0      # potential_entry.price
+    wait_count = 0
+
+    for i in range(n):
+        # 撮合上一根之前提交的订单
+        if pending != 0 and ts[i] > order_ts:
+            if pending == 1:
+                price = min(open_[i] * (1.0 + slippage), high[i])
+                position = 1
+                highest_price = price
+            else:
+                price = max(open_[i] * (1.0 - slippage), low[i])
+                position = 0
+                has_entry = False
+                stoplose = np.nan
+                highest_price = 0.0
+            fills[i] = price
+            pending = 0
+
+        # 更新关键点
+        if i >= period - 1:
+            confirmed = 0
+            if trend == 1:
+                if high[i] > ext_price:
+                    ext_price = high[i]
+                    ext_index = i
+                elif low[i] < pivot_lower[i]:
+                    confirmed = 1
+            elif trend == -1:
+                if low[i] < ext_price:
+                    ext_price = low[i]
+                    ext_index = i
+                elif high[i] > pivot_upper[i]:
+                    confirmed = -1
+            elif high[i] > pivot_upper[i]:
+                trend = 1
+                ext_price = high[i]
+                ext_index = i
+            elif low[i] < pivot_lower[i]:
+                trend = -1
+                ext_price = low[i]
+                ext_index = i
+            if confirmed != 0:
+                if last_pivot_index < 0 or ext_index - last_pivot_index >= min_gap:
+                    if trend == 1:
+                        hi_price[0] = hi_price[1]
+                        hi_price[1] = ext_price
+                        hi_count += 1
+                    else:
+                        lo_price[0] = lo_price[1]
+                        lo_price[1] = ext_price
+                        lo_count += 1
+                    last_pivot_index = ext_index
+                trend = -trend
+                if trend == 1:
+                    ext_price = high[i]
+                else:
+                    ext_price = low[i]
+                ext_index = i
+
+        if i < start or pending != 0:
+            continue
+
+        c = close[i]
+        if position == 1:
+            if c > highest_price:
+                highest_price = c
+            if c < highest_price * (1.0 - trailing_stop):
+                signals[i] = EXIT_TRAILING
+                pending = -1
+                order_ts = ts[i]
+                continue
+            if not np.isnan(stoplose) and c < stoplose:
+                signals[i] = EXIT_STOP
+                pending = -1
+                order_ts = ts[i]
+                continue
+
+        if hi_count >= 2 and lo_count >= 2:
+            if lo_price[1] > lo_price[0] and low[i] < ma[i] and c > lo_price[0]:
+                has_entry = True
+                entry_price = lo_price[1]
+                wait_count = wait_bars
+
+        if has_entry and position == 0 and low[i] < lower[i] and c > entry_price \
+                and atr_pct[i] <= atr_thresh:
+            if wait_count > 0:
+                wait_count -= 1
+            elif (c - entry_price) / entry_price > bounce_thresh:
+                stoplose = entry_price
+                signals[i] = BUY
+                pending = 1
+                order_ts = ts[i]
+
+
+def strategy_minperiod(params):
+    """HigherLowStrategy中所有指标都有值的最早K线数（backtrader开始调用next的位置）"""
+    return max(params['n_period'], params['fast_period'], params['slow_period'] + 1,
+               params['trend_period'] + 1, params['atr_period'] + 1)
+
+
+def higher_low_signals(df, slippage=0.001, **params):
+    """
+    对整段K线一次性生成HigherLowStrategy的信号
+    返回 (signals, fills)：signals为int8数组（BUY/EXIT_TRAILING/EXIT_STOP/0），
+    fills为成交价数组（没有成交为nan）
+    """
+    from higher_low_logic import PARAMS
+
+    p = dict(PARAMS)
+    p.update(params)
+    if 'datetime' in df:
+        ts = df['datetime'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    else:
+        ts = df['ts'].to_numpy(dtype=np.int64)
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    # 关键点和入场条件在策略里用的是两套布林带（PivotDetector增量计算 / backtrader指标），
+    # 这里分别按相同的运算顺序计算，边界上的比较结果才能一致
+    pivot_upper, pivot_lower = detector_bands(close, p['n_period'], p['std_multiplier'])
+    ma, _, lower = bt_bollinger_bands(close, p['n_period'], p['std_multiplier'])
+    atr_pct = compute_regime(high, low, close, atr_period=p['atr_period'])['atr_pct']
+    signals = np.zeros(len(close), dtype=np.int8)
+    fills = np.full(len(close), np.nan)
+    _higher_low_kernel(ts, open_, high, low, close, pivot_upper, pivot_lower, ma, lower, atr_pct,
+                       strategy_minperiod(p) - 1, p['n_period'], p['min_gap'], p['wait_bars'],
+                       p['bounce_thresh'], p['trailing_stop'], p['atr_thresh'], slippage, signals, fills)
+    return signals, fills
+
+
+def check_equivalence(df, inst_id='DOGE-USDT-SWAP', **params):
+    """
+    与backtrader版HigherLowStrategy逐笔对比：下单K线、信号类型和成交价必须一致
+    一致返回True，否则打印第一处差异并返回False
+    """
+    import backtrader as bt
+    from funding import FundingSchedule
+    from funding_bt import SwapCommInfo
+    from higher_low_strategy1_1 import HigherLowStrategy
+
+    class Recorder(HigherLowStrategy):
+        def __init__(self):
+            super(Recorder, self).__init__()
+            self.orders = []   # (下单K线序号, 信号, 成交K线序号, 成交价)
+
+        def log(self, txt, dt=None):
+            pass
+
+        def buy(self, *args, **kwargs):
+            order = super(Recorder, self).buy(*args, **kwargs)
+            self.orders.append([len(self) - 1, BUY, order])
+            return order
+
+        def close(self, *args, **kwargs):
+            order = super(Recorder, self).close(*args, **kwargs)
+            trailing = self.dataclose[0] < self.highest_price * (1 - self.p.trailing_stop)
+            self.orders.append([len(self) - 1, EXIT_TRAILING if trailing else EXIT_STOP, order])
+            return order
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.addstrategy(Recorder, **params)
+    cerebro.adddata(bt.feeds.PandasData(dataname=df, datetime='datetime', open='open', high='high',
+                                        low='low', close='close', volume='vol', openinterest=None))
+    cerebro.broker.setcash(100000.0)
+    cerebro.broker.addcommissioninfo(SwapCommInfo(funding=FundingSchedule.from_store(inst_id)))
+    cerebro.broker.set_slippage_perc(0.001)
+    strat = cerebro.run()[0]
+
+    signals, fills = higher_low_signals(df, slippage=0.001, **params)
+    kernel = [(int(i), int(signals[i])) for i in np.flatnonzero(signals)]
+    expected = [(i, sig) for i, sig, _ in strat.orders]
+    kernel_fills = fills[~np.isnan(fills)]
+    bt_fills = np.array([o.executed.price for _, _, o in strat.orders if o.status == o.Completed])
+    if kernel != expected:
+        for k, (a, b) in enumerate(zip(kernel, expected)):
+            if a != b:
+                print(f'第{k}个信号不一致: kernel={a}, backtrader={b}')
+                break
+        else:
+            print(f'信号数量不一致: kernel={len(kernel)}, backtrader={len(expected)}')
+        return False
+    if len(kernel_fills) != len(bt_fills) or not np.allclose(kernel_fills, bt_fills, rtol=0, atol=1e-12):
+        print('成交价不一致')
+        return False
+    print(f'一致: {len(kernel)}个信号, {len(bt_fills)}笔成交')
+    return True
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    data_path = os.path.join('data', 'doge1m')
+    files = sorted(f for f in os.listdir(data_path) if f.endswith('.csv'))[:20]
+    df = pd.concat([pd.read_csv(os.path.join(data_path, f)) for f in files], ignore_index=True)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    df = df.sort_values('datetime').reset_index(drop=True)
+
+    check_equivalence(df)
+
+    higher_low_signals(df)  # 首次调用包含编译时间
+    t0 = time.perf_counter()
+    signals, fills = higher_low_signals(df)
+    elapsed = time.perf_counter() - t0
+    print(f'{"numba" if HAS_NUMBA else "纯Python"} 内核: {len(df)}根K线耗时 {elapsed * 1000:.2f}毫秒，'
+          f'买入 {int((signals == BUY).sum())} 次，平仓 {int((signals < 0).sum())} 次')
@@ -0,0 +1,173 @@
+"""
+HigherLowStrategy的参数和交易逻辑，不依赖backtrader
+backtrader版(higher_low_strategy1_1)和fast_engine版(higher_low_fast)都继承HigherLowLogic，
+只各自在__init__中创建指标；fast_engine回测和参数扫描进程因此不需要导入backtrader
+"""
+
+PARAMS = (
+    ('n_period', 40),          # 布林带周期
+    ('std_multiplier', 2.0),   # 布林带标准差倍数
+    ('min_gap', 10),          # 高低点最小间隔
+    ('wait_bars', 3),         # 等待确认的K线数
+    ('bounce_thresh', 0.005),   # 回调确认阈值(0.5%)
+    ('stop_loss', 0.02),      # 止损比例(1%)
+    ('trailing_stop', 0.01),   # 移动止损比例(0.5%)
+    ('fast_period', 5),    # 快速均线周期
+    ('slow_period', 15),    # 慢速均线周期
+    ('trend_period', 40),   # 趋势均线周期
+    ('trend_thresh', 0),    # 趋势判断阈值
+    ('atr_period', 40),     # ATR周期
+    ('atr_thresh', 30),    # ATR阈值（百分比）
+    ('instrument', None),  # instruments.Instrument，设置后按合约张数取整下单数量
+)
+
+
+class HigherLowLogic:
+    """
+    关键点确认、入场和止损的逐根K线逻辑
+    子类需要提供 dataclose/datahigh/datalow、boll、vol、detector、pivot_indicator 以及 buy/close/broker/position
+    """
+    def log(self, txt, dt=None):
+        # 精确到分钟
+        dt = dt or self.datas[0].datetime.datetime(0)
+        print(f'{dt.strftime("%Y-%m-%d %H:%M")}, {txt}')
+
+    def notify_order(self, order):
+        # 部分成交时订单仍在撮合中，等全部成交后再处理，避免重复下单
+        if order.status in [order.Submitted, order.Accepted, order.Partial]:
+            return
+
+        if order.status in [order.Completed]:
+            if order.isbuy():
+                self.log(f'BUY执行, 价格: {order.executed.price:.4f}, 数量: {order.executed.size:.3f}')
+                self.buyprice = order.executed.price
+                self.highest_price = self.buyprice
+            elif order.issell() or order.isclose():
+                self.log(f'SELL执行, 价格: {order.executed.price:.4f}, 数量: {order.executed.size:.3f}')
+                self.reset_trade_vars()
+
+        elif order.status in [order.Canceled, order.Margin, order.Rejected]:
+            self.log('订单取消/保证金不足/拒绝')
+
+        self.order = None
+
+    def is_higher_low(self, current_low):
+        """判断是否形成更高的低点"""
+        if not self.last_low:
+            return False
+        return current_low > self.last_low.price
+
+    def check_bounce(self):
+        """检查是否出现足够的回调"""
+        if not self.potential_entry:
+            return False
+        current_price = self.dataclose[0]
+        entry_price = self.potential_entry.price
+        bounce = (current_price - entry_price) / entry_price
+        return bounce > self.params.bounce_thresh
+
+    def is_valid_pattern(self):
+        """检查是否形成有效的交易模式"""
+        if (len(self.pivot_points_high) < 1 or 
+            len(self.pivot_points_low) < 2):
+            return False
+            
+        last_high = self.pivot_points_high[-1]
+        last_low = self.pivot_points_low[-1]
+        prev_low = self.pivot_points_low[-2]
+        
+        # 检查高点和低点的顺序是否正确
+        if last_high.index < prev_low.index:
+            return False
+        
+        # 检查价格关系
+        return (last_low.price > prev_low.price and
+                last_high.price > (self.confirmed_high.price if self.confirmed_high else 0))
+
+    def reset_trade_vars(self):
+        """重置交易相关变量"""
+        # 补充重置，防止旧状态影响后续逻辑
+        self.potential_entry = None
+        self.buyprice = None
+        self.stoplose = None
+        self.highest_price = 0
+        self.show_pivot = False
+        self.pivot_price = None
+
+    def update_pivots(self):
+        """每根K线都更新关键点，不受挂单和止损提前返回的影响"""
+        pivot = self.detector.update(self.datahigh[0], self.datalow[0], self.dataclose[0])
+        self.show_pivot = pivot is not None
+        self.pivot_price = pivot.price if pivot is not None else None
+        if pivot is None:
+            self.pivot_indicator.lines.pivots[0] = float('nan')
+            return
+        self.pivot_indicator.lines.pivots[0] = pivot.price
+        if pivot.type == 'low':
+            self.confirmed_low = pivot
+            self.log(f'确认低点: {pivot.price:.4f}')
+        else:
+            self.confirmed_high = pivot
+            self.log(f'确认高点: {pivot.price:.5f}')
+
+    def prenext(self):
+        # 指标未就绪时也要喂给关键点识别器，保证K线序号从第一根开始
+        self.update_pivots()
+
+    def next(self):
+        self.update_pivots()
+        # 如果有未完成订单，避免重复下单
+        if self.order:
+            return
+        
+        # 处理订单和持仓（仅在有多头仓位时考虑止损/移动止损）
+        if self.position and self.position.size > 0:
+            # 更新最高价
+            if self.dataclose[0] > self.highest_price:
+                self.highest_price = self.dataclose[0]
+                
+            # 移动止损检查
+            trailing_stop = self.highest_price * (1 - self.params.trailing_stop)
+            if self.dataclose[0] < trailing_stop:
+                self.log(f'移动止损触发, 价格: {self.dataclose[0]:.4f}')
+                self.order = self.close()  # 只平掉当前多头，不做反手
+                return
+               
+            # 固定止损检查
+            if self.stoplose is not None and self.dataclose[0] < self.stoplose:
+                self.log(f'止损触发, 价格: {self.dataclose[0]:.4f}')
+                self.order = self.close()  # 只平掉当前多头
+                return
+        
+        # 检查是否形成有效的更高低点模式
+        if (len(self.pivot_points_high) >= 2 and 
+            len(self.pivot_points_low) >= 2):
+            last_high = self.pivot_points_high[-1]
+            last_low = self.pivot_points_low[-1]
+            prev_low = self.pivot_points_low[-2]
+            prev_high = self.pivot_points_high[-2]
+            # if self.datalow[0] < self.boll.lower[0]:
+            #     print('当前价格低于布林带下轨')
+            # if self.datalow[0] < prev_high.price:
+            #     print('当前价格低于上一个高点')
+            if last_low.price > prev_low.price and self.datalow[0] < self.boll.ma[0] and self.dataclose[0]>prev_low.price:
+                self.potential_entry = last_low
+                self.wait_count = self.params.wait_bars
+                self.log(f'发现更高低点模式: 低点价格: {last_low.price:.4f}')
+            
+        
+        # 入场逻辑（仅在空仓时买入，且避免多次下单）
+        # 波动率过大（ATR超过价格的atr_thresh%）时不开仓
+        if (self.potential_entry and not self.position and self.datalow[0] < self.boll.lower[0]
+                and self.dataclose[0] > self.potential_entry.price
+                and self.vol.atr_pct[0] <= self.params.atr_thresh):
+            if self.wait_count > 0:
+                self.wait_count -= 1
+            elif self.check_bounce():
+                size = self.broker.getcash() * 0.5 / self.dataclose[0]
+                if self.p.instrument is not None:
+                    size = self.p.instrument.round_size(size, self.dataclose[0])
+                if size > 0:
+                    self.stoplose = self.potential_entry.price
+                    self.log(f'买入信号触发, 价格: {self.dataclose[0]:.4f}, 止损: {self.stoplose:.4f}')
+                    self.order = self.buy(size=size)
@@ -0,0 +1,198 @@
+import math
+import os
+import threading
+import time
+
+INSTRUMENTS_FILE = os.path.join('data', 'swap产品信息.csv')
+DEFAULT_TTL = 24 * 60 * 60   # 本地缓存一天后自动刷新
+
+
+def _decimals(step):
+    """步长对应的小数位数，0.01 -> 2，1 -> 0"""
+    return max(0, -int(math.floor(math.log10(step) + 1e-9)))
+
+
+class Instrument:
+    """
+    单个合约的交易规则
+    回测和策略中的size都以币为单位（与K线价格一致），下单前按合约面值换算成张数，
+    再按lotSz向下取整、低于minSz视为0，最后换回币的数量
+    """
+    __slots__ = ('inst_id', 'ct_val', 'ct_type', 'lot_sz', 'min_sz', 'tick_sz',
+                 'settle_ccy', 'lever', 'state', '_lot_dec', '_tick_dec')
+
+    def __init__(self, inst_id, ct_val=1.0, lot_sz=1.0, min_sz=1.0, tick_sz=0.0001,
+                 ct_type='linear', settle_ccy='USDT', lever=None, state='live'):
+        self.inst_id = inst_id
+        self.ct_val = float(ct_val)
+        self.ct_type = ct_type
+        self.lot_sz = float(lot_sz)
+        self.min_sz = float(min_sz)
+        self.tick_sz = float(tick_sz)
+        self.settle_ccy = settle_ccy
+        self.lever = lever
+        self.state = state
+        self._lot_dec = _decimals(self.lot_sz)
+        self._tick_dec = _decimals(self.tick_sz)
+
+    def __repr__(self):
+        return f"Instrument({self.inst_id}, ctVal={self.ct_val}, lotSz={self.lot_sz}, tickSz={self.tick_sz})"
+
+    def to_contracts(self, size, price=None):
+        """币数量 -> 张数（反向合约面值以计价货币计，需要价格）"""
+        if self.ct_type == 'inverse':
+            return size * price / self.ct_val
+        return size / self.ct_val
+
+    def to_coins(self, contracts, price=None):
+        """张数 -> 币数量"""
+        if self.ct_type == 'inverse':
+            return contracts * self.ct_val / price
+        return contracts * self.ct_val
+
+    def round_contracts(self, contracts):
+        """按lotSz向下取整，不足minSz返回0"""
+        sign = -1.0 if contracts < 0 else 1.0
+        lots = math.floor(abs(contracts) / self.lot_sz + 1e-9)
+        contracts = round(lots * self.lot_sz, self._lot_dec)
+        if contracts < self.min_sz:
+            return 0.0
+        return sign * contracts
+
+    def round_size(self, size, price=None):
+        """币数量按可下单的张数向下取整后换回币数量"""
+        contracts = self.round_contracts(self.to_contracts(size, price))
+        return self.to_coins(contracts, price)
+
+    def size_from_cash(self, cash, price):
+        """用给定资金按价格能买入的币数量（已按张数取整）"""
+        if price <= 0:
+            return 0.0
+        return self.round_size(cash / price, price)
+
+    def round_price(self, price, side=None):
+        """
+        按tickSz取整：side='buy'向下、'sell'向上（限价单不越过原价），None为四舍五入
+        """
+        ticks = price / self.tick_sz
+        if side == 'buy':
+            ticks = math.floor(ticks + 1e-9)
+        elif side == 'sell':
+            ticks = math.ceil(ticks - 1e-9)
+        else:
+            ticks = round(ticks)
+        return round(ticks * self.tick_sz, self._tick_dec)
+
+
+def _field(rec, key, default=None):
+    """记录中的字段，缺失、为空/0或nan（CSV中的空单元格）时返回default"""
+    value = rec.get(key)
+    if not value or (isinstance(value, float) and math.isnan(value)):
+        return default
+    return value
+
+
+def _from_record(rec):
+    lever = _field(rec, 'lever')
+    return Instrument(rec['instId'], ct_val=_field(rec, 'ctVal', 1.0), lot_sz=_field(rec, 'lotSz', 1.0),
+                      min_sz=_field(rec, 'minSz', 0.0), tick_sz=_field(rec, 'tickSz', 0.0001),
+                      ct_type=_field(rec, 'ctType', 'linear'), settle_ccy=_field(rec, 'settleCcy'),
+                      lever=float(lever) if lever is not None else None,
+                      state=_field(rec, 'state'))
+
+
+class InstrumentRegistry:
+    """
+    合约信息缓存，instId -> Instrument 的字典查找
+    数据来自 get_data.py 保存的 swap产品信息.csv；文件超过ttl秒未更新时通过REST接口刷新，
+    刷新失败（例如离线回测）时继续使用本地文件
+    """
+    def __init__(self, path=INSTRUMENTS_FILE, ttl=DEFAULT_TTL, inst_type='SWAP', auto_refresh=True):
+        self.path = path
+        self.ttl = ttl
+        self.inst_type = inst_type
+        self.auto_refresh = auto_refresh
+        self._by_id = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stale(self):
+        if not os.path.exists(self.path):
+            return True
+        return time.time() - os.path.getmtime(self.path) > self.ttl
+
+    def load(self):
+        """从本地文件加载（需要时先刷新）"""
+        import pandas as pd
+
+        if self.auto_refresh and self._stale():
+            try:
+                self.refresh()
+                return self
+            except Exception as e:
+                print(f"刷新合约信息失败，使用本地缓存: {e}")
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"合约信息文件不存在: {self.path}")
+        df = pd.read_csv(self.path)
+        self._set(df.to_dict('records'))
+        return self
+
+    def refresh(self):
+        """从OKX下载最新合约信息并写入本地文件"""
+        import pandas as pd
+        from okx_rest import get_client
+
+        records = get_client().get_instruments(inst_type=self.inst_type)
+        df = pd.DataFrame(records)
+        for col in ('ctVal', 'lotSz', 'minSz', 'tickSz', 'lever'):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        df.to_csv(self.path)
+        self._set(df.to_dict('records'))
+        return self
+
+    def _set(self, records):
+        by_id = {rec['instId']: _from_record(rec) for rec in records}
+        with self._lock:
+            self._by_id = by_id
+            self._loaded_at = time.time()
+
+    def _ensure(self):
+        if not self._by_id or (self.auto_refresh and time.time() - self._loaded_at > self.ttl):
+            self.load()
+
+    def get(self, inst_id, default=None):
+        self._ensure()
+        return self._by_id.get(inst_id, default)
+
+    def __getitem__(self, inst_id):
+        self._ensure()
+        return self._by_id[inst_id]
+
+    def __contains__(self, inst_id):
+        self._ensure()
+        return inst_id in self._by_id
+
+    def inst_ids(self, state='live', settle_ccy=None):
+        self._ensure()
+        return [i.inst_id for i in self._by_id.values()
+                if (state is None or i.state == state) and (settle_ccy is None or i.settle_ccy == settle_ccy)]
+
+
+_registries = {}
+
+
+def get_registry(auto_refresh=True):
+    """
+    进程内共享的合约信息缓存
+    回测使用 auto_refresh=False，只读本地文件，结果不随网络状态变化
+    """
+    registry = _registries.get(auto_refresh)
+    if registry is None:
+        registry = _registries[auto_refresh] = InstrumentRegistry(auto_refresh=auto_refresh)
+    return registry
+
+
+def get_instrument(inst_id, auto_refresh=True):
+    """查找合约，不存在返回None"""
+    return get_registry(auto_refresh).get(inst_id)
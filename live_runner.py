@@ -0,0 +1,451 @@
+"""
+多进程实盘运行器：一个行情进程，多个策略进程
+    行情进程: 连接OKX WebSocket（或本地回放），每条消息只解析一次，已完结的K线规范化后写入共享内存环形缓冲区
+    策略进程: 各自从环形缓冲区读取（不加锁、互不影响），按品种驱动分配给自己的fast_engine策略
+每个策略进程有自己的解释器和GIL，策略数量增加时按CPU核数扩展。
+环形缓冲区是单写多读的：每个槽位写完数据后最后写入序号，读取方复制前后各检查一次序号，判断数据是否完整/是否已被覆盖。
+实时行情不能等：读取方落后超过容量时跳过被覆盖的K线并计入dropped；
+回放时行情进程等待最慢的读取方（各读取方的进度记录在共享内存中），一根K线都不丢。
+    python live_runner.py --inst DOGE-USDT-SWAP BTC-USDT-SWAP --workers 4
+    python live_runner.py --inst DOGE-USDT-SWAP --replay 20220411 20220430 --workers 2 --grid bounce_thresh=0.003,0.005
+    python live_runner.py --inst DOGE-USDT-SWAP --url ws://127.0.0.1:8765 --workers 2      # 连接 replay.py --serve 8765
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import queue
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+WS_BUSINESS_URL = "wss://ws.okx.com:8443/ws/v5/business"   # K线频道在business端点
+
+BAR_RECORD = np.dtype([
+    ('seq', 'i8'),      # 写入序号+1，最后写入；与期望值不同说明槽位未写完或已被覆盖
+    ('inst', 'i4'),     # 品种在instIds列表中的序号
+    ('ts', 'i8'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('vol', 'f8'),
+    ('pub_ns', 'i8'),   # 写入时的 time.time_ns()，用于统计进程间传递延迟
+])
+HEADER_BYTES = 64       # 单独一个缓存行：[已写入条数, 是否结束, 容量, 读取方数量, 是否等待读取方]
+CURSOR_BYTES = 64       # 每个读取方的进度各占一个缓存行
+DETACHED = np.iinfo(np.int64).max   # 已退出的读取方，写入时不再等待
+
+
+class BarRing:
+    """
+    共享内存中的K线环形缓冲区，行情进程create，策略进程按name和读取方序号attach
+    blocking=True时写入方在追上最慢的读取方之前等待（回放），否则覆盖未读的槽位（实时行情）
+    """
+    def __init__(self, shm, owner, reader=None, poll=0.0005):
+        self.shm = shm
+        self.owner = owner
+        self.reader = reader
+        self.poll = poll
+        self.header = np.ndarray(5, dtype=np.int64, buffer=shm.buf)
+        self.capacity = int(self.header[2])
+        readers = int(self.header[3])
+        self.blocking = bool(self.header[4])
+        self.cursors = np.ndarray((readers, CURSOR_BYTES // 8), dtype=np.int64, buffer=shm.buf,
+                                  offset=HEADER_BYTES)[:, 0]
+        self.slots = np.ndarray(self.capacity, dtype=BAR_RECORD, buffer=shm.buf,
+                                offset=HEADER_BYTES + readers * CURSOR_BYTES)
+        self._slowest = 0
+
+    @classmethod
+    def create(cls, capacity=1 << 16, readers=0, blocking=False):
+        size = HEADER_BYTES + readers * CURSOR_BYTES + capacity * BAR_RECORD.itemsize
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        header = np.ndarray(5, dtype=np.int64, buffer=shm.buf)
+        header[:] = (0, 0, capacity, readers, int(blocking))
+        del header
+        ring = cls(shm, owner=True)
+        ring.cursors[:] = 0
+        ring.slots['seq'] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, reader=None, poll=0.0005):
+        return cls(shared_memory.SharedMemory(name=name), owner=False, reader=reader, poll=poll)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def written(self):
+        return int(self.header[0])
+
+    @property
+    def closed(self):
+        return bool(self.header[1])
+
+    def _wait_readers(self, seq):
+        """等到最慢的读取方读完将被覆盖的槽位"""
+        while seq - self._slowest >= self.capacity:
+            self._slowest = int(self.cursors.min())
+            if seq - self._slowest >= self.capacity:
+                time.sleep(self.poll)
+
+    def publish(self, inst, ts, o, h, l, c, v):
+        seq = int(self.header[0])
+        if self.blocking and len(self.cursors):
+            self._wait_readers(seq)
+        slot = self.slots[seq % self.capacity]
+        slot['seq'] = 0
+        slot['inst'] = inst
+        slot['ts'] = ts
+        slot['open'] = o
+        slot['high'] = h
+        slot['low'] = l
+        slot['close'] = c
+        slot['vol'] = v
+        slot['pub_ns'] = time.time_ns()
+        slot['seq'] = seq + 1
+        self.header[0] = seq + 1
+
+    def finish(self):
+        self.header[1] = 1
+
+    def read(self, cursor):
+        """读取cursor之后的新K线，返回 (记录数组, 新cursor, 跳过条数)"""
+        written = int(self.header[0])
+        if written == cursor:
+            return np.empty(0, dtype=BAR_RECORD), cursor, 0
+        start = max(cursor, written - self.capacity)
+        idx = np.arange(start, written) % self.capacity
+        expected = np.arange(start + 1, written + 1)
+        records = self.slots[idx]                      # 花式索引得到副本
+        # 复制之后再读一次序号：复制过程中被写入方改写的槽位，第一次读到的可能还是旧序号
+        ok = (records['seq'] == expected) & (self.slots['seq'][idx] == expected)
+        dropped = start - cursor + int((~ok).sum())
+        if self.reader is not None:
+            self.cursors[self.reader] = written        # 复制完成，这些槽位可以被覆盖
+        return records[ok], written, dropped
+
+    def detach(self, reader):
+        """把读取方标记为已退出（进程异常终止、没能自己close时由主进程调用）"""
+        self.cursors[reader] = DETACHED
+
+    def close(self):
+        if self.reader is not None:
+            self.detach(self.reader)
+        del self.header
+        del self.cursors
+        del self.slots
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def decode_candles(raw, inst_index):
+    """一条candle推送 -> [(品种序号, ts, o, h, l, c, v)]，只保留已完结的K线"""
+    msg = json.loads(raw)
+    arg = msg.get('arg')
+    if not arg or not arg.get('channel', '').startswith('candle'):
+        return []
+    inst = inst_index.get(arg.get('instId'))
+    if inst is None:
+        return []
+    return [(inst, int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]))
+            for row in msg.get('data', ()) if row[8] == '1']
+
+
+def feed_main(ring_name, inst_ids, url=None, replay=None, speed=0.0, bar='1m'):
+    """行情进程：replay=(start, end)时回放本地数据，否则连接url"""
+    ring = BarRing.attach(ring_name)
+    inst_index = {inst_id: k for k, inst_id in enumerate(inst_ids)}
+
+    def handle(raw):
+        for bar_rec in decode_candles(raw, inst_index):
+            ring.publish(*bar_rec)
+
+    try:
+        if replay is not None:
+            from replay import Replayer, load_events
+            Replayer(load_events(inst_ids, replay[0], replay[1], bar=bar), speed=speed).run(handle)
+        else:
+            asyncio.run(_ws_loop(url or WS_BUSINESS_URL, inst_ids, bar, handle))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.finish()
+        ring.close()
+
+
+async def _ws_loop(url, inst_ids, bar, handle):
+    """与OrderBookRecorder.run相同的重连和心跳方式"""
+    import websockets
+
+    args = [{'channel': f'candle{bar}', 'instId': inst_id} for inst_id in inst_ids]
+    reconnects = 0
+    while True:
+        try:
+            async with websockets.connect(url, ping_interval=None) as ws:
+                await ws.send(json.dumps({'op': 'subscribe', 'args': args}))
+                print(f"行情进程已订阅: {inst_ids}")
+                last_ping = time.time()
+                while True:
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout=5)
+                        if raw != 'pong':
+                            handle(raw)
+                    except asyncio.TimeoutError:
+                        pass
+                    if time.time() - last_ping > 20:
+                        await ws.send('ping')
+                        last_ping = time.time()
+        except (OSError, websockets.ConnectionClosed) as e:
+            if isinstance(e, websockets.ConnectionClosedOK):
+                return      # 回放服务端推送完毕后正常关闭
+            reconnects += 1
+            print(f"行情连接断开: {e}，3秒后重连（第{reconnects}次）")
+            await asyncio.sleep(3)
+
+
+def _quiet(strategy_cls):
+    return type(strategy_cls.__name__, (strategy_cls,), {'log': lambda self, txt, dt=None: None})
+
+
+def _error(e):
+    return f'{type(e).__name__}: {e}'
+
+
+def worker_main(ring_name, inst_ids, assignments, results, ready=None, poll=0.0005, quiet=True, reader=None):
+    """
+    策略进程：assignments为 [(名称, instId, 策略类, 参数)]，策略类为None时使用FastHigherLowStrategy
+    reader为本进程在环形缓冲区中的读取方序号（回放时行情进程据此等待）
+    建好引擎后向ready队列报到，结束后把每个策略的结果放入results队列
+    建引擎或on_bar出错的策略停止运行，结果中带error；出错时同样会向ready和results报到，主进程不会一直等待
+    """
+    ring = None
+    stats = None
+    errors = {}
+    stopped = {}        # 名称 -> 出错前处理的K线数
+    engines = []
+    by_inst = {}
+    cursor = dropped = bars = 0
+    try:
+        from replay import LatencyStats, live_engine
+
+        ring = BarRing.attach(ring_name, reader=reader, poll=poll)
+        stats = LatencyStats()
+        for name, inst_id, strategy_cls, params in assignments:
+            try:
+                if strategy_cls is not None and quiet:
+                    strategy_cls = _quiet(strategy_cls)
+                engine = live_engine(inst_id, strategy_cls, **params)
+            except Exception as e:
+                traceback.print_exc()
+                errors[name] = _error(e)
+                continue
+            engines.append((name, inst_id, engine))
+            by_inst.setdefault(inst_ids.index(inst_id), []).append((name, engine))
+        if ready is not None:
+            ready.put(reader)
+            ready = None
+
+        while by_inst:
+            records, cursor, skipped = ring.read(cursor)
+            dropped += skipped
+            if not len(records):
+                if ring.closed and ring.written == cursor:
+                    break
+                time.sleep(poll)
+                continue
+            now = time.time_ns()
+            for rec in records.tolist():
+                _, inst, ts, o, h, l, c, v, pub_ns = rec
+                targets = by_inst.get(inst)
+                if not targets:
+                    continue
+                stats.record('ipc', now - pub_ns)
+                t0 = time.perf_counter_ns()
+                for name, engine in targets:
+                    try:
+                        engine.on_bar(ts, o, h, l, c, v)
+                    except Exception as e:
+                        traceback.print_exc()
+                        errors[name] = _error(e)
+                        stopped[name] = bars
+                stats.record('on_bar', time.perf_counter_ns() - t0)
+                bars += 1
+                if errors:
+                    # 出错的策略不再驱动；本进程的策略全部出错时退出，回放不再等待本进程
+                    for key in list(by_inst):
+                        by_inst[key] = [t for t in by_inst[key] if t[0] not in errors]
+                        if not by_inst[key]:
+                            del by_inst[key]
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        # 导入、连接共享内存等进程级错误：还没有出错的策略都记为失败
+        traceback.print_exc()
+        for name, *_ in assignments:
+            errors.setdefault(name, _error(e))
+    finally:
+        if ring is not None:
+            ring.close()
+        if ready is not None:
+            ready.put(reader)
+    summary = stats.summary() if stats is not None and stats.samples else {}
+    done = set()
+    for name, inst_id, engine in engines:
+        result = {'name': name, 'inst_id': inst_id, 'bars': stopped.get(name, bars), 'dropped': dropped,
+                  'latency': summary}
+        try:
+            engine.strategy.stop()
+            result.update(value=engine.broker.getvalue(), drawdown=engine.max_drawdown())
+        except Exception as e:
+            errors.setdefault(name, _error(e))
+        if name in errors:
+            result['error'] = errors[name]
+        results.put(result)
+        done.add(name)
+    for name, inst_id, *_ in assignments:
+        if name not in done:
+            results.put({'name': name, 'inst_id': inst_id, 'error': errors.get(name, '未运行')})
+
+
+class LiveRunner:
+    """
+    runner = LiveRunner(['DOGE-USDT-SWAP'], workers=2)
+    runner.add('doge', 'DOGE-USDT-SWAP', bounce_thresh=0.003)
+    results = runner.run(replay=('20220411', '20220430'))
+    """
+    def __init__(self, inst_ids, workers=None, capacity=1 << 16, poll=0.0005):
+        self.inst_ids = list(inst_ids)
+        self.workers = workers or max(1, (mp.cpu_count() or 2) - 1)
+        self.capacity = capacity
+        self.poll = poll
+        self.assignments = []
+
+    def add(self, name, inst_id, strategy_cls=None, **params):
+        if inst_id not in self.inst_ids:
+            raise ValueError(f"{inst_id} 不在行情订阅列表中")
+        self.assignments.append((name, inst_id, strategy_cls, params))
+
+    def run(self, url=None, replay=None, speed=0.0, bar='1m'):
+        """启动行情进程和策略进程，行情结束（回放完毕或Ctrl+C）后返回各策略的结果"""
+        n = min(self.workers, len(self.assignments)) or 1
+        # 回放时行情进程等待最慢的策略进程，实时行情只能跳过
+        ring = BarRing.create(self.capacity, readers=n, blocking=replay is not None)
+        results = mp.Queue()
+        ready = mp.Queue()
+        # 轮流分配，同一品种的多个策略分散到不同进程
+        groups = [self.assignments[k::n] for k in range(n)]
+        workers = [mp.Process(target=worker_main, name=f'strategy-{k}',
+                              args=(ring.name, self.inst_ids, group, results, ready, self.poll, True, k))
+                   for k, group in enumerate(groups)]
+        for p in workers:
+            p.start()
+        left = {k: [a[:2] for a in group] for k, group in enumerate(groups)}   # 还没有结果的 (名称, instId)
+        out = []
+        try:
+            # 策略进程都建好引擎（导入、指标初始化）之后再开始推送行情；没报到就退出的进程不再等待
+            waiting = set(range(n))
+            while waiting:
+                try:
+                    waiting.discard(ready.get(timeout=1.0))
+                except queue.Empty:
+                    waiting = {k for k in waiting if workers[k].is_alive()}
+            feed = mp.Process(target=feed_main, name='feed',
+                              args=(ring.name, self.inst_ids, url, replay, speed, bar))
+            feed.start()
+            while feed.is_alive():
+                feed.join(1.0)
+                self._detach_dead(ring, workers)
+            ring.finish()       # 行情进程异常退出时没有标记结束，策略进程会一直等新K线
+            while any(left.values()):
+                try:
+                    self._take(results.get(timeout=1.0), left, out)
+                except queue.Empty:
+                    self._detach_dead(ring, workers)
+                    self._collect_dead(results, workers, left, out)
+            for p in workers:
+                p.join()
+        except KeyboardInterrupt:
+            ring.finish()
+            for p in workers:
+                p.join()
+            while not results.empty():
+                self._take(results.get(), left, out)
+        finally:
+            ring.close()
+        return sorted(out, key=lambda r: r['name'])
+
+    @staticmethod
+    def _take(result, left, out):
+        out.append(result)
+        for names in left.values():
+            if (result['name'], result['inst_id']) in names:
+                names.remove((result['name'], result['inst_id']))
+                break
+
+    @staticmethod
+    def _detach_dead(ring, workers):
+        # 异常终止的策略进程没有把自己标记为已退出，回放时行情进程会一直等它
+        for k, p in enumerate(workers):
+            if p.exitcode is not None:
+                ring.detach(k)
+
+    def _collect_dead(self, results, workers, left, out):
+        """已退出但结果不全的策略进程（被kill、崩溃）：先取完管道中已有的结果，其余记为失败"""
+        dead = [k for k, names in left.items() if names and workers[k].exitcode is not None]
+        if not dead:
+            return
+        try:
+            while True:
+                self._take(results.get(timeout=0.1), left, out)
+        except queue.Empty:
+            pass
+        for k in dead:
+            for name, inst_id in left[k]:
+                out.append({'name': name, 'inst_id': inst_id,
+                            'error': f'策略进程异常退出 exitcode={workers[k].exitcode}'})
+            left[k] = []
+
+
+def main(argv=None):
+    from okxquant import parse_grid
+
+    parser = argparse.ArgumentParser(description='多进程实盘运行器（一个行情进程，多个策略进程）')
+    parser.add_argument('--inst', nargs='+', default=['DOGE-USDT-SWAP'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--url', default=None, help='WebSocket地址，默认OKX business端点')
+    parser.add_argument('--replay', nargs=2, metavar=('START', 'END'), help='回放本地数据代替实时行情')
+    parser.add_argument('--speed', type=float, default=0.0, help='回放倍速，0为尽快')
+    parser.add_argument('--grid', nargs='*', default=[], metavar='KEY=V1,V2', help='每个品种运行的参数组合')
+    args = parser.parse_args(argv)
+
+    runner = LiveRunner(args.inst, workers=args.workers)
+    for inst_id in args.inst:
+        for params in parse_grid(args.grid):
+            name = inst_id + ''.join(f' {k}={v}' for k, v in params.items())
+            runner.add(name, inst_id, **params)
+    print(f"行情进程 1 个，策略进程 {min(runner.workers, len(runner.assignments))} 个，"
+          f"策略 {len(runner.assignments)} 个")
+    t0 = time.perf_counter()
+    results = runner.run(url=args.url, replay=args.replay, speed=args.speed)
+    elapsed = time.perf_counter() - t0
+    for r in results:
+        if 'error' in r and 'value' not in r:
+            print(f"{r['name']:<50} 出错: {r['error']}")
+            continue
+        lat = r['latency'].get('ipc', {})
+        print(f"{r['name']:<50} 最终资金 {r['value']:>12.2f}  最大回撤 {r['drawdown']:>6.2f}%  "
+              f"K线 {r['bars']}  跳过 {r['dropped']}  传递延迟p50/p99 {lat.get('p50', 0):.0f}/{lat.get('p99', 0):.0f}us"
+              + (f"  出错: {r['error']}" if 'error' in r else ''))
+    print(f"耗时 {elapsed:.2f}秒")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
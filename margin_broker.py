@@ -0,0 +1,148 @@
+import backtrader as bt
+
+from funding_bt import SwapCommInfo
+
+
+class MarginCommInfo(SwapCommInfo):
+    """
+    杠杆永续合约手续费/保证金
+    使用backtrader的期货模式：开仓冻结 名义价值/lever 的保证金，每根K线按收盘价逐日盯市，
+    多空都可以开仓，手续费和资金费沿用SwapCommInfo
+    """
+    params = (
+        ('lever', 10),           # 杠杆倍数
+        ('mmr', 0.005),          # 维持保证金率
+        ('stocklike', False),
+    )
+
+    def __init__(self):
+        super(MarginCommInfo, self).__init__()
+        self.p.automargin = 1.0 / self.p.lever  # 每单位保证金 = 价格 / 杠杆
+
+    def get_leverage(self):
+        # 保证金已经按杠杆计算，不需要backtrader再除一次
+        return 1.0
+
+
+class MarginBroker(bt.brokers.BackBroker):
+    """
+    保证金账户broker，支持逐仓/全仓、杠杆、做空和基于标记价格的强平
+    - 逐仓：仓位变化时计算一次强平价，之后每根K线只比较标记价格的最高/最低价
+    - 全仓：账户权益共同承担亏损，强平价随权益变化，每根K线用当前权益重新计算
+    标记价格默认取交易数据本身（本地K线就是history-mark-price-candles），
+    也可以用 set_mark_data 指定单独的标记价格数据源。
+    """
+    params = (
+        ('margin_mode', 'isolated'),   # isolated=逐仓, cross=全仓
+        ('liq_fee', 0.0005),           # 强平手续费率
+    )
+
+    def __init__(self):
+        super(MarginBroker, self).__init__()
+        self._mark = {}
+        self._liq_cache = {}
+        self.liquidations = []
+
+    def set_mark_data(self, data, mark_data):
+        self._mark[data] = mark_data
+
+    def liquidation_price(self, data, pos, comminfo):
+        """计算当前仓位的强平价，没有持仓返回None"""
+        size = pos.size
+        if not size:
+            return None
+        mmr = comminfo.p.mmr
+        if self.p.margin_mode == 'cross':
+            # 权益(p) = 当前权益 + size*(p - 收盘价) 降到维持保证金 mmr*|size|*p 时强平
+            equity = self.getvalue()
+            close = data.close[0]
+            return (size * close - equity) / (size - mmr * abs(size))
+
+        key = (size, pos.price)
+        cached = self._liq_cache.get(data)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        # 逐仓：亏损吃掉初始保证金(1/lever)减去维持保证金后强平
+        lever = comminfo.p.lever
+        if size > 0:
+            liq = pos.price * (1 - 1.0 / lever + mmr)
+        else:
+            liq = pos.price * (1 + 1.0 / lever - mmr)
+        self._liq_cache[data] = (key, liq)
+        return liq
+
+    def next(self):
+        super(MarginBroker, self).next()
+        liquidated = False
+        for data, pos in self.positions.items():
+            if not pos.size:
+                continue
+            comminfo = self.getcommissioninfo(data)
+            if not isinstance(comminfo, MarginCommInfo):
+                continue
+            liq = self.liquidation_price(data, pos, comminfo)
+            mark = self._mark.get(data, data)
+            if pos.size > 0 and mark.low[0] <= liq:
+                self._liquidate(data, pos, max(liq, 0.0), comminfo)
+                liquidated = True
+            elif pos.size < 0 and mark.high[0] >= liq:
+                self._liquidate(data, pos, liq, comminfo)
+                liquidated = True
+
+        if liquidated:
+            self._get_value()
+
+    def _liquidate(self, data, pos, price, comminfo):
+        """按强平价市价平掉整个仓位并撤销该品种的挂单"""
+        for order in list(self.pending):
+            if order is not None and order.data is data and order.alive():
+                self.cancel(order)
+
+        size = pos.size
+        ordercls = bt.order.SellOrder if size > 0 else bt.order.BuyOrder
+        order = ordercls(owner=None, data=data, size=abs(size), price=price,
+                         exectype=bt.Order.Market)
+        order.addinfo(liquidation=True)
+        order.addcomminfo(comminfo)
+        self._ocoize(order, None)
+        order.submit(self)
+        order.accept(self)
+        self._execute(order, ago=0, price=price)
+
+        fee = abs(size) * price * self.p.liq_fee
+        self.cash -= fee
+        self._liq_cache.pop(data, None)
+        self.liquidations.append((data.datetime.datetime(0), data._name, size, price, fee))
+
+
+def use_margin_broker(cerebro, data, lever=10, margin_mode='isolated', mmr=0.005,
+                      mark_data=None, **comm_kwargs):
+    """把cerebro的broker替换为MarginBroker，并为数据源设置杠杆手续费"""
+    cash = cerebro.broker.getcash()
+    broker = MarginBroker(margin_mode=margin_mode)
+    broker.setcash(cash)
+    broker.addcommissioninfo(MarginCommInfo(lever=lever, mmr=mmr, **comm_kwargs), name=data._name or None)
+    if mark_data is not None:
+        broker.set_mark_data(data, mark_data)
+    cerebro.broker = broker
+    return broker
+
+
+if __name__ == "__main__":
+    import os
+    import pandas as pd
+    from higher_low_strategy1_1 import HigherLowStrategy
+
+    df = pd.read_csv(os.path.join('data', 'doge1m', 'DOGE-USDT-SWAP_20220428.csv'))
+    df['datetime'] = pd.to_datetime(df['datetime'])
+
+    cerebro = bt.Cerebro()
+    cerebro.addstrategy(HigherLowStrategy)
+    data = bt.feeds.PandasData(dataname=df, datetime='datetime', open='open', high='high',
+                               low='low', close='close', volume='vol', openinterest=None)
+    cerebro.adddata(data, name='DOGE-USDT-SWAP')
+    cerebro.broker.setcash(100000.0)
+    broker = use_margin_broker(cerebro, data, lever=20, margin_mode='isolated')
+    cerebro.run()
+    print('最终资金: %.2f' % cerebro.broker.getvalue())
+    print(f'强平次数: {len(broker.liquidations)}')
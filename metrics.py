@@ -0,0 +1,288 @@
+"""
+运行中策略进程的指标：计数器 / 仪表 / 直方图，通过本地HTTP以Prometheus文本格式暴露
+    registry = Registry()
+    lag = registry.gauge('okx_feed_lag_seconds', 'K线收盘到收到推送的延迟')
+    lag.set(0.12)
+    serve(registry, port=9108)          # curl http://127.0.0.1:9108/metrics
+记录路径不加锁，只是属性加法和一次二分查找（约0.2-0.5微秒）；
+权益/盈亏、风控计数、重连次数等已有状态用 add_collector 注册回调，在被抓取时才读取，运行时没有开销。
+"""
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延迟类直方图的默认分桶（秒）：10微秒 ~ 10秒
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Gauge:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, n=1):
+        self.value += n
+
+    def dec(self, n=1):
+        self.value -= n
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Histogram:
+    """固定分桶直方图，observe只更新一个桶和总和"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_ns(self, ns):
+        self.observe(ns * 1e-9)
+
+    def time(self):
+        """with hist.time(): ... 记录代码块的耗时"""
+        return _Timer(self)
+
+    def samples(self, name, labels):
+        rows = []
+        total = 0
+        for bound, n in zip(self.bounds + [float('inf')], self.counts):
+            total += n
+            rows.append((name + '_bucket', labels + (('le', _format_value(bound)),), total))
+        rows.append((name + '_sum', labels, self.sum))
+        rows.append((name + '_count', labels, self.count))
+        return rows
+
+
+class _Timer:
+    __slots__ = ('hist', 't0')
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe_ns(time.perf_counter_ns() - self.t0)
+
+
+class Registry:
+    """
+    指标按名称分组，同名指标可以有多组标签：
+        registry.counter('okx_orders_total', '订单回报', status='Completed').inc()
+    """
+    TYPES = {Counter: 'counter', Gauge: 'gauge', Histogram: 'histogram'}
+
+    def __init__(self):
+        self.families = {}      # name -> (类, 说明, {标签: 指标})
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = tuple(sorted(labels.items()))
+        family = self.families.get(name)
+        if family is None:
+            with self._lock:
+                family = self.families.setdefault(name, (cls, help_text, {}))
+        if family[0] is not cls:
+            raise ValueError(f"指标 {name} 已注册为 {self.TYPES[family[0]]}")
+        metric = family[2].get(key)
+        if metric is None:
+            with self._lock:
+                metric = family[2].setdefault(key, cls(**kwargs))
+        return metric
+
+    def counter(self, name, help_text='', **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', **labels):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text='', buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def add_collector(self, fn):
+        """
+        抓取时调用 fn()，返回 [(名称, 类型, 说明, {标签}, 数值)]，类型为 'counter' / 'gauge'
+        用于把已有对象的状态（权益、风控计数、重连次数）导出为指标
+        """
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        """Prometheus文本格式"""
+        lines = []
+        for name, (cls, help_text, metrics) in sorted(self.families.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {self.TYPES[cls]}')
+            for labels, metric in list(metrics.items()):
+                for sample, sample_labels, value in metric.samples(name, labels):
+                    lines.append(f'{sample}{_format_labels(sample_labels)} {_format_value(value)}')
+        seen = set()
+        for fn in self.collectors:
+            for name, kind, help_text, labels, value in fn():
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f'# HELP {name} {help_text}')
+                    lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def serve(registry=None, host='127.0.0.1', port=9108):
+    """在后台线程启动 /metrics 端点，返回HTTPServer（shutdown()停止）"""
+    registry = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+    return server
+
+
+def instrument_engine(engine, registry=None, inst_id=''):
+    """
+    给fast_engine.Engine加上订单指标：
+        okx_order_roundtrip_seconds  下单到成交回报的耗时
+        okx_orders_total{status}     订单回报按状态计数
+    以及抓取时读取的权益、盈亏、持仓、风控计数
+    """
+    import fast_engine as fe
+
+    registry = registry or REGISTRY
+    broker = engine.broker
+    roundtrip = registry.histogram('okx_order_roundtrip_seconds', '下单到成交回报的耗时', inst=inst_id)
+    status_names = ('Created', 'Submitted', 'Accepted', 'Partial', 'Completed', 'Canceled', 'Expired',
+                    'Margin', 'Rejected')
+    by_status = [registry.counter('okx_orders_total', '订单回报按状态计数', inst=inst_id, status=s)
+                 for s in status_names]
+    submit = broker.submit
+    notify = engine._notify
+
+    def timed_submit(order):
+        order.info['submit_ns'] = time.perf_counter_ns()
+        return submit(order)
+
+    def timed_notify(order):
+        by_status[order.status].inc()
+        if order.status == fe.Order.Completed:
+            roundtrip.observe_ns(time.perf_counter_ns() - order.info.get('submit_ns', 0))
+        notify(order)
+
+    broker.submit = timed_submit
+    engine._notify = timed_notify
+
+    def collect():
+        b = engine.broker
+        rows = [
+            ('okx_equity', 'gauge', '账户权益', {'inst': inst_id}, b.value),
+            ('okx_pnl', 'gauge', '相对初始资金的盈亏', {'inst': inst_id}, b.value - b.startingcash),
+            ('okx_position', 'gauge', '持仓数量（币）', {'inst': inst_id}, b.position.size),
+        ]
+        if b.risk is not None:
+            snap = b.risk.snapshot()
+            for reason, n in snap['counters'].items():
+                rows.append(('okx_risk_checks_total', 'counter', '风控检查计数（按结果）',
+                             {'inst': inst_id, 'result': reason}, n))
+            rows.append(('okx_risk_killed', 'gauge', '风控熔断状态', {'inst': inst_id},
+                         int(snap['killed'] is not None)))
+        return rows
+
+    registry.add_collector(collect)
+    return engine
+
+
+def instrument_recorder(recorder, registry=None):
+    """OrderBookRecorder的WebSocket重连次数和消息数（抓取时读取）"""
+    registry = registry or REGISTRY
+
+    def collect():
+        return [
+            ('okx_ws_reconnects_total', 'counter', 'WebSocket重连次数', {}, recorder.reconnects),
+            ('okx_ws_messages_total', 'counter', '收到的行情消息数', {}, recorder.message_count),
+        ]
+
+    registry.add_collector(collect)
+    return recorder
+
+
+if __name__ == "__main__":
+    import urllib.request
+
+    registry = Registry()
+    hist = registry.histogram('demo_latency_seconds', '示例延迟')
+    counter = registry.counter('demo_events_total', '示例事件')
+    n = 1000000
+    t0 = time.perf_counter()
+    for k in range(n):
+        counter.inc()
+    t1 = time.perf_counter()
+    for k in range(n):
+        hist.observe(k * 1e-9)
+    t2 = time.perf_counter()
+    print(f"counter.inc: {(t1 - t0) / n * 1e9:.0f}纳秒，histogram.observe: {(t2 - t1) / n * 1e9:.0f}纳秒")
+
+    server = serve(registry, port=0)
+    url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+    print(urllib.request.urlopen(url).read().decode('utf-8')[:600])
+    server.shutdown()
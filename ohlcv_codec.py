@@ -0,0 +1,316 @@
+"""
+K线的紧凑二进制格式
+价格按最小变动单位换算成整数后做差分编码：
+    open  - 上一根close        （通常为0）
+    close - open
+    high  - max(open, close)   （>=0）
+    min(open, close) - low     （>=0）
+时间戳做二阶差分（等间隔K线全是0），成交量按小数位换算成整数；
+每列zigzag后选用能容纳的最小整数宽度(1/2/4/8字节)，按字节重排后zlib压缩
+（level=0只存不压，体积约13字节/根，解码更快）。
+文件由独立的块组成（与orderbook_recorder相同的块头+索引方式），块头中有首末时间戳，
+按时间读取时只解压需要的块。
+    python ohlcv_codec.py --inst DOGE-USDT-SWAP            # 把CandleStore中的全部K线转换为 data/ohlcv/DOGE-USDT-SWAP_1m.okc
+"""
+import argparse
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from candle_store import CANDLE_DTYPE
+
+# 块头：魔数, 记录数, 压缩后长度, 首条时间戳, 末条时间戳, 首根开盘价(整数), 价格小数位, 成交量小数位, 各列宽度
+BLOCK_MAGIC = b'OKC1'
+BLOCK_HEADER = struct.Struct('<4sIIqqqBB6s')
+COLUMNS = ('ts', 'open', 'close', 'high', 'low', 'vol')
+MAX_DECIMALS = 12
+DEFAULT_BLOCK_ROWS = 10080  # 1分钟K线一周一块
+
+
+def zigzag(x):
+    """有符号整数 -> 无符号整数，绝对值小的数编码后也小"""
+    x = x.astype(np.int64)
+    return ((x << 1) ^ (x >> 63)).view(np.uint64)
+
+
+def unzigzag(z):
+    """zigzag的逆变换，在原宽度的整数上计算"""
+    signed = z.dtype.str.replace('u', 'i')
+    return (z >> 1).view(signed) ^ -(z & 1).view(signed)
+
+
+def decimals_for(values, step=None):
+    """
+    能无损表示values的最少小数位数：从step（例如合约tickSz）对应的位数开始，
+    不够时逐位增加（部分历史K线比当前tickSz更精细）
+    """
+    values = np.asarray(values, dtype=np.float64)
+    k = 0
+    if step:
+        k = max(0, -int(np.floor(np.log10(step) + 1e-9)))
+    while k < MAX_DECIMALS:
+        scale = 10.0 ** k
+        if np.array_equal(np.round(values * scale) / scale, values):
+            return k
+        k += 1
+    return MAX_DECIMALS
+
+
+def _width(z):
+    top = int(z.max()) if len(z) else 0
+    for w in (1, 2, 4):
+        if top < 1 << (8 * w):
+            return w
+    return 8
+
+
+def _pack(z, w):
+    """按宽度转换并按字节重排（同一字节位放在一起，压缩率更高）"""
+    return z.astype(f'<u{w}').view(np.uint8).reshape(-1, w).T.tobytes()
+
+
+def _unpack(buf, n, w):
+    """_pack的逆变换：按字节位移位拼回w字节的无符号整数"""
+    b = np.frombuffer(buf, dtype=np.uint8, count=n * w).reshape(w, n)
+    dtype = np.dtype(f'<u{w}')
+    z = b[0].astype(dtype)
+    for k in range(1, w):
+        z |= b[k].astype(dtype) << dtype.type(8 * k)
+    return z
+
+
+def encode_block(arr, price_dec, vol_dec, level=6):
+    """CANDLE_DTYPE数组 -> 一个块（块头 + 压缩数据）"""
+    n = len(arr)
+    pscale = 10.0 ** price_dec
+    o = np.round(arr['open'] * pscale).astype(np.int64)
+    h = np.round(arr['high'] * pscale).astype(np.int64)
+    l = np.round(arr['low'] * pscale).astype(np.int64)
+    c = np.round(arr['close'] * pscale).astype(np.int64)
+    v = np.round(arr['vol'] * 10.0 ** vol_dec).astype(np.int64)
+    ts = arr['ts'].astype(np.int64)
+
+    prev_close = np.empty(n, dtype=np.int64)
+    prev_close[0] = o[0]
+    prev_close[1:] = c[:-1]
+    d = np.diff(ts, prepend=ts[0])
+    cols = {
+        'ts': np.diff(d, prepend=0),
+        'open': o - prev_close,
+        'close': c - o,
+        'high': h - np.maximum(o, c),
+        'low': np.minimum(o, c) - l,
+        'vol': v,
+    }
+    widths = []
+    parts = []
+    for name in COLUMNS:
+        z = zigzag(cols[name])
+        w = _width(z)
+        widths.append(w)
+        parts.append(_pack(z, w))
+    payload = zlib.compress(b''.join(parts), level)
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, n, len(payload), int(ts[0]), int(ts[-1]), int(o[0]),
+                               price_dec, vol_dec, bytes(widths))
+    return header + payload
+
+
+def decode_payload(header, payload, out=None):
+    """块头 + 压缩数据 -> CANDLE_DTYPE数组；out为预先分配的输出（读取多个块时避免再拼接一次）"""
+    _, n, _, first_ts, _, open0, price_dec, vol_dec, widths = header
+    raw = zlib.decompress(payload)
+    cols = {}
+    pos = 0
+    for name, w in zip(COLUMNS, widths):
+        cols[name] = unzigzag(_unpack(raw[pos:pos + n * w], n, w))
+        pos += n * w
+    c = cols['open'].astype(np.int64)
+    c += cols['close']
+    np.cumsum(c, out=c)
+    c += open0
+    o = c - cols['close']
+    h = np.maximum(o, c)
+    h += cols['high']
+    l = np.minimum(o, c)
+    l -= cols['low']
+    pscale = 10.0 ** price_dec
+    arr = np.empty(n, dtype=CANDLE_DTYPE) if out is None else out
+    ts = np.cumsum(np.cumsum(cols['ts'], dtype=np.int64))
+    ts += first_ts
+    arr['ts'] = ts
+    # 除以10的整数次幂（而不是乘以0.1**k），得到与解析十进制文本相同的浮点数
+    np.divide(o, pscale, out=arr['open'])
+    np.divide(h, pscale, out=arr['high'])
+    np.divide(l, pscale, out=arr['low'])
+    np.divide(c, pscale, out=arr['close'])
+    np.divide(cols['vol'], 10.0 ** vol_dec, out=arr['vol'])
+    return arr
+
+
+def decode_block(buf, out=None):
+    header = BLOCK_HEADER.unpack_from(buf)
+    return decode_payload(header, buf[BLOCK_HEADER.size:BLOCK_HEADER.size + header[2]], out)
+
+
+def scan_blocks(path):
+    """扫描块头建立索引(first_ts, last_ts, offset, count)，忽略末尾写了一半的块"""
+    index = []
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = 0
+        while offset + BLOCK_HEADER.size <= size:
+            f.seek(offset)
+            header = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            magic, count, comp_len, first_ts, last_ts = header[:5]
+            if magic != BLOCK_MAGIC or offset + BLOCK_HEADER.size + comp_len > size:
+                break
+            index.append((first_ts, last_ts, offset, count))
+            offset += BLOCK_HEADER.size + comp_len
+    return np.array(index, dtype=np.int64).reshape(-1, 4)
+
+
+class OhlcvWriter:
+    """追加写入器，每 block_rows 根K线压缩成一块"""
+    def __init__(self, path, price_dec, vol_dec=0, block_rows=DEFAULT_BLOCK_ROWS, level=6):
+        self.path = path
+        self.price_dec = price_dec
+        self.vol_dec = vol_dec
+        self.block_rows = block_rows
+        self.level = level
+        self.buffer = []
+        self.buffered = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def append(self, arr):
+        self.buffer.append(arr)
+        self.buffered += len(arr)
+        if self.buffered >= self.block_rows:
+            self.flush(partial=False)
+
+    def flush(self, partial=True):
+        if not self.buffer:
+            return
+        arr = np.concatenate(self.buffer)
+        rows = len(arr) if partial else len(arr) - len(arr) % self.block_rows
+        with open(self.path, 'ab') as f:
+            for start in range(0, rows, self.block_rows):
+                f.write(encode_block(arr[start:start + self.block_rows], self.price_dec, self.vol_dec,
+                                     self.level))
+        rest = arr[rows:]
+        self.buffer = [rest] if len(rest) else []
+        self.buffered = len(rest)
+
+    def close(self):
+        self.flush()
+        np.save(self.path + '.idx.npy', scan_blocks(self.path))
+
+
+class OhlcvReader:
+    """按时间范围读取，用块索引跳过范围外的块"""
+    def __init__(self, path):
+        self.path = path
+        idx_path = path + '.idx.npy'
+        if os.path.exists(idx_path) and os.path.getmtime(idx_path) >= os.path.getmtime(path):
+            self.index = np.load(idx_path)
+        else:
+            self.index = scan_blocks(path)
+
+    def __len__(self):
+        return int(self.index[:, 3].sum())
+
+    def read(self, start_ms=None, end_ms=None):
+        """读取 [start_ms, end_ms) 的K线，返回CANDLE_DTYPE数组"""
+        index = self.index
+        if start_ms is not None:
+            index = index[index[:, 1] >= start_ms]
+        if end_ms is not None:
+            index = index[index[:, 0] < end_ms]
+        if not len(index):
+            return np.zeros(0, dtype=CANDLE_DTYPE)
+        with open(self.path, 'rb') as f:
+            # 选中的块在文件中是连续的，一次读出
+            lo = int(index[0, 2])
+            hi = int(index[-1, 2]) + BLOCK_HEADER.size + self._comp_len(f, index[-1, 2])
+            f.seek(lo)
+            buf = f.read(hi - lo)
+        arr = np.empty(int(index[:, 3].sum()), dtype=CANDLE_DTYPE)
+        pos = 0
+        view = memoryview(buf)
+        for offset, count in zip((index[:, 2] - lo).tolist(), index[:, 3].tolist()):
+            decode_block(view[offset:], arr[pos:pos + count])
+            pos += count
+        if start_ms is not None or end_ms is not None:
+            ts = arr['ts']
+            i = np.searchsorted(ts, start_ms, 'left') if start_ms is not None else 0
+            j = np.searchsorted(ts, end_ms, 'left') if end_ms is not None else len(arr)
+            arr = arr[i:j]
+        return arr
+
+    @staticmethod
+    def _comp_len(f, offset):
+        f.seek(int(offset))
+        return BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))[2]
+
+
+def codec_path(inst_id, bar='1m', root=os.path.join('data', 'ohlcv')):
+    return os.path.join(root, f'{inst_id}_{bar}.okc')
+
+
+def convert_store(inst_id, store=None, root=os.path.join('data', 'ohlcv'), tick_sz=None, level=6):
+    """把CandleStore中某品种的全部K线转换为压缩格式，返回(文件路径, K线数)"""
+    from candle_store import CandleStore
+
+    store = store or CandleStore()
+    dates = store.dates(inst_id)
+    path = codec_path(inst_id, store.bar, root)
+    if os.path.exists(path):
+        os.remove(path)
+    if not dates:
+        return path, 0
+    if tick_sz is None:
+        from instruments import get_instrument
+        inst = get_instrument(inst_id, auto_refresh=False)
+        tick_sz = inst.tick_sz if inst is not None else None
+    arr = store.load(inst_id, dates[0], dates[-1])
+    price_dec = max(decimals_for(arr[col], tick_sz) for col in ('open', 'high', 'low', 'close'))
+    writer = OhlcvWriter(path, price_dec, decimals_for(arr['vol']), level=level)
+    writer.append(arr)
+    writer.close()
+    return path, len(arr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='K线转换为压缩二进制格式')
+    parser.add_argument('--inst', nargs='+', default=['DOGE-USDT-SWAP'])
+    parser.add_argument('--root', default='data')
+    parser.add_argument('--out', default=os.path.join('data', 'ohlcv'))
+    parser.add_argument('--level', type=int, default=6, help='zlib压缩级别，0为不压缩')
+    args = parser.parse_args(argv)
+
+    from candle_store import CandleStore
+
+    store = CandleStore(args.root)
+    for inst_id in args.inst:
+        folder = store.folder(inst_id)
+        csv_bytes = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder)
+                        if f.startswith(inst_id) and f.endswith('.csv'))
+        path, n = convert_store(inst_id, store, args.out, level=args.level)
+        if not n:
+            print(f"{inst_id}: 本地没有数据")
+            continue
+        size = os.path.getsize(path)
+        dates = store.dates(inst_id)
+        original = store.load(inst_id, dates[0], dates[-1])
+        t0 = time.perf_counter()
+        decoded = OhlcvReader(path).read()
+        elapsed = time.perf_counter() - t0
+        lossless = all(np.array_equal(decoded[c], original[c]) for c in CANDLE_DTYPE.names)
+        print(f"{inst_id}: {n} 根K线，CSV {csv_bytes / 2 ** 20:.1f}MB -> {size / 2 ** 20:.2f}MB "
+              f"({size / n:.2f} 字节/根)，解码 {n / elapsed / 1e6:.1f}M 根/秒，无损: {lossless}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # 没有orjson时使用标准库
+    _loads = json.loads
+
+BASE_URL = "https://www.okx.com"
+
+# 各接口的限速 (请求数, 秒)，以OKX官方文档为准；未列出的接口使用DEFAULT_LIMIT
+RATE_LIMITS = {
+    '/api/v5/market/candles': (40, 2.0),
+    '/api/v5/market/history-candles': (20, 2.0),
+    '/api/v5/market/mark-price-candles': (20, 2.0),
+    '/api/v5/market/history-mark-price-candles': (10, 2.0),
+    '/api/v5/market/books': (40, 2.0),
+    '/api/v5/market/trades': (100, 2.0),
+    '/api/v5/public/instruments': (20, 2.0),
+    '/api/v5/public/funding-rate': (20, 2.0),
+    '/api/v5/public/funding-rate-history': (10, 2.0),
+}
+DEFAULT_LIMIT = (10, 2.0)
+
+
+class OKXRestError(Exception):
+    """HTTP错误或OKX返回code不为0"""
+    def __init__(self, message, status=None, code=None):
+        super(OKXRestError, self).__init__(message)
+        self.status = status
+        self.code = code
+
+
+class TokenBucket:
+    """令牌桶限速，线程安全；acquire在令牌不足时睡眠等待"""
+    def __init__(self, rate, per):
+        self.capacity = float(rate)
+        self.fill_rate = rate / per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+
+class OKXRestClient:
+    """
+    OKX公共REST接口客户端，所有抓取脚本共用：
+    - 持久连接池（keep-alive），翻页时不再为每个请求重新建立TLS连接
+    - 安装了httpx和h2时使用HTTP/2，否则使用requests.Session
+    - gzip压缩、orjson解析
+    - 按接口的令牌桶限速，多个线程共用同一个客户端也不会超限
+    - 429/5xx 和网络异常（超时、连接重置）自动退避重试，重试用尽后抛出OKXRestError
+    """
+    def __init__(self, base_url=BASE_URL, timeout=10.0, pool_size=10, retries=3, http2=True):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.http2 = False
+        self._client = None
+        if http2:
+            try:
+                import h2  # noqa: F401  httpx的HTTP/2依赖
+                import httpx
+                limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                self._client = httpx.Client(base_url=base_url, http2=True, timeout=timeout,
+                                            limits=limits, headers={'Accept-Encoding': 'gzip'})
+                self._transport_errors = (httpx.TransportError,)
+                self.http2 = True
+            except ImportError:
+                pass
+        if self._client is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Accept-Encoding': 'gzip'})
+            self._client = session
+            self._transport_errors = (requests.exceptions.RequestException,)
+
+    def _bucket(self, path):
+        bucket = self._buckets.get(path)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(path)
+                if bucket is None:
+                    bucket = self._buckets[path] = TokenBucket(*RATE_LIMITS.get(path, DEFAULT_LIMIT))
+        return bucket
+
+    def _send(self, path, params):
+        if self.http2:
+            return self._client.get(path, params=params)
+        return self._client.get(self.base_url + path, params=params, timeout=self.timeout)
+
+    def get(self, path, params=None):
+        """GET请求，返回OKX响应中的data字段"""
+        bucket = self._bucket(path)
+        delay = 0.5
+        for attempt in range(self.retries + 1):
+            bucket.acquire()
+            try:
+                response = self._send(path, params)
+            except self._transport_errors as e:
+                if attempt < self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+                    continue
+                raise OKXRestError(f"网络错误: {type(e).__name__}: {e}") from e
+            status = response.status_code
+            if status == 429 or status >= 500:
+                if attempt < self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+                    continue
+            if status != 200:
+                raise OKXRestError(f"请求失败: {status}", status=status)
+            payload = _loads(response.content)
+            code = payload.get('code', '0')
+            if code == '50011' and attempt < self.retries:   # 请求过于频繁
+                time.sleep(delay)
+                delay *= 2
+                continue
+            if code != '0':
+                raise OKXRestError(f"接口错误 {code}: {payload.get('msg')}", status=status, code=code)
+            return payload.get('data', [])
+        raise OKXRestError("重试次数用尽")
+
+    def paginate(self, path, params, stop_ms=None, ts_index=0, limit=100):
+        """
+        用after参数从新到旧翻页，逐页yield
+        stop_ms: 最早一条记录的时间戳 <= stop_ms 时停止
+        ts_index: 时间戳在每条记录中的位置（K线为0，资金费记录为'fundingTime'）
+        """
+        params = dict(params, limit=limit)
+        while True:
+            data = self.get(path, params)
+            if not data:
+                break
+            yield data
+            last_ts = int(data[-1][ts_index])
+            if stop_ms is not None and last_ts <= stop_ms:
+                break
+            params['after'] = str(last_ts)
+
+    def close(self):
+        self._client.close()
+
+    # 常用接口
+    def get_instruments(self, inst_type='SWAP'):
+        return self.get('/api/v5/public/instruments', {'instType': inst_type})
+
+    def get_mark_price_candles(self, inst_id, bar='1m', limit=100):
+        return self.get('/api/v5/market/mark-price-candles', {'instId': inst_id, 'bar': bar, 'limit': limit})
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """进程内共享的客户端，连接池和限速状态在所有调用方之间共用"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OKXRestClient()
+    return _client
@@ -0,0 +1,270 @@
+"""
+统一命令行入口
+    python okxquant.py fetch    --inst DOGE-USDT-SWAP --start 20220401 --end 20220430 [--funding]
+    python okxquant.py backtest --inst DOGE-USDT-SWAP --start 20220411 --end 20220430 [--engine fast|bt] [--set bounce_thresh=0.003]
+                                [--checkpoint runs/doge.ckpt] [--shards 8]
+    python okxquant.py backtest --inst DOGE-USDT-SWAP --start "2022-04-28 10:00" --end "2022-04-29 02:30"   # 任意时间窗口 [start, end)
+    python okxquant.py scan     --start 20220411 --end 20220830
+    python okxquant.py replay   --inst DOGE-USDT-SWAP --start 20220411 --end 20220430 --speed 0
+    python okxquant.py live     --inst DOGE-USDT-SWAP BTC-USDT-SWAP --workers 4
+    python okxquant.py sweep    --inst DOGE-USDT-SWAP --start 20220411 --end 20220430 --grid bounce_thresh=0.003,0.005 wait_bars=1,3
+本文件只在模块级导入标准库，pandas/backtrader/numba等重依赖在各子命令内部按需加载，
+启动数百个sweep进程时不必每个都付出完整的导入开销
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+
+def parse_value(text):
+    """命令行参数值转换为int/float/bool，其余保持字符串"""
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    if text.lower() in ('true', 'false'):
+        return text.lower() == 'true'
+    return text
+
+
+def parse_params(items):
+    """['a=1', 'b=0.5'] -> {'a': 1, 'b': 0.5}"""
+    params = {}
+    for item in items or []:
+        key, _, value = item.partition('=')
+        params[key] = parse_value(value)
+    return params
+
+
+def parse_grid(items):
+    """['a=1,2', 'b=0.5'] -> [{'a': 1, 'b': 0.5}, {'a': 2, 'b': 0.5}]"""
+    keys, values = [], []
+    for item in items or []:
+        key, _, text = item.partition('=')
+        keys.append(key)
+        values.append([parse_value(v) for v in text.split(',')])
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def cmd_fetch(args):
+    from candle_store import CandleStore, date_range, parse_date
+    from fetch_history_1m import fetch_one_day, process_and_save_data
+
+    store = CandleStore(args.root)
+    for inst_id in args.inst:
+        os.makedirs(store.folder(inst_id), exist_ok=True)
+        for date_str in date_range(args.start, args.end):
+            filename = store.path(inst_id, date_str)
+            if os.path.exists(filename) and not args.force:
+                continue
+            data = fetch_one_day(inst_id, parse_date(date_str), bar=args.bar)
+            if process_and_save_data(data, filename):
+                print(f"成功保存到 {filename}")
+            else:
+                print(f"获取 {inst_id} {date_str} 的数据失败")
+        if args.funding:
+            from funding import update_funding
+            update_funding(inst_id)
+
+
+def run_backtrader(df, inst_id, cash=100000.0, **params):
+    """用backtrader运行HigherLowStrategy，返回 (最终资金, 最大回撤%)"""
+    import backtrader as bt
+    from funding import FundingSchedule
+    from funding_bt import SwapCommInfo
+    from higher_low_strategy1_1 import HigherLowStrategy
+    from instruments import get_instrument
+
+    params.setdefault('instrument', get_instrument(inst_id, auto_refresh=False))
+    quiet = type('QuietHigherLowStrategy', (HigherLowStrategy,), {'log': lambda self, txt, dt=None: None})
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.addstrategy(quiet, **params)
+    cerebro.adddata(bt.feeds.PandasData(dataname=df, datetime='datetime', open='open', high='high',
+                                        low='low', close='close', volume='vol', openinterest=None))
+    cerebro.broker.setcash(cash)
+    cerebro.broker.addcommissioninfo(SwapCommInfo(funding=FundingSchedule.from_store(inst_id)))
+    cerebro.broker.set_slippage_perc(0.001)
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    strat = cerebro.run()[0]
+    return cerebro.broker.getvalue(), strat.analyzers.drawdown.get_analysis().max.drawdown
+
+
+def run_fast(df, inst_id, checkpoint=None, checkpoint_every=100000, **params):
+    """用fast_engine运行HigherLowStrategy，返回 (最终资金, 最大回撤%)；checkpoint为断点文件路径"""
+    from higher_low_fast import run_fast_backtest
+
+    engine, _, _ = run_fast_backtest(df, inst_id, checkpoint=checkpoint,
+                                     checkpoint_every=checkpoint_every, **params)
+    return engine.broker.getvalue(), engine.max_drawdown()
+
+
+def run_sharded(df, inst_id, shards=None, **params):
+    """分段并行运行fast_engine版HigherLowStrategy，返回 (最终资金, 最大回撤%)，并打印各边界的拼接方式"""
+    from sharded_backtest import max_drawdown, sharded_backtest
+
+    result = sharded_backtest(df, inst_id=inst_id, shards=shards, **params)
+    print(f"分段: {len(result['boundaries']) + 1}，预热: {result['warmup']}根，重叠: {result['overlap']}根")
+    for boundary, switch, how in result['boundaries']:
+        if how == 'stitch':
+            print(f"  边界 {boundary}: 在第{switch}根状态一致后拼接")
+        else:
+            print(f"  边界 {boundary}: 持仓/状态未收敛，从断点顺序重跑")
+    equity = result['equity']
+    return equity[-1], max_drawdown(equity)
+
+
+def cmd_backtest(args):
+    from candle_store import CandleStore
+
+    store = CandleStore(args.root)
+    if ':' in args.start + args.end:
+        # 带时分的时间窗口，通过时间索引只读取需要的行
+        from time_index import load_window
+        df = load_window(args.inst, args.start, args.end, store)
+    else:
+        df = store.load_frame(args.inst, args.start, args.end)
+    if df.empty:
+        print(f"本地没有 {args.inst} {args.start}-{args.end} 的数据，请先运行 fetch")
+        return 1
+    params = parse_params(args.set)
+    if args.checkpoint:
+        if args.engine != 'fast':
+            print("断点续跑只支持 --engine fast（backtrader的运行状态无法保存）")
+            return 1
+        params.update(checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every)
+    if args.shards:
+        if args.engine != 'fast' or args.checkpoint:
+            print("分段回测只支持 --engine fast，且不能与 --checkpoint 同时使用")
+            return 1
+        params['shards'] = args.shards
+    if args.shards:
+        runner = run_sharded
+    else:
+        runner = run_fast if args.engine == 'fast' else run_backtrader
+    t0 = time.perf_counter()
+    final_value, drawdown = runner(df, args.inst, **params)
+    elapsed = time.perf_counter() - t0
+    print(f"K线数: {len(df)}，引擎: {args.engine}，耗时: {elapsed:.2f}秒")
+    print(f"最终资金: {final_value:.2f}")
+    print(f"总收益率: {(final_value / 100000.0 - 1) * 100:.2f}%")
+    print(f"最大回撤: {drawdown:.2f}%")
+    return 0
+
+
+def cmd_scan(args):
+    from pivot_scanner import main as scan_main
+    scan_main(args.extra)
+
+
+def cmd_replay(args):
+    from replay import main as replay_main
+    return replay_main(args.extra)
+
+
+def cmd_live(args):
+    from live_runner import main as live_main
+    return live_main(args.extra)
+
+
+_sweep_df = None
+
+
+def _init_sweep(root, inst_id, start, end):
+    """sweep子进程启动时读取一次数据"""
+    global _sweep_df
+    from candle_store import CandleStore
+    _sweep_df = CandleStore(root).load_frame(inst_id, start, end)
+
+
+def _sweep_one(task):
+    inst_id, params = task
+    final_value, drawdown = run_fast(_sweep_df, inst_id, **params)
+    return dict(params, final=final_value, ret=(final_value / 100000.0 - 1) * 100, maxdd=drawdown)
+
+
+def cmd_sweep(args):
+    from concurrent.futures import ProcessPoolExecutor
+
+    import pandas as pd
+
+    grid = parse_grid(args.grid)
+    tasks = [(args.inst, params) for params in grid]
+    t0 = time.perf_counter()
+    initargs = (args.root, args.inst, args.start, args.end)
+    if args.workers == 1:
+        _init_sweep(*initargs)
+        rows = list(map(_sweep_one, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_sweep,
+                                 initargs=initargs) as pool:
+            rows = list(pool.map(_sweep_one, tasks))
+    elapsed = time.perf_counter() - t0
+    table = pd.DataFrame(rows).sort_values('final', ascending=False).reset_index(drop=True)
+    print(f"共 {len(grid)} 组参数，耗时 {elapsed:.2f}秒")
+    print(table.head(args.top).to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='okxquant', description='OKX量化工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('fetch', help='下载1分钟K线到本地仓库')
+    p.add_argument('--inst', nargs='+', required=True)
+    p.add_argument('--start', required=True)
+    p.add_argument('--end', required=True)
+    p.add_argument('--bar', default='1m')
+    p.add_argument('--root', default='data')
+    p.add_argument('--force', action='store_true', help='覆盖已有文件')
+    p.add_argument('--funding', action='store_true', help='同时更新资金费率')
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser('backtest', help='回测HigherLowStrategy')
+    p.add_argument('--inst', default='DOGE-USDT-SWAP')
+    p.add_argument('--start', required=True)
+    p.add_argument('--end', required=True)
+    p.add_argument('--engine', choices=('fast', 'bt'), default='fast')
+    p.add_argument('--root', default='data')
+    p.add_argument('--set', nargs='*', metavar='KEY=VALUE', help='策略参数')
+    p.add_argument('--checkpoint', default=None, metavar='PATH', help='断点文件，中断后再次运行从断点继续')
+    p.add_argument('--checkpoint-every', type=int, default=100000, help='每多少根K线写一次断点')
+    p.add_argument('--shards', type=int, default=None, help='按时间分段并行回测的段数')
+    p.set_defaults(func=cmd_backtest)
+
+    p = sub.add_parser('scan', help='扫描所有品种的更高低点形态（参数同pivot_scanner.py）', add_help=False)
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser('replay', help='按WebSocket格式回放历史数据（参数同replay.py）', add_help=False)
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser('live', help='多进程实盘运行（参数同live_runner.py）', add_help=False)
+    p.set_defaults(func=cmd_live)
+
+    p = sub.add_parser('sweep', help='并行参数扫描')
+    p.add_argument('--inst', default='DOGE-USDT-SWAP')
+    p.add_argument('--start', required=True)
+    p.add_argument('--end', required=True)
+    p.add_argument('--grid', nargs='+', required=True, metavar='KEY=V1,V2')
+    p.add_argument('--root', default='data')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--top', type=int, default=20)
+    p.add_argument('--out', default=None)
+    p.set_defaults(func=cmd_sweep)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command not in ('scan', 'replay', 'live'):
+        parser.error('unrecognized arguments: ' + ' '.join(extra))
+    args.extra = extra   # scan/replay/live的参数原样交给pivot_scanner/replay/live_runner
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
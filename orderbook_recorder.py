@@ -0,0 +1,309 @@
+import asyncio
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+WS_PUBLIC_URL = "wss://ws.okx.com:8443/ws/v5/public"
+
+# 五档盘口记录：时间戳 + 买卖各5档价格/数量
+BOOK_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('bid_px', '<f8', (5,)),
+    ('bid_sz', '<f4', (5,)),
+    ('ask_px', '<f8', (5,)),
+    ('ask_sz', '<f4', (5,)),
+])
+
+# 逐笔成交记录：side 1=主动买，-1=主动卖
+TRADE_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('px', '<f8'),
+    ('sz', '<f4'),
+    ('side', '<i1'),
+])
+
+CHANNEL_DTYPES = {
+    'books5': BOOK_DTYPE,
+    'trades': TRADE_DTYPE,
+}
+
+# 块头：魔数, 记录数, 压缩后长度, 块内首条时间戳, 块内末条时间戳
+BLOCK_MAGIC = b'OKXB'
+BLOCK_HEADER = struct.Struct('<4sIIqq')
+
+
+def hour_key(ts_ms):
+    """毫秒时间戳所在的UTC小时，用于文件轮转"""
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime('%Y%m%d%H')
+
+
+def block_file_path(root, inst_id, channel, key):
+    return os.path.join(root, inst_id, f"{channel}_{key}.bin")
+
+
+def _levels(levels):
+    px = [0.0] * 5
+    sz = [0.0] * 5
+    for i, level in enumerate(levels[:5]):
+        px[i] = float(level[0])
+        sz[i] = float(level[1])
+    return px, sz
+
+
+def parse_books5(item):
+    """把books5推送中的一条数据转换为BOOK_DTYPE记录元组"""
+    bid_px, bid_sz = _levels(item.get('bids', []))
+    ask_px, ask_sz = _levels(item.get('asks', []))
+    return (int(item['ts']), bid_px, bid_sz, ask_px, ask_sz)
+
+
+def parse_trade(item):
+    """把trades推送中的一条数据转换为TRADE_DTYPE记录元组"""
+    return (int(item['ts']), float(item['px']), float(item['sz']),
+            1 if item['side'] == 'buy' else -1)
+
+
+CHANNEL_PARSERS = {
+    'books5': parse_books5,
+    'trades': parse_trade,
+}
+
+
+class BlockWriter:
+    """
+    按小时轮转的追加写入器
+    每次flush把缓冲区内的记录压缩成一个独立的块追加到文件末尾，
+    进程中断最多丢失一个未落盘的缓冲区，已写入的块不受影响。
+    """
+    def __init__(self, root, inst_id, channel, flush_records=2000, level=6):
+        self.root = root
+        self.inst_id = inst_id
+        self.channel = channel
+        self.dtype = CHANNEL_DTYPES[channel]
+        self.flush_records = flush_records
+        self.level = level
+        self.buffer = []
+        self.current_key = None
+
+    def append(self, rec):
+        key = hour_key(rec[0])
+        if self.current_key is not None and key != self.current_key:
+            # 跨小时先把旧文件的数据写完并生成索引
+            self.flush()
+            write_index(block_file_path(self.root, self.inst_id, self.channel, self.current_key))
+        self.current_key = key
+        self.buffer.append(rec)
+        if len(self.buffer) >= self.flush_records:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        records = np.array(self.buffer, dtype=self.dtype)
+        self.buffer = []
+        payload = zlib.compress(records.tobytes(), self.level)
+        header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(records), len(payload),
+                                   int(records['ts'][0]), int(records['ts'][-1]))
+        path = block_file_path(self.root, self.inst_id, self.channel, self.current_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as f:
+            f.write(header)
+            f.write(payload)
+
+    def close(self):
+        self.flush()
+        if self.current_key is not None:
+            write_index(block_file_path(self.root, self.inst_id, self.channel, self.current_key))
+
+
+def scan_blocks(path):
+    """扫描块头建立索引(first_ts, last_ts, offset, count)，不解压数据，忽略末尾写了一半的块"""
+    index = []
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = 0
+        while offset + BLOCK_HEADER.size <= size:
+            f.seek(offset)
+            magic, count, comp_len, first_ts, last_ts = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            if magic != BLOCK_MAGIC or offset + BLOCK_HEADER.size + comp_len > size:
+                break
+            index.append((first_ts, last_ts, offset, count))
+            offset += BLOCK_HEADER.size + comp_len
+    return np.array(index, dtype=np.int64).reshape(-1, 4)
+
+
+def write_index(path):
+    """为已轮转完成的文件写入 .idx 索引文件"""
+    if not os.path.exists(path):
+        return
+    np.save(path + '.idx.npy', scan_blocks(path))
+
+
+class OrderBookReader:
+    """
+    盘口/成交历史读取器
+    先按文件名定位小时文件，再用块索引跳过时间范围外的块，只解压需要的块。
+    """
+    def __init__(self, root=os.path.join('data', 'orderbook')):
+        self.root = root
+        self._index_cache = {}
+
+    def block_index(self, path):
+        if path in self._index_cache:
+            return self._index_cache[path]
+        idx_path = path + '.idx.npy'
+        if os.path.exists(idx_path) and os.path.getmtime(idx_path) >= os.path.getmtime(path):
+            index = np.load(idx_path)
+        else:
+            # 正在写入的文件没有索引，直接扫描块头
+            return scan_blocks(path)
+        self._index_cache[path] = index
+        return index
+
+    def files_in_range(self, inst_id, channel, start_ms, end_ms):
+        folder = os.path.join(self.root, inst_id)
+        if not os.path.isdir(folder):
+            return []
+        first = hour_key(start_ms)
+        last = hour_key(end_ms - 1)
+        prefix = channel + '_'
+        keys = sorted(f[len(prefix):-4] for f in os.listdir(folder)
+                      if f.startswith(prefix) and f.endswith('.bin'))
+        return [os.path.join(folder, f"{prefix}{k}.bin") for k in keys if first <= k <= last]
+
+    def read(self, inst_id, channel, start, end):
+        """
+        读取 [start, end) 区间的记录
+        start/end: 毫秒时间戳或datetime
+        返回按时间排序的numpy结构化数组
+        """
+        start_ms = to_ms(start)
+        end_ms = to_ms(end)
+        dtype = CHANNEL_DTYPES[channel]
+        parts = []
+        for path in self.files_in_range(inst_id, channel, start_ms, end_ms):
+            index = self.block_index(path)
+            if len(index) == 0:
+                continue
+            selected = index[(index[:, 1] >= start_ms) & (index[:, 0] < end_ms)]
+            if len(selected) == 0:
+                continue
+            with open(path, 'rb') as f:
+                for first_ts, last_ts, offset, count in selected:
+                    f.seek(offset)
+                    header = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+                    block = np.frombuffer(zlib.decompress(f.read(header[2])), dtype=dtype)
+                    lo = np.searchsorted(block['ts'], start_ms, side='left')
+                    hi = np.searchsorted(block['ts'], end_ms, side='left')
+                    parts.append(block[lo:hi])
+        if not parts:
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate(parts)
+
+    def read_books(self, inst_id, start, end):
+        return self.read(inst_id, 'books5', start, end)
+
+    def read_trades(self, inst_id, start, end):
+        return self.read(inst_id, 'trades', start, end)
+
+
+def to_ms(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    return int(value)
+
+
+class OrderBookRecorder:
+    """订阅OKX公共频道books5/trades并写入本地压缩文件"""
+    def __init__(self, inst_ids, channels=('books5', 'trades'),
+                 root=os.path.join('data', 'orderbook'), flush_seconds=5.0):
+        self.inst_ids = list(inst_ids)
+        self.channels = list(channels)
+        self.root = root
+        self.flush_seconds = flush_seconds
+        self.writers = {(inst_id, ch): BlockWriter(root, inst_id, ch)
+                        for inst_id in self.inst_ids for ch in self.channels}
+        self.message_count = 0
+        self.reconnects = 0
+
+    def subscribe_message(self):
+        args = [{'channel': ch, 'instId': inst_id}
+                for inst_id in self.inst_ids for ch in self.channels]
+        return json.dumps({'op': 'subscribe', 'args': args})
+
+    def handle_message(self, raw):
+        """处理一条websocket消息，返回写入的记录数"""
+        if raw == 'pong':
+            return 0
+        msg = json.loads(raw)
+        if 'event' in msg:
+            if msg['event'] == 'error':
+                print(f"订阅错误: {msg}")
+            return 0
+        arg = msg.get('arg', {})
+        writer = self.writers.get((arg.get('instId'), arg.get('channel')))
+        if writer is None:
+            return 0
+        parser = CHANNEL_PARSERS[arg['channel']]
+        for item in msg.get('data', []):
+            writer.append(parser(item))
+        self.message_count += 1
+        return len(msg.get('data', []))
+
+    def flush_all(self):
+        for writer in self.writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+    async def run(self, url=WS_PUBLIC_URL):
+        import websockets
+
+        while True:
+            try:
+                async with websockets.connect(url, ping_interval=None) as ws:
+                    await ws.send(self.subscribe_message())
+                    print(f"已订阅: {self.inst_ids} {self.channels}")
+                    last_flush = time.time()
+                    last_ping = time.time()
+                    while True:
+                        try:
+                            raw = await asyncio.wait_for(ws.recv(), timeout=5)
+                            self.handle_message(raw)
+                        except asyncio.TimeoutError:
+                            pass
+                        now = time.time()
+                        # OKX要求30秒内有数据往来，否则断开连接
+                        if now - last_ping > 20:
+                            await ws.send('ping')
+                            last_ping = now
+                        if now - last_flush > self.flush_seconds:
+                            self.flush_all()
+                            last_flush = now
+            except Exception as e:
+                self.flush_all()
+                self.reconnects += 1
+                print(f"连接断开: {e}，3秒后重连（第{self.reconnects}次）")
+                await asyncio.sleep(3)
+
+
+if __name__ == "__main__":
+    inst_ids = ['DOGE-USDT-SWAP', 'BTC-USDT-SWAP']
+    recorder = OrderBookRecorder(inst_ids)
+    from metrics import instrument_recorder, serve
+    instrument_recorder(recorder)
+    serve()
+    try:
+        asyncio.run(recorder.run())
+    except KeyboardInterrupt:
+        recorder.close()
+        print("记录已停止")
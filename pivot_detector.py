@@ -0,0 +1,159 @@
+import math
+from array import array
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from pivot_tracker import Pivot, PivotTracker
+
+
+class PivotDetector:
+    """
+    布林带突破关键点的增量识别器，每根K线 O(1)
+    研究(PivotPointsFinder)、回测(HigherLowStrategy及fast_engine移植版)和实盘共用这一份逻辑：
+    - 价格向上突破上轨进入上升段，跟踪最高价；向下突破下轨时确认该最高价为高点，反之亦然
+    - 关键点的index是极值所在K线的序号，不是确认时的K线
+    - 与上一个关键点间隔小于 min_gap 根K线的关键点丢弃（但趋势照常切换）
+    布林带与策略中的BollingerBands相同：SMA ± devfactor * 总体标准差
+    """
+    def __init__(self, period=40, devfactor=2.0, min_gap=10, size=2, keep_history=False):
+        self.period = period
+        self.devfactor = devfactor
+        self.min_gap = min_gap
+        self.tracker = PivotTracker(size=size, keep_history=keep_history)
+        self.highs = self.tracker.highs
+        self.lows = self.tracker.lows
+        self.last_high = None    # 最后确认的高点
+        self.last_low = None     # 最后确认的低点
+        self.last_pivot = None   # 最后确认的关键点（高低点均可）
+        self.trend = 0           # 0=待定，1=上升段，-1=下降段
+        self.ext_price = None    # 正在形成的高点/低点
+        self.ext_index = None
+        self.index = -1          # 当前K线序号
+        # 滑动窗口的收盘价及其和/平方和（以第一个收盘价为基准，减小相减时的精度损失）
+        self._window = array('d', bytes(8 * period))
+        self._head = 0
+        self._ref = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self.ma = self.upper = self.lower = float('nan')
+
+    @property
+    def ready(self):
+        return self.index + 1 >= self.period
+
+    def _update_bands(self, close):
+        if self._ref is None:
+            self._ref = close
+        x = close - self._ref
+        window = self._window
+        old = window[self._head]
+        window[self._head] = x
+        self._head = (self._head + 1) % self.period
+        if self._head == 0:
+            # 每转一圈精确重算一次，避免浮点误差累积
+            self._sum = math.fsum(window)
+            self._sumsq = math.fsum(v * v for v in window)
+        else:
+            self._sum += x - old
+            self._sumsq += x * x - old * old
+        if not self.ready:
+            return
+        mean = self._sum / self.period
+        std = abs(self._sumsq / self.period - mean * mean) ** 0.5
+        self.ma = self._ref + mean
+        self.upper = self.ma + self.devfactor * std
+        self.lower = self.ma - self.devfactor * std
+
+    def update(self, high, low, close):
+        """输入一根K线，返回本根确认的关键点（没有则返回None）"""
+        self.index += 1
+        self._update_bands(close)
+        if not self.ready:
+            return None
+        return self.step(high, low, self.upper, self.lower)
+
+    def step(self, high, low, upper, lower):
+        """已知本根K线布林带时推进状态机，update和批量识别共用"""
+        i = self.index
+        trend = self.trend
+        if trend == 1:
+            if high > self.ext_price:
+                self.ext_price, self.ext_index = high, i
+            elif low < lower:
+                pivot = self._confirm()
+                self.trend = -1
+                self.ext_price, self.ext_index = low, i
+                return pivot
+        elif trend == -1:
+            if low < self.ext_price:
+                self.ext_price, self.ext_index = low, i
+            elif high > upper:
+                pivot = self._confirm()
+                self.trend = 1
+                self.ext_price, self.ext_index = high, i
+                return pivot
+        elif high > upper:
+            self.trend = 1
+            self.ext_price, self.ext_index = high, i
+        elif low < lower:
+            self.trend = -1
+            self.ext_price, self.ext_index = low, i
+        return None
+
+    def _confirm(self):
+        last = self.last_pivot
+        if last is not None and self.ext_index - last.index < self.min_gap:
+            return None
+        if self.trend == 1:
+            pivot = self.last_high = self.tracker.add_high(self.ext_price, self.ext_index)
+        else:
+            pivot = self.last_low = self.tracker.add_low(self.ext_price, self.ext_index)
+        self.last_pivot = pivot
+        return pivot
+
+    def pending(self):
+        """正在形成、尚未确认的关键点"""
+        if self.trend == 0:
+            return None
+        return Pivot(self.ext_price, self.ext_index, 'high' if self.trend == 1 else 'low')
+
+
+def bollinger_bands(close, period=40, devfactor=2.0):
+    """向量化计算布林带，公式与PivotDetector相同，前period-1个值为nan"""
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    ma = np.full(n, np.nan)
+    upper = np.full(n, np.nan)
+    lower = np.full(n, np.nan)
+    if n < period:
+        return ma, upper, lower
+    x = close - close[0]
+    mean = sliding_window_view(x, period).sum(axis=1) / period
+    meansq = sliding_window_view(x * x, period).sum(axis=1) / period
+    std = np.abs(meansq - mean * mean) ** 0.5
+    ma[period - 1:] = close[0] + mean
+    upper[period - 1:] = ma[period - 1:] + devfactor * std
+    lower[period - 1:] = ma[period - 1:] - devfactor * std
+    return ma, upper, lower
+
+
+def detect_pivots(high, low, close, period=40, devfactor=2.0, min_gap=10, include_pending=True):
+    """
+    批量识别关键点：布林带向量化计算，状态机与增量识别共用PivotDetector.step
+    include_pending=True 时把最后一个尚未确认的关键点也加入结果（研究/绘图用）
+    返回按时间排序的Pivot列表
+    """
+    _, upper, lower = bollinger_bands(close, period, devfactor)
+    detector = PivotDetector(period, devfactor, min_gap, keep_history=True)
+    high = np.asarray(high, dtype=np.float64).tolist()
+    low = np.asarray(low, dtype=np.float64).tolist()
+    upper = upper.tolist()
+    lower = lower.tolist()
+    step = detector.step
+    for i in range(period - 1, len(high)):
+        detector.index = i
+        step(high[i], low[i], upper[i], lower[i])
+    if include_pending and detector.trend != 0:
+        detector._confirm()
+    return detector.tracker.history()
@@ -1,9 +1,10 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
 import os
 
+from pivot_detector import bollinger_bands, detect_pivots
+
 class PivotPointsFinder:
     def __init__(self, n_period=20, std_multiplier=2.0, min_gap=10):
         """
@@ -17,72 +18,21 @@ class PivotPointsFinder:
         self.min_gap = min_gap
         
     def calculate_bands(self, df):
-        """计算布林带"""
-        df['MA'] = df['close'].rolling(window=self.n_period).mean()
-        df['SD'] = df['close'].rolling(window=self.n_period).std()
-        df['UB'] = df['MA'] + self.std_multiplier * df['SD']  # 上轨
-        df['LB'] = df['MA'] - self.std_multiplier * df['SD']  # 下轨
+        """计算布林带（与策略相同，使用总体标准差）"""
+        df['MA'], df['UB'], df['LB'] = bollinger_bands(df['close'].to_numpy(),
+                                                       self.n_period, self.std_multiplier)
         return df
-    
+
     def find_pivot_points(self, df):
-        """识别关键点"""
+        """识别关键点，min_gap在识别时直接生效，与策略实时识别的结果一致"""
         df = self.calculate_bands(df)
-        
-        # 初始化变量
-        trend = 0  # 0=待定，1=上升，-1=下降
-        pivot_points = []  # 存储关键点
-        last_hp = None  # 最后一个高点
-        last_lp = None  # 最后一个低点
-        
-        # 跳过前N个没有布林带数据的点
-        start_idx = self.n_period
-        
-        for i in range(start_idx, len(df)):
-            if trend == 0:  # 初始条件判断
-                if df['high'].iloc[i] > df['UB'].iloc[i]:
-                    trend = 1
-                    last_hp = {'index': i, 'price': df['high'].iloc[i], 'type': 'high'}
-                    pivot_points.append(last_hp)
-                elif df['low'].iloc[i] < df['LB'].iloc[i]:
-                    trend = -1
-                    last_lp = {'index': i, 'price': df['low'].iloc[i], 'type': 'low'}
-                    pivot_points.append(last_lp)
-            
-            elif trend == 1:  # 上升趋势
-                if df['high'].iloc[i] > last_hp['price']:
-                    last_hp = {'index': i, 'price': df['high'].iloc[i], 'type': 'high'}
-                    pivot_points[-1] = last_hp
-                elif df['low'].iloc[i] < df['LB'].iloc[i]:
-                    trend = -1
-                    last_lp = {'index': i, 'price': df['low'].iloc[i], 'type': 'low'}
-                    pivot_points.append(last_lp)
-            
-            elif trend == -1:  # 下降趋势
-                if df['low'].iloc[i] < last_lp['price']:
-                    last_lp = {'index': i, 'price': df['low'].iloc[i], 'type': 'low'}
-                    pivot_points[-1] = last_lp
-                elif df['high'].iloc[i] > df['UB'].iloc[i]:
-                    trend = 1
-                    last_hp = {'index': i, 'price': df['high'].iloc[i], 'type': 'high'}
-                    pivot_points.append(last_hp)
-        
-        return self.clean_pivot_points(df, pivot_points)
-    
-    def clean_pivot_points(self, df, pivot_points):
-        """清洗关键点"""
-        if len(pivot_points) <= 1:
-            return pivot_points
-            
-        cleaned_points = [pivot_points[0]]
-        
-        for i in range(1, len(pivot_points)):
-            if pivot_points[i]['index'] - cleaned_points[-1]['index'] >= self.min_gap:
-                cleaned_points.append(pivot_points[i])
-        
-        return cleaned_points
+        return detect_pivots(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy(),
+                             self.n_period, self.std_multiplier, self.min_gap)
 
 def plot_results(df, pivot_points):
     """绘制结果"""
+    import matplotlib.pyplot as plt  # 只在绘图时加载
+
     plt.figure(figsize=(15, 7))
     
     # 绘制收盘价和布林带
@@ -93,10 +43,10 @@ def plot_results(df, pivot_points):
     
     # 标记关键点
     for point in pivot_points:
-        if point['type'] == 'high':
-            plt.plot(df.index[point['index']], point['price'], 'r^', markersize=3)
+        if point.type == 'high':
+            plt.plot(df.index[point.index], point.price, 'r^', markersize=3)
         else:
-            plt.plot(df.index[point['index']], point['price'], 'gv', markersize=3)
+            plt.plot(df.index[point.index], point.price, 'gv', markersize=3)
     
     plt.title('价格走势与关键点')
     plt.legend()
@@ -122,7 +72,7 @@ def process_1m_data(folder_path, date_str):
     # 打印结果并绘图
     print(f"\n找到 {len(pivot_points)} 个关键点:")
     for point in pivot_points:
-        print(f"类型: {point['type']}, 时间: {df.index[point['index']]}, 价格: {point['price']:.4f}")
+        print(f"类型: {point.type}, 时间: {df.index[point.index]}, 价格: {point.price:.4f}")
     
     plot_results(df, pivot_points)
 
@@ -0,0 +1,129 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from candle_store import CandleStore, load_instruments
+from higher_low_kernel import BUY, higher_low_signals
+from pivot_detector import bollinger_bands, detect_pivots
+
+
+def evaluate_structure(pivots, close, ma, upper, lower):
+    """
+    最新K线的更高低点结构（研究筛选用，不是HigherLowStrategy的完整入场条件）：
+    最近两个低点抬高，收盘价在最近低点之上、且收盘价回落到中轨以下
+    策略实际的入场信号见scan_instrument中的entry列
+    返回一行扫描结果（dict），关键点不足时返回None
+    """
+    highs = [p for p in pivots if p.type == 'high']
+    lows = [p for p in pivots if p.type == 'low']
+    if len(highs) < 2 or len(lows) < 2:
+        return None
+    last_low, prev_low = lows[-1], lows[-2]
+    last_high, prev_high = highs[-1], highs[-2]
+    higher_low = last_low.price > prev_low.price
+    close_above_low = close > last_low.price
+    close_below_ma = close < ma
+    width = upper - lower
+    risk = (close - last_low.price) / close        # 以最近低点止损的风险
+    hl_pct = (last_low.price - prev_low.price) / prev_low.price
+    structure = bool(higher_low and close_above_low and close_below_ma)
+    return {
+        'structure': structure,
+        'close': close,
+        'prev_low': prev_low.price,
+        'last_low': last_low.price,
+        'last_high': last_high.price,
+        'higher_high': last_high.price > prev_high.price,
+        'hl%': hl_pct * 100,
+        'risk%': risk * 100,
+        '%b': (close - lower) / width if width > 0 else np.nan,
+        # 低点抬高幅度 / 止损距离，越大说明结构越强、止损越近
+        'score': hl_pct / risk if structure and risk > 0 else 0.0,
+    }
+
+
+def scan_instrument(args):
+    """进程池任务：扫描一个品种，返回结果dict（数据不足返回None）"""
+    inst_id, start, end, root, n_period, std_multiplier, min_gap = args
+    store = CandleStore(root)
+    candles = store.load(inst_id, start, end)
+    if len(candles) < n_period + 1:
+        return None
+    high, low, close = candles['high'], candles['low'], candles['close']
+    pivots = detect_pivots(high, low, close, n_period, std_multiplier, min_gap,
+                           include_pending=False)
+    ma, upper, lower = bollinger_bands(close, n_period, std_multiplier)
+    row = evaluate_structure(pivots, float(close[-1]), ma[-1], upper[-1], lower[-1])
+    if row is None:
+        return None
+    # 入场信号用与策略逐笔一致的编译内核重放整段K线（含等待K线数、反弹阈值、ATR过滤和持仓状态）
+    frame = pd.DataFrame({col: candles[col] for col in ('ts', 'open', 'high', 'low', 'close')})
+    signals, _ = higher_low_signals(frame, n_period=n_period, std_multiplier=std_multiplier, min_gap=min_gap)
+    buys = np.flatnonzero(signals == BUY)
+    row['entry'] = bool(len(buys) and buys[-1] == len(signals) - 1)
+    row['last_entry'] = pd.to_datetime(int(candles['ts'][buys[-1]]), unit='ms') if len(buys) else pd.NaT
+    row['instId'] = inst_id
+    row['bars'] = len(candles)
+    row['pivots'] = len(pivots)
+    row['last_time'] = pd.to_datetime(int(candles['ts'][-1]), unit='ms')
+    return row
+
+
+def scan(inst_ids, start, end, root='data', n_period=40, std_multiplier=2.0, min_gap=10,
+         workers=None):
+    """并行扫描所有品种，返回按entry、structure、score排序的结果表"""
+    tasks = [(inst_id, start, end, root, n_period, std_multiplier, min_gap) for inst_id in inst_ids]
+    workers = workers or os.cpu_count()
+    if workers <= 1 or len(tasks) <= 1:
+        rows = list(map(scan_instrument, tasks))
+    else:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(scan_instrument, tasks, chunksize=chunksize))
+    rows = [r for r in rows if r is not None]
+    columns = ['instId', 'entry', 'structure', 'score', 'last_entry', 'close', 'prev_low', 'last_low', 'last_high',
+               'higher_high', 'hl%', 'risk%', '%b', 'pivots', 'bars', 'last_time']
+    table = pd.DataFrame(rows, columns=columns)
+    return table.sort_values(['entry', 'structure', 'score'], ascending=False).reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='扫描所有永续合约的关键点和更高低点形态')
+    parser.add_argument('--start', required=True, help='开始日期 YYYYmmdd')
+    parser.add_argument('--end', required=True, help='结束日期 YYYYmmdd')
+    parser.add_argument('--inst', nargs='*', help='只扫描指定品种，默认扫描swap产品信息.csv中全部在线品种')
+    parser.add_argument('--settle', default=None, help='按结算币种过滤，如USDT')
+    parser.add_argument('--root', default='data', help='本地K线目录')
+    parser.add_argument('--n-period', type=int, default=40)
+    parser.add_argument('--std', type=float, default=2.0)
+    parser.add_argument('--min-gap', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=20, help='显示前N个')
+    parser.add_argument('--all', action='store_true', help='也显示既没有入场信号、也不满足结构条件的品种')
+    parser.add_argument('--out', default=None, help='结果保存为CSV')
+    args = parser.parse_args(argv)
+
+    inst_ids = args.inst or load_instruments(os.path.join(args.root, 'swap产品信息.csv'),
+                                             settle_ccy=args.settle)
+    t0 = time.perf_counter()
+    table = scan(inst_ids, args.start, args.end, args.root, args.n_period, args.std,
+                 args.min_gap, args.workers)
+    elapsed = time.perf_counter() - t0
+    print(f'扫描 {len(inst_ids)} 个品种，有数据 {len(table)} 个，'
+          f'更高低点结构 {int(table["structure"].sum())} 个，最新K线入场信号 {int(table["entry"].sum())} 个，'
+          f'耗时 {elapsed:.2f}秒')
+    if args.out:
+        table.to_csv(args.out, index=False)
+    shown = table if args.all else table[table['entry'] | table['structure']]
+    if len(shown):
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(shown.head(args.top).to_string(index=False, float_format=lambda v: f'{v:.4f}'))
+    return table
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from array import array
+
+
+class Pivot:
+    """关键点记录"""
+    __slots__ = ('price', 'index', 'type')
+
+    def __init__(self, price, index, type):
+        self.price = price
+        self.index = index
+        self.type = type
+
+    def __repr__(self):
+        return f"Pivot(type={self.type}, index={self.index}, price={self.price})"
+
+
+class PivotRing:
+    """
+    固定长度的环形缓冲区，只保留最近 size 个关键点
+    支持 ring[-1]、ring[-2] 这样的倒序访问和 len()，写法与list相同
+    """
+    __slots__ = ('_buf', '_size', '_head', '_count')
+
+    def __init__(self, size=2):
+        self._buf = [None] * size
+        self._size = size
+        self._head = 0      # 下一个写入位置
+        self._count = 0
+
+    def append(self, pivot):
+        self._buf[self._head] = pivot
+        self._head = (self._head + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self._count
+        if not 0 <= k < self._count:
+            raise IndexError('PivotRing index out of range')
+        return self._buf[(self._head - self._count + k) % self._size]
+
+    def __iter__(self):
+        for k in range(self._count):
+            yield self[k]
+
+    def clear(self):
+        self._buf = [None] * self._size
+        self._head = 0
+        self._count = 0
+
+
+class PivotTracker:
+    """
+    高点/低点跟踪器
+    highs/lows 为环形缓冲区，策略只需要最近的几个关键点；
+    keep_history=True 时用紧凑的类型化数组保存全部历史（每个点16字节），供研究和绘图使用
+    """
+    HIGH = 1
+    LOW = -1
+
+    def __init__(self, size=2, keep_history=False):
+        self.highs = PivotRing(size)
+        self.lows = PivotRing(size)
+        self.keep_history = keep_history
+        self.hist_price = array('d')
+        self.hist_index = array('q')
+        self.hist_type = array('b')
+        self.count = 0
+
+    def _record(self, pivot, kind):
+        self.count += 1
+        if self.keep_history:
+            self.hist_price.append(pivot.price)
+            self.hist_index.append(pivot.index)
+            self.hist_type.append(kind)
+
+    def add_high(self, price, index):
+        pivot = Pivot(price, index, 'high')
+        self.highs.append(pivot)
+        self._record(pivot, self.HIGH)
+        return pivot
+
+    def add_low(self, price, index):
+        pivot = Pivot(price, index, 'low')
+        self.lows.append(pivot)
+        self._record(pivot, self.LOW)
+        return pivot
+
+    def history(self):
+        """按时间顺序返回全部历史关键点"""
+        return [Pivot(p, i, 'high' if t == self.HIGH else 'low')
+                for p, i, t in zip(self.hist_price, self.hist_index, self.hist_type)]
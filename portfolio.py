@@ -0,0 +1,212 @@
+import os
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+
+
+class SleeveBroker:
+    """
+    共享broker的代理，策略通过它下单和查询资金
+    getcash 返回该子策略剩余的风险预算，而不是整个账户的现金，
+    这样原有 getcash() * 0.5 之类的下单逻辑不用修改就能按预算分配资金
+    """
+    def __init__(self, broker, sleeve):
+        self._broker = broker
+        self._sleeve = sleeve
+
+    def getcash(self):
+        budget = self._broker.getvalue() * self._sleeve.budget
+        data = self._sleeve.data
+        used = abs(self._broker.getposition(data).size) * data.close[0]
+        return max(0.0, min(self._broker.getcash(), budget - used))
+
+    get_cash = getcash
+
+    def __getattr__(self, name):
+        return getattr(self._broker, name)
+
+
+def make_sleeve(strategy_cls):
+    """
+    把普通的单数据策略包装成组合中的子策略
+    - 只绑定自己的数据源（cerebro默认会把所有数据传给每个策略）
+    - 只在自己的数据有新K线时运行next，其他品种的K线不会触发
+    - 记录已实现盈亏用于归因
+    """
+    class Sleeve(strategy_cls):
+        params = (
+            ('sleeve_data', 0),      # 绑定的数据源序号
+            ('sleeve_name', ''),
+            ('budget', 1.0),         # 占账户权益的比例
+            ('verbose', False),      # 是否打印原策略的日志
+        )
+
+        def __init__(self):
+            data = self.datas[self.p.sleeve_data]
+            self.datas = [data]
+            self.data = self.data0 = self._clock = data
+            self.dnames = {data._name: data}
+            self.budget = self.p.budget
+            self.broker = SleeveBroker(self.broker, self)
+            self.realized_pnl = 0.0
+            self.commission = 0.0
+            self.trade_count = 0
+            self._last_len = 0
+            super(Sleeve, self).__init__()
+
+        def __len__(self):
+            # 原策略用len(self)表示已处理的K线数，这里只统计自己数据源的K线
+            return len(self.data)
+
+        def log(self, txt, dt=None):
+            if self.p.verbose:
+                print(f'[{self.p.sleeve_name}] ', end='')
+                super(Sleeve, self).log(txt, dt)
+
+        def notify_trade(self, trade):
+            if trade.isclosed:
+                self.realized_pnl += trade.pnlcomm
+                self.commission += trade.commission
+                self.trade_count += 1
+            super(Sleeve, self).notify_trade(trade)
+
+        def next(self):
+            n = len(self.data)
+            if n == self._last_len:
+                return  # 本次是其他品种的K线
+            self._last_len = n
+            super(Sleeve, self).next()
+
+        def prenext(self):
+            n = len(self.data)
+            if n == self._last_len:
+                return
+            self._last_len = n
+            super(Sleeve, self).prenext()
+
+        def unrealized_pnl(self):
+            pos = self.broker.getposition(self.data)
+            return pos.size * (self.data.close[0] - pos.price) if pos.size else 0.0
+
+    Sleeve.__name__ = 'Sleeve' + strategy_cls.__name__
+    return Sleeve
+
+
+def risk_budget_weights(frames, method='inverse_vol'):
+    """
+    根据各子策略交易品种的波动率分配风险预算
+    equal: 等权；inverse_vol: 按收益率标准差的倒数分配，让各子策略承担接近的风险
+    """
+    if method == 'equal':
+        return np.full(len(frames), 1.0 / len(frames))
+    vols = []
+    for df in frames:
+        close = df['close'].to_numpy(dtype=np.float64)
+        ret = np.diff(np.log(close))
+        vols.append(ret.std() if len(ret) > 1 else np.nan)
+    inv = 1.0 / np.asarray(vols)
+    inv[~np.isfinite(inv)] = 0.0
+    if inv.sum() == 0:
+        return np.full(len(frames), 1.0 / len(frames))
+    return inv / inv.sum()
+
+
+class PortfolioEngine:
+    """
+    多策略多品种组合回测，所有子策略共享同一个broker和资金
+    每个子策略使用独立的数据源副本，仓位互不抵消，便于按子策略归因；
+    backtrader按所有数据源时间戳的并集推进时钟，不需要把各序列补齐到同一时间轴
+    """
+    def __init__(self, cash=100000.0, risk_method='inverse_vol', max_gross=1.0):
+        self.cash = cash
+        self.risk_method = risk_method
+        self.max_gross = max_gross   # 所有子策略预算之和占权益的上限
+        self.sleeves = []
+
+    def add_sleeve(self, name, strategy_cls, df, budget=None, **params):
+        """添加子策略；budget为None时按risk_method自动分配"""
+        self.sleeves.append(dict(name=name, strategy=strategy_cls, df=df,
+                                 budget=budget, params=params))
+
+    def _budgets(self):
+        auto = [s for s in self.sleeves if s['budget'] is None]
+        fixed = sum(s['budget'] for s in self.sleeves if s['budget'] is not None)
+        remaining = max(0.0, self.max_gross - fixed)
+        if auto:
+            weights = risk_budget_weights([s['df'] for s in auto], self.risk_method)
+            for s, w in zip(auto, weights):
+                s['budget'] = w * remaining
+        return [s['budget'] for s in self.sleeves]
+
+    def build(self, commission=0.001, slippage=0.001):
+        cerebro = bt.Cerebro(stdstats=False)
+        for i, (s, budget) in enumerate(zip(self.sleeves, self._budgets())):
+            data = bt.feeds.PandasData(dataname=s['df'], datetime='datetime', open='open',
+                                       high='high', low='low', close='close', volume='vol',
+                                       openinterest=None)
+            cerebro.adddata(data, name=s['name'])
+            cerebro.addstrategy(make_sleeve(s['strategy']), sleeve_data=i,
+                                sleeve_name=s['name'], budget=budget, **s['params'])
+        cerebro.broker.setcash(self.cash)
+        cerebro.broker.setcommission(commission=commission)
+        cerebro.broker.set_slippage_perc(slippage)
+        cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+        return cerebro
+
+    def run(self, **kwargs):
+        cerebro = self.build(**kwargs)
+        strats = cerebro.run()
+        final_value = cerebro.broker.getvalue()
+        rows = []
+        for strat in strats:
+            unrealized = strat.unrealized_pnl()
+            rows.append({
+                'sleeve': strat.p.sleeve_name,
+                'strategy': strat.__class__.__name__[len('Sleeve'):],
+                'budget': strat.budget,
+                'trades': strat.trade_count,
+                'realized': strat.realized_pnl,
+                'unrealized': unrealized,
+                'pnl': strat.realized_pnl + unrealized,
+                'contribution%': (strat.realized_pnl + unrealized) / self.cash * 100,
+            })
+        attribution = pd.DataFrame(rows)
+        drawdown = strats[0].analyzers.drawdown.get_analysis()
+        return final_value, attribution, drawdown
+
+
+def load_days(folder, instId, dates):
+    """读取若干天的1分钟数据并合并"""
+    frames = []
+    for date_str in dates:
+        path = os.path.join(folder, f"{instId}_{date_str}.csv")
+        if os.path.exists(path):
+            frames.append(pd.read_csv(path))
+    df = pd.concat(frames, ignore_index=True)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    return df.sort_values('datetime').reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    from higher_low_strategy1_1 import HigherLowStrategy
+    from backtrader_test_cross import DualMAStrategy
+    from btc_regression_trend import LinearRegressionStrategy
+
+    doge = load_days(os.path.join('data', 'doge1m'), 'DOGE-USDT-SWAP',
+                     ['20220426', '20220427', '20220428'])
+    btc = pd.read_csv(os.path.join('data', 'btc_history.csv'), parse_dates=['datetime'])
+
+    engine = PortfolioEngine(cash=100000.0)
+    engine.add_sleeve('HL-DOGE', HigherLowStrategy, doge)
+    engine.add_sleeve('MA-DOGE', DualMAStrategy, doge, fast_period=10, slow_period=50,
+                      trend_period=100, trend_thresh=0.03, atr_thresh=0.6)
+    engine.add_sleeve('LR-BTC', LinearRegressionStrategy, btc, budget=0.2)
+
+    final_value, attribution, drawdown = engine.run()
+    print('\n====== 组合回测结果 ======')
+    print(f'初始资金: {engine.cash:.2f}')
+    print(f'最终资金: {final_value:.2f}')
+    print(f'最大回撤: {drawdown.max.drawdown:.2f}%')
+    print('\n====== 子策略归因 ======')
+    print(attribution.to_string(index=False))
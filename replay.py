@@ -0,0 +1,346 @@
+"""
+历史数据回放：把本地K线（以及录制的逐笔成交/盘口）按OKX WebSocket推送格式重新发出，
+用于在没有行情的时候端到端测试实盘链路（消息解析 -> 指标增量更新 -> 策略）
+    python replay.py --inst DOGE-USDT-SWAP --start 20220411 --end 20220415 --speed 0
+    python replay.py --inst DOGE-USDT-SWAP --start 20220411 --end 20220415 --speed 60 --serve 8765
+speed=0 表示不等待、尽快发送；speed=60 表示1分钟的行情用1秒回放
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import time
+
+import numpy as np
+
+BAR_MS = {'1m': 60000, '3m': 180000, '5m': 300000, '15m': 900000, '30m': 1800000,
+          '1H': 3600000, '4H': 14400000, '1D': 86400000}
+
+
+def bar_seconds(channel):
+    """'candle1m' -> 60.0"""
+    return BAR_MS.get(channel[len('candle'):], 60000) / 1000.0
+
+
+def _num(value):
+    return repr(float(value))
+
+
+def candle_message(inst_id, rec, bar='1m'):
+    """K线记录 -> candle频道推送（回放的都是已完结的K线，confirm='1'）"""
+    row = [str(int(rec['ts'])), _num(rec['open']), _num(rec['high']), _num(rec['low']),
+           _num(rec['close']), _num(rec['vol']), '0', '0', '1']
+    return {'arg': {'channel': f'candle{bar}', 'instId': inst_id}, 'data': [row]}
+
+
+def trade_message(inst_id, rec, trade_id):
+    """TRADE_DTYPE记录 -> trades频道推送"""
+    item = {'instId': inst_id, 'tradeId': str(trade_id), 'px': _num(rec['px']), 'sz': _num(rec['sz']),
+            'side': 'buy' if rec['side'] > 0 else 'sell', 'ts': str(int(rec['ts']))}
+    return {'arg': {'channel': 'trades', 'instId': inst_id}, 'data': [item]}
+
+
+def books_message(inst_id, rec):
+    """BOOK_DTYPE记录 -> books5频道推送"""
+    def levels(px, sz):
+        return [[_num(p), _num(s), '0', '1'] for p, s in zip(px, sz) if p > 0]
+    item = {'asks': levels(rec['ask_px'], rec['ask_sz']), 'bids': levels(rec['bid_px'], rec['bid_sz']),
+            'instId': inst_id, 'ts': str(int(rec['ts']))}
+    return {'arg': {'channel': 'books5', 'instId': inst_id}, 'data': [item]}
+
+
+def _candle_events(inst_id, candles, bar):
+    # K线在收盘时刻推送
+    bar_ms = BAR_MS[bar]
+    for rec in candles:
+        yield int(rec['ts']) + bar_ms, 'candle', inst_id, rec
+
+
+def _record_events(inst_id, records, channel):
+    for rec in records:
+        yield int(rec['ts']), channel, inst_id, rec
+
+
+def load_events(inst_ids, start, end, channels=('candle',), bar='1m', store=None, reader=None):
+    """
+    读取本地数据并按时间合并成事件流，逐条yield (推送时间戳ms, 原始消息字符串)
+    channels: 'candle' / 'trades' / 'books5'；没有录制数据的频道直接跳过
+    """
+    from candle_store import CandleStore
+
+    store = store or CandleStore(bar=bar)
+    streams = []
+    for inst_id in inst_ids:
+        candles = store.load(inst_id, start, end)
+        if 'candle' in channels:
+            streams.append(_candle_events(inst_id, candles, bar))
+        recorded = [ch for ch in channels if ch != 'candle']
+        if recorded and len(candles):
+            from orderbook_recorder import OrderBookReader
+            reader = reader or OrderBookReader()
+            start_ms = int(candles['ts'][0])
+            end_ms = int(candles['ts'][-1]) + BAR_MS[bar]
+            for ch in recorded:
+                records = reader.read(inst_id, ch, start_ms, end_ms)
+                if len(records):
+                    streams.append(_record_events(inst_id, records, ch))
+    trade_id = 0
+    # heapq.merge 在时间戳相同时保持各数据流的顺序，不会比较记录本身
+    for ts, channel, inst_id, rec in heapq.merge(*streams, key=lambda e: e[0]):
+        if channel == 'candle':
+            msg = candle_message(inst_id, rec, bar)
+        elif channel == 'trades':
+            trade_id += 1
+            msg = trade_message(inst_id, rec, trade_id)
+        else:
+            msg = books_message(inst_id, rec)
+        yield ts, json.dumps(msg, separators=(',', ':'))
+
+
+class LatencyStats:
+    """按处理阶段记录耗时（纳秒），汇总为百分位数"""
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, stage, ns):
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples[stage] = []
+        samples.append(ns)
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """stage -> {count, p50, p90, p99, max, mean}，单位微秒"""
+        result = {}
+        for stage, samples in self.samples.items():
+            arr = np.asarray(samples, dtype=np.float64) / 1000.0
+            row = {'count': len(arr)}
+            for q, v in zip(percentiles, np.percentile(arr, percentiles)):
+                row[f'p{q}'] = float(v)
+            row['max'] = float(arr.max())
+            row['mean'] = float(arr.mean())
+            result[stage] = row
+        return result
+
+    def report(self):
+        print(f"{'阶段':<10}{'次数':>10}{'p50(us)':>12}{'p90(us)':>12}{'p99(us)':>12}{'max(us)':>12}")
+        for stage, row in self.summary().items():
+            print(f"{stage:<12}{row['count']:>10}{row['p50']:>12.1f}{row['p90']:>12.1f}"
+                  f"{row['p99']:>12.1f}{row['max']:>12.1f}")
+
+
+class Replayer:
+    """
+    按原始时间间隔的 1/speed 发送事件，speed<=0 时不等待
+    每条消息记录两个阶段：dispatch（实际发出时间晚于计划的时间）和 handler（处理耗时）
+    """
+    def __init__(self, events, speed=0.0, stats=None):
+        self.events = events
+        self.speed = speed
+        self.stats = stats or LatencyStats()
+        self.count = 0
+        self.elapsed = 0.0
+        self.now = 0.0      # 回放时钟（秒）：当前消息的行情时间 + 实际发出比计划晚的时间
+
+    def _schedule(self, ts, ts0, wall0):
+        return wall0 + (ts - ts0) / 1000.0 / self.speed
+
+    def run(self, handler):
+        """同步回放，handler(raw) 与 websocket 收到消息后的回调相同"""
+        stats = self.stats
+        perf = time.perf_counter
+        ts0 = None
+        wall0 = perf()
+        for ts, raw in self.events:
+            if ts0 is None:
+                ts0 = ts
+            self.now = ts / 1000.0
+            if self.speed > 0:
+                due = self._schedule(ts, ts0, wall0)
+                delay = due - perf()
+                if delay > 0:
+                    time.sleep(delay)
+                late = max(0.0, perf() - due)
+                stats.record('dispatch', int(late * 1e9))
+                self.now += late
+            t0 = time.perf_counter_ns()
+            handler(raw)
+            stats.record('handler', time.perf_counter_ns() - t0)
+            self.count += 1
+        self.elapsed = perf() - wall0
+        return self
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        """
+        模拟OKX公共WebSocket服务端：客户端发送subscribe后按订阅的频道推送回放数据，
+        ping回复pong；OrderBookRecorder.run(url) 等实盘代码可以直接连上来
+        """
+        import websockets
+
+        # 预先取出每条消息的(频道, instId)，推送时不再解析JSON
+        events = []
+        for ts, raw in self.events:
+            arg = json.loads(raw)['arg']
+            events.append((ts, (arg['channel'], arg['instId']), raw))
+        done = asyncio.get_running_loop().create_future()
+
+        async def session(ws):
+            subscribed = set()
+            first = json.loads(await ws.recv())
+            for arg in first.get('args', []):
+                subscribed.add((arg['channel'], arg['instId']))
+                await ws.send(json.dumps({'event': 'subscribe', 'arg': arg}))
+
+            async def pings():
+                async for raw in ws:
+                    if raw == 'ping':
+                        await ws.send('pong')
+
+            listener = asyncio.ensure_future(pings())
+            loop = asyncio.get_running_loop()
+            ts0 = events[0][0] if events else 0
+            wall0 = loop.time()
+            try:
+                for ts, key, raw in events:
+                    if key not in subscribed:
+                        continue
+                    if self.speed > 0:
+                        delay = wall0 + (ts - ts0) / 1000.0 / self.speed - loop.time()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    t0 = time.perf_counter_ns()
+                    await ws.send(raw)
+                    self.stats.record('send', time.perf_counter_ns() - t0)
+                    self.count += 1
+            finally:
+                listener.cancel()
+                if not done.done():
+                    done.set_result(None)
+
+        async with websockets.serve(session, host, port):
+            print(f"回放服务已启动: ws://{host}:{port}，共 {len(events)} 条消息")
+            await done
+
+
+class CandlePipeline:
+    """
+    实盘K线链路：解析candle推送，已完结的K线交给 fast_engine.Engine.on_bar（增量指标 + 策略）
+    阶段耗时：decode（JSON解析）、on_bar（指标和策略）
+    metrics为metrics.Registry时同时记录 K线收盘到收到推送的延迟、K线到策略信号的耗时
+    """
+    def __init__(self, engine, inst_id, stats=None, metrics=None, clock=time.time):
+        self.engine = engine
+        self.inst_id = inst_id
+        self.stats = stats or LatencyStats()
+        self.bars = 0
+        self.clock = clock
+        self.feed_lag = self.bar_to_signal = None
+        if metrics is not None:
+            self.feed_lag = metrics.gauge('okx_feed_lag_seconds', 'K线收盘到收到推送的延迟', inst=inst_id)
+            self.bar_to_signal = metrics.histogram('okx_bar_to_signal_seconds', 'K线到策略信号（指标+next）的耗时',
+                                                   inst=inst_id)
+
+    def handle_message(self, raw):
+        stats = self.stats
+        t0 = time.perf_counter_ns()
+        msg = json.loads(raw)
+        arg = msg.get('arg', {})
+        t1 = time.perf_counter_ns()
+        stats.record('decode', t1 - t0)
+        if arg.get('instId') != self.inst_id or not arg.get('channel', '').startswith('candle'):
+            return
+        for row in msg['data']:
+            if row[8] != '1':
+                continue
+            t2 = time.perf_counter_ns()
+            self.engine.on_bar(int(row[0]), float(row[1]), float(row[2]), float(row[3]),
+                               float(row[4]), float(row[5]))
+            self.bars += 1
+            if self.bar_to_signal is not None:
+                self.bar_to_signal.observe_ns(time.perf_counter_ns() - t2)
+                self.feed_lag.set(self.clock() - (int(row[0]) / 1000.0 + bar_seconds(arg['channel'])))
+        stats.record('on_bar', time.perf_counter_ns() - t1)
+
+
+def live_engine(inst_id, strategy_cls=None, risk=None, cash=100000.0, slippage=0.001, **params):
+    """
+    实盘链路上的fast_engine引擎（资金费、滑点、合约取整与回测相同），已setup、等待on_bar
+    strategy_cls默认为不打印日志的FastHigherLowStrategy
+    """
+    import fast_engine as fe
+    from funding import FundingSchedule, SwapFees
+    from instruments import get_instrument
+
+    if strategy_cls is None:
+        from higher_low_fast import FastHigherLowStrategy
+        strategy_cls = type('QuietHigherLowStrategy', (FastHigherLowStrategy,),
+                            {'log': lambda self, txt, dt=None: None})
+    params.setdefault('instrument', get_instrument(inst_id, auto_refresh=False))
+    engine = fe.Engine(cash=cash)
+    engine.broker.addcommissioninfo(SwapFees(funding=FundingSchedule.from_store(inst_id)))
+    engine.broker.set_slippage_perc(slippage)
+    if risk is not None:
+        engine.broker.set_risk(risk, inst_id)
+    engine.setup(strategy_cls, fe.DataFeed(name=inst_id), **params)
+    return engine
+
+
+def replay_strategy(inst_id, start, end, speed=0.0, strategy_cls=None, risk=None, metrics=None,
+                    channels=('candle',), **params):
+    """
+    用回放数据驱动实盘链路上的HigherLowStrategy（fast_engine逐根增量模式）
+    channels中的trades/books5消息同样经过解析（计入decode耗时），策略只处理K线
+    risk为risk_engine.RiskEngine时订单先经过下单前风控，metrics为metrics.Registry时记录运行指标
+    返回 (engine, replayer)，replayer.stats 中是各阶段的耗时
+    """
+    engine = live_engine(inst_id, strategy_cls, risk, **params)
+
+    replayer = Replayer(load_events([inst_id], start, end, channels=channels), speed=speed)
+    if metrics is not None:
+        from metrics import instrument_engine
+        instrument_engine(engine, metrics, inst_id)
+        # 回放时以当前回放到的K线时间为时钟，推送延迟反映回放调度的延迟
+        clock = lambda: replayer.now
+    else:
+        clock = time.time
+    pipeline = CandlePipeline(engine, inst_id, replayer.stats, metrics, clock)
+    replayer.run(pipeline.handle_message)
+    engine.strategy.stop()
+    return engine, replayer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按OKX WebSocket格式回放本地历史数据')
+    parser.add_argument('--inst', default='DOGE-USDT-SWAP')
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', required=True)
+    parser.add_argument('--speed', type=float, default=0.0, help='回放倍速，0为尽快')
+    parser.add_argument('--channels', nargs='+', default=['candle'], help='candle / trades / books5')
+    parser.add_argument('--serve', type=int, default=None, metavar='PORT', help='作为WebSocket服务端回放')
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help='在 http://127.0.0.1:PORT/metrics 暴露运行指标')
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        events = load_events([args.inst], args.start, args.end, channels=args.channels)
+        replayer = Replayer(events, speed=args.speed)
+        asyncio.run(replayer.serve(port=args.serve))
+        replayer.stats.report()
+        return 0
+
+    registry = None
+    if args.metrics_port is not None:
+        from metrics import Registry, serve
+        registry = Registry()
+        serve(registry, port=args.metrics_port)
+        print(f"指标: http://127.0.0.1:{args.metrics_port}/metrics")
+    engine, replayer = replay_strategy(args.inst, args.start, args.end, speed=args.speed, metrics=registry,
+                                       channels=args.channels)
+    print(f"回放 {replayer.count} 条消息，耗时 {replayer.elapsed:.2f}秒，"
+          f"{replayer.count / max(replayer.elapsed, 1e-9):.0f} 条/秒")
+    print(f"最终资金: {engine.broker.getvalue():.2f}，最大回撤: {engine.max_drawdown():.2f}%")
+    replayer.stats.report()
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+下单前风控：位于策略和broker之间，每笔订单提交前用内存中的状态检查
+    最大持仓（币数量，含未成交挂单）
+    单品种最大名义价值（USDT）
+    下单频率（令牌桶，per秒内最多max_orders笔）
+    价格带（预计成交价相对标记价格的偏离）
+    熔断开关（手动kill，或权益从峰值回撤超过max_drawdown时自动触发），熔断后只允许减仓
+减仓订单（平仓、止损、移动止损）总是放行，不受价格带和频率限制，也不消耗下单令牌。
+检查只有几次比较和浮点运算（单笔约1-2微秒），结果计入counters供监控读取。
+用法（fast_engine）:
+    risk = RiskEngine({'DOGE-USDT-SWAP': RiskLimits(max_notional=50000, max_orders=10, per=60)})
+    engine.broker.set_risk(risk, 'DOGE-USDT-SWAP')
+    risk.update_mark('DOGE-USDT-SWAP', 0.1401)       # 标记价格频道推送时调用
+未通过的订单状态为Rejected，order.info['risk']为原因，在下一根K线通过notify_order通知策略（与backtrader相同）
+"""
+import time
+
+# 拒单原因，同时是counters中的键名
+REASONS = ('killed', 'position', 'notional', 'rate', 'price_band')
+
+
+class RiskLimits:
+    """单个品种的限额，None为不限制"""
+    __slots__ = ('max_position', 'max_notional', 'max_orders', 'per', 'price_band', 'max_drawdown')
+
+    def __init__(self, max_position=None, max_notional=None, max_orders=None, per=1.0,
+                 price_band=None, max_drawdown=None):
+        self.max_position = max_position    # 币数量
+        self.max_notional = max_notional    # 持仓名义价值 USDT
+        self.max_orders = max_orders        # per秒内最多下单笔数
+        self.per = per
+        self.price_band = price_band        # 例如0.02：预计成交价偏离标记价格超过2%拒单
+        self.max_drawdown = max_drawdown    # 例如0.2：权益从峰值回撤20%触发熔断
+
+    def __repr__(self):
+        items = ', '.join(f'{k}={getattr(self, k)}' for k in self.__slots__ if getattr(self, k) is not None)
+        return f"RiskLimits({items})"
+
+
+class _Bucket:
+    """非阻塞令牌桶：与okx_rest.TokenBucket相同的补充方式，但没有令牌时直接返回False"""
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, per, now):
+        self.capacity = float(capacity)
+        self.rate = capacity / per
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def take(self, now):
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.updated = now
+        if tokens > self.capacity:
+            tokens = self.capacity
+        if tokens < 1.0:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1.0
+        return True
+
+
+class RiskEngine:
+    """
+    limits:  {instId: RiskLimits}
+    default: 没有单独设置的品种使用的限额
+    clock:   返回秒的时钟，默认time.monotonic；回测/回放可以传入K线时间，使频率限制按行情时间计算
+    """
+    def __init__(self, limits=None, default=None, clock=time.monotonic):
+        self.limits = dict(limits or {})
+        self.default = default or RiskLimits()
+        self.clock = clock
+        self.marks = {}
+        self.buckets = {}
+        self.peak = {}
+        self.killed = None      # 熔断原因，None为正常
+        self.counters = dict.fromkeys(('checked', 'passed', 'reducing') + REASONS, 0)
+
+    def limits_for(self, inst_id):
+        return self.limits.get(inst_id, self.default)
+
+    def update_mark(self, inst_id, price):
+        self.marks[inst_id] = price
+
+    def kill(self, reason='manual'):
+        """熔断：之后只允许减仓的订单"""
+        self.killed = reason
+
+    def reset(self):
+        self.killed = None
+
+    def check(self, inst_id, size, price, position=0.0, pending=0.0, equity=None, now=None):
+        """
+        检查一笔订单，通过返回None，否则返回拒单原因（REASONS之一）
+        size为带方向的币数量，price为预计成交价，position/pending为当前持仓和未成交挂单的数量
+        """
+        counters = self.counters
+        counters['checked'] += 1
+        lim = self.limits.get(inst_id, self.default)
+        exposure = position + pending
+        after = exposure + size
+        reducing = abs(after) < abs(exposure) and (after == 0 or (after > 0) == (exposure > 0))
+
+        if equity is not None and lim.max_drawdown is not None:
+            peak = self.peak.get(inst_id, equity)
+            if equity > peak:
+                peak = equity
+            self.peak[inst_id] = peak
+            if self.killed is None and equity < peak * (1 - lim.max_drawdown):
+                self.killed = f'drawdown {inst_id}'
+        if reducing:
+            # 减仓总是放行，否则风控会挡住止损
+            counters['passed'] += 1
+            counters['reducing'] += 1
+            return None
+        if self.killed is not None:
+            return self._reject('killed')
+        if lim.max_position is not None and abs(after) > lim.max_position:
+            return self._reject('position')
+        if lim.max_notional is not None and abs(after) * price > lim.max_notional:
+            return self._reject('notional')
+        if lim.price_band is not None:
+            mark = self.marks.get(inst_id)
+            if mark and abs(price - mark) > mark * lim.price_band:
+                return self._reject('price_band')
+        if lim.max_orders is not None:
+            now = self.clock() if now is None else now
+            bucket = self.buckets.get(inst_id)
+            if bucket is None:
+                bucket = self.buckets[inst_id] = _Bucket(lim.max_orders, lim.per, now)
+            if not bucket.take(now):
+                return self._reject('rate')
+        counters['passed'] += 1
+        return None
+
+    def _reject(self, reason):
+        self.counters[reason] += 1
+        return reason
+
+    def check_order(self, broker, order, inst_id):
+        """fast_engine订单的检查：按上一根收盘价估计市价单成交价，挂单计入敞口"""
+        price = order.owner.data.close[0]
+        pending = 0.0
+        for o in broker.pending:
+            pending += o.size
+        return self.check(inst_id, order.size, price, broker.position.size, pending, broker.value)
+
+    def snapshot(self):
+        """监控用：计数器、熔断状态、各品种标记价格"""
+        return {'counters': dict(self.counters), 'killed': self.killed, 'marks': dict(self.marks)}
+
+
+def bar_clock(feed):
+    """以K线时间为时钟（秒），回测中频率限制按行情时间计算"""
+    ts = feed.datetime.array
+    return lambda: ts[feed.idx] / 1000.0
+
+
+if __name__ == "__main__":
+    import fast_engine as fe
+    from candle_store import CandleStore
+    from higher_low_fast import FastHigherLowStrategy
+    from instruments import get_instrument
+
+    inst_id = 'DOGE-USDT-SWAP'
+    risk = RiskEngine({inst_id: RiskLimits(max_notional=60000, max_orders=2, per=3600, price_band=0.02)})
+    n = 200000
+    t0 = time.perf_counter()
+    for k in range(n):
+        risk.check(inst_id, 1000.0, 0.14, position=0.0, now=k * 10.0)
+    per_check = (time.perf_counter() - t0) / n * 1e6
+    print(f"单笔检查耗时: {per_check:.2f}微秒")
+
+    # 令牌用完后开仓被拒，平仓照常通过
+    risk = RiskEngine({inst_id: RiskLimits(max_orders=1, per=60, price_band=0.02)})
+    risk.update_mark(inst_id, 0.14)
+    opens = [risk.check(inst_id, 1000.0, 0.14, now=0.0) for _ in range(2)]
+    close = risk.check(inst_id, -1000.0, 0.15, position=1000.0, now=0.0)
+    print(f"连续开仓: {opens}，价格带外平仓: {close}")
+
+    df = CandleStore().load_frame(inst_id, '20220411', '20220430')
+    feed = fe.DataFeed.from_dataframe(df)
+    risk = RiskEngine({inst_id: RiskLimits(max_notional=60000, max_orders=1, per=7200)}, clock=bar_clock(feed))
+    engine = fe.Engine(cash=100000.0)
+    engine.broker.set_slippage_perc(0.001)
+    engine.broker.set_risk(risk, inst_id)
+    quiet = type('QuietHigherLowStrategy', (FastHigherLowStrategy,), {'log': lambda self, txt, dt=None: None})
+    engine.run(quiet, feed=feed, instrument=get_instrument(inst_id, auto_refresh=False))
+    print(f"最终资金: {engine.broker.getvalue():.2f}")
+    print(f"风控计数: {risk.snapshot()['counters']}")
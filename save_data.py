@@ -1,11 +1,5 @@
-import okx.MarketData as MarketData
-
-flag = "0"  # 实盘:0 , 模拟盘：1
-
-marketDataAPI =  MarketData.MarketAPI(flag=flag)
+from okx_rest import get_client
 
 # 获取标记价格K线数据
-result = marketDataAPI.get_mark_price_candlesticks(
-    instId="BTC-USDT-SWAP"
-)
-print(result)
\ No newline at end of file
+result = get_client().get_mark_price_candles(inst_id="BTC-USDT-SWAP")
+print(result)
@@ -0,0 +1,243 @@
+"""
+按时间分段的并行回测（fast_engine）
+把K线切成若干段，每段前面加一段只更新指标/关键点、不下单的预热数据，各段在不同进程中运行，
+最后把权益曲线和成交拼接起来。
+
+策略是路径相关的（段首的持仓、关键点、潜在入场点取决于之前的全部历史），所以拼接时：
+    每段都多跑 overlap 根K线，在边界之后逐根比较前一段和后一段的策略状态（boundary_state），
+    找到第一根两边都空仓且状态完全相同的K线，在那里切换——之后两段的走势完全一致；
+    overlap 内始终没有收敛（例如边界处持有仓位一直没平）的边界，从前一段在边界处写的断点
+    顺序重跑下一段，结果与不分段完全相同。
+各段初始资金相同，拼接时按切换点的权益比例缩放后一段（下单数量与资金成正比，合约张数取整会带来极小差别）。
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import fast_engine as fe
+from checkpoint import load_checkpoint, restore, save_checkpoint
+
+
+def warmup_bars(strategy_cls, params, mult=10):
+    """预热长度：最长指标周期的mult倍（Wilder ATR等递推指标和关键点需要比周期更长的历史）"""
+    feed = fe.DataFeed(capacity=1)
+    engine = fe.Engine()
+    engine.setup(strategy_cls, feed, **params)
+    return engine.minperiod * mult
+
+
+def _shard_class(strategy_cls):
+    """在 trade_start 之前屏蔽下单，并记录成交"""
+    class ShardStrategy(strategy_cls):
+        def buy(self, size):
+            if self.data.idx < self._trade_start:
+                return None
+            return super(ShardStrategy, self).buy(size)
+
+        def sell(self, size):
+            if self.data.idx < self._trade_start:
+                return None
+            return super(ShardStrategy, self).sell(size)
+
+        def close(self):
+            if self.data.idx < self._trade_start:
+                return None
+            return super(ShardStrategy, self).close()
+
+        def notify_order(self, order):
+            if order.status == order.Completed:
+                ex = order.executed
+                self._fills.append((self.data.idx + self._offset, ex.size, ex.price, ex.comm))
+            super(ShardStrategy, self).notify_order(order)
+
+        def log(self, txt, dt=None):
+            pass
+
+    ShardStrategy.__name__ = strategy_cls.__name__
+    return ShardStrategy
+
+
+def _new_engine(inst_id, cash, slippage):
+    from funding import FundingSchedule, SwapFees
+
+    engine = fe.Engine(cash=cash)
+    engine.broker.addcommissioninfo(SwapFees(funding=FundingSchedule.from_store(inst_id)))
+    engine.broker.set_slippage_perc(slippage)
+    return engine
+
+
+def run_shard(task):
+    """
+    运行一段（进程池任务）。task中的位置都是全局K线序号：
+        offset:      本段数据第一根的全局序号
+        trade_start: 从这根开始允许下单（之前为预热）
+        boundary:    本段负责到这根为止（不含），在此写断点供重跑使用
+        stop:        实际运行到这根为止（boundary + overlap，用于寻找拼接点）
+        resume:      断点文件，设置时不预热，直接从断点继续（顺序重跑）
+    """
+    strategy_cls = _shard_class(task['strategy_cls'])
+    offset = task['offset']
+    ts, o, h, l, c, v = task['arrays']
+    feed = fe.DataFeed.from_arrays(ts, o, h, l, c, v)
+    engine = _new_engine(task['inst_id'], task['cash'], task['slippage'])
+    strat = engine.setup(strategy_cls, feed, **task['params'])
+    strat._offset = offset
+    strat._trade_start = task['trade_start'] - offset
+    strat._fills = []
+    for ind in feed.indicators:
+        ind.compute(feed.size)
+
+    start = 0
+    if task.get('resume'):
+        start = restore(engine, load_checkpoint(task['resume']))
+        strat._fills = []
+    trade_start = task['trade_start'] - offset
+    boundary = task['boundary'] - offset
+    stop = task['stop'] - offset
+    overlap = task['overlap']
+    head, tail = [], []
+    for i in range(start, stop):
+        engine._step(i)
+        if trade_start <= i < trade_start + overlap:
+            head.append(strat.boundary_state(offset))
+        if i >= boundary - 1:
+            tail.append(strat.boundary_state(offset))
+        if i == boundary - 1 and task.get('checkpoint'):
+            save_checkpoint(engine, task['checkpoint'])
+    first = max(start, trade_start)
+    return {
+        'index': task['index'],
+        'offset': offset,
+        'first': first + offset,
+        'equity': engine.equity[first:stop].copy(),
+        'fills': strat._fills,
+        'head': head,
+        'tail': tail,       # tail[j] 是全局第 boundary-1+j 根之后的状态
+        'checkpoint': task.get('checkpoint'),
+    }
+
+
+def _flat(state):
+    return not state[0] and not state[1]
+
+
+def find_stitch(prev, nxt, boundary):
+    """前一段的tail与后一段的head逐根比较，返回切换点（全局序号，该根及之前用前一段），没有返回None"""
+    for j, state in enumerate(prev['tail'][1:]):
+        k = j   # head[k] 是全局第 boundary+k 根之后的状态
+        if k >= len(nxt['head']):
+            break
+        if _flat(state) and state == nxt['head'][k]:
+            return boundary + k
+    return None
+
+
+def sharded_backtest(df, strategy_cls=None, inst_id='DOGE-USDT-SWAP', shards=None, workers=None,
+                     warmup=None, overlap=None, cash=100000.0, slippage=0.001, **params):
+    """
+    分段并行回测，返回 dict:
+        equity:     拼接后的全局权益曲线（与不分段时的engine.equity对应）
+        fills:      [(全局K线序号, 数量, 价格, 手续费)]
+        boundaries: 每个边界的处理结果 [(边界, 切换点或None, 方式)]，方式为 'stitch' 或 'rerun'
+    """
+    from instruments import get_instrument
+
+    if strategy_cls is None:
+        from higher_low_fast import FastHigherLowStrategy
+        strategy_cls = FastHigherLowStrategy
+    params.setdefault('instrument', get_instrument(inst_id, auto_refresh=False))
+    n = len(df)
+    shards = shards or os.cpu_count() or 1
+    warmup = warmup if warmup is not None else warmup_bars(strategy_cls, params)
+    overlap = overlap if overlap is not None else max(warmup, n // shards // 4)
+    ts = df['datetime'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    cols = [ts] + [df[c].to_numpy(dtype=np.float64) for c in ('open', 'high', 'low', 'close', 'vol')]
+    bounds = np.linspace(0, n, shards + 1).astype(int)
+    tmpdir = tempfile.mkdtemp(prefix='shards_')
+
+    def make_task(k, offset, trade_start, resume=None):
+        boundary = int(bounds[k + 1])
+        stop = min(n, boundary + overlap) if k < shards - 1 else n
+        return {
+            'index': k, 'strategy_cls': strategy_cls, 'inst_id': inst_id, 'cash': cash,
+            'slippage': slippage, 'params': params, 'offset': offset, 'trade_start': trade_start,
+            'boundary': boundary, 'stop': stop, 'overlap': overlap, 'resume': resume,
+            'arrays': [col[offset:stop] for col in cols],
+            'checkpoint': os.path.join(tmpdir, f'shard{k}.pkl') if k < shards - 1 else None,
+        }
+
+    tasks = [make_task(k, max(0, int(bounds[k]) - warmup), int(bounds[k])) for k in range(shards)]
+    if workers == 1 or shards == 1:
+        results = [run_shard(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_shard, tasks))
+
+    equity = np.full(n, np.nan)
+    fills = []
+    report = []
+    scale = 1.0
+    cur = results[0]
+    cut = None          # 当前段从这根之后开始使用（None为从头）
+    for k in range(shards):
+        boundary = int(bounds[k + 1])
+        if k < shards - 1:
+            nxt = results[k + 1]
+            switch = find_stitch(cur, nxt, boundary)
+            how = 'stitch'
+            if switch is None:
+                # 没有收敛：从当前段在边界处的断点顺序重跑下一段
+                task = make_task(k + 1, cur['offset'], cur['first'], resume=cur['checkpoint'])
+                nxt = run_shard(task)
+                switch = boundary - 1
+                how = 'rerun'
+            report.append((boundary, switch, how))
+        else:
+            switch = n - 1
+        lo = cur['first'] if cut is None else cut + 1
+        seg = cur['equity'][lo - cur['first']:switch + 1 - cur['first']]
+        equity[lo:switch + 1] = seg * scale
+        fills.extend((i, size * scale, price, comm * scale) for i, size, price, comm in cur['fills']
+                     if lo <= i <= switch)
+        if k < shards - 1:
+            if how == 'stitch':
+                # 后一段在切换点的权益换算到拼接曲线的尺度
+                scale = equity[switch] / nxt['equity'][switch - nxt['first']]
+            cut = switch
+            cur = nxt
+    for k in range(shards - 1):
+        path = os.path.join(tmpdir, f'shard{k}.pkl')
+        if os.path.exists(path):
+            os.remove(path)
+    os.rmdir(tmpdir)
+    return {'equity': equity, 'fills': fills, 'boundaries': report, 'warmup': warmup, 'overlap': overlap}
+
+
+def max_drawdown(equity):
+    equity = equity[~np.isnan(equity)]
+    if not len(equity):
+        return 0.0
+    peak = np.maximum.accumulate(equity)
+    return float(((peak - equity) / peak).max() * 100)
+
+
+if __name__ == "__main__":
+    from candle_store import CandleStore
+    from higher_low_fast import run_fast_backtest
+
+    df = CandleStore().load_frame('DOGE-USDT-SWAP', '20220411', '20220830')
+    t0 = time.perf_counter()
+    engine, _, _ = run_fast_backtest(df)
+    serial = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    result = sharded_backtest(df, shards=8)
+    parallel = time.perf_counter() - t0
+    equity = result['equity']
+    print(f"K线数: {len(df)}，预热: {result['warmup']}，重叠: {result['overlap']}")
+    print(f"单进程: {serial:.2f}秒，最终资金 {engine.broker.getvalue():.2f}，最大回撤 {engine.max_drawdown():.2f}%")
+    print(f"分段:   {parallel:.2f}秒，最终资金 {equity[-1]:.2f}，最大回撤 {max_drawdown(equity):.2f}%")
+    for boundary, switch, how in result['boundaries']:
+        print(f"  边界 {boundary}: {'拼接于' if how == 'stitch' else '顺序重跑，起点'} {switch}")
@@ -0,0 +1,200 @@
+"""
+合成行情生成器：离线压力测试用的1分钟K线
+几何布朗运动 + 泊松跳跃 + 马尔可夫切换的波动率状态，全部向量化、按块生成，
+同样的 seed 和 chunk 得到完全相同的数据；输出为 CandleStore 的目录结构
+    python synthetic_data.py --inst SYN1-USDT-SWAP SYN2-USDT-SWAP --start 20200101 --days 1095
+    python synthetic_data.py --inst SYN-USDT-SWAP --start 20200101 --days 70000 --format npy   # 1亿根
+"""
+import argparse
+import os
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from candle_store import CANDLE_DTYPE, CandleStore, parse_date
+
+BAR_MS = 60000
+DAY_MS = 86400000
+MINUTES_PER_YEAR = 365 * 24 * 60
+EPOCH = datetime(1970, 1, 1)
+
+
+def _to_ms(date):
+    """日期按UTC转为毫秒时间戳（与CandleStore读取CSV时的处理一致）"""
+    return int((parse_date(date) - EPOCH).total_seconds() * 1000)
+
+
+class SyntheticMarket:
+    """
+    参数（按年化给出，内部换算到每根K线）:
+        price:        起始价格
+        drift:        年化漂移
+        vol:          年化波动率（正常状态）
+        regime_mult:  各波动率状态相对vol的倍数，默认 低/正常/高
+        regime_bars:  各状态平均持续K线数（持续时间服从几何分布）
+        jump_rate:    每年平均跳跃次数
+        jump_std:     跳跃幅度（对数收益率标准差）
+    """
+    def __init__(self, seed=0, price=0.15, drift=0.0, vol=0.8, regime_mult=(0.5, 1.0, 2.5),
+                 regime_bars=(2880, 4320, 720), jump_rate=20.0, jump_std=0.03,
+                 volume=1e5, bar_ms=BAR_MS):
+        self.rng = np.random.default_rng(seed)
+        self.price = float(price)
+        self.bar_ms = bar_ms
+        bars_per_year = MINUTES_PER_YEAR * 60000 / bar_ms
+        self.sigma = vol / np.sqrt(bars_per_year)
+        self.mu = drift / bars_per_year
+        self.regime_mult = np.asarray(regime_mult, dtype=np.float64)
+        self.regime_bars = np.asarray(regime_bars, dtype=np.float64)
+        self.jump_prob = jump_rate / bars_per_year
+        self.jump_std = jump_std
+        self.volume = volume
+        # 跨块延续的状态
+        self.regime = 1
+        self.regime_left = 0
+
+    def _regimes(self, n):
+        """马尔可夫切换的状态序列：先抽持续时间，再np.repeat展开"""
+        rng = self.rng
+        k = len(self.regime_mult)
+        states, lengths = [], []
+        total = 0
+        if self.regime_left > 0:
+            states.append(self.regime)
+            lengths.append(self.regime_left)
+            total = self.regime_left
+        state = self.regime
+        while total < n:
+            # 一次抽一批，平均持续时间最短的状态决定批量大小
+            m = int((n - total) / self.regime_bars.min()) + 8
+            jumps = rng.integers(1, k, m)
+            seq = (state + np.cumsum(jumps)) % k
+            dur = rng.geometric(1.0 / self.regime_bars[seq])
+            states.extend(seq.tolist())
+            lengths.extend(dur.tolist())
+            total += int(dur.sum())
+            state = int(seq[-1])
+        lengths = np.asarray(lengths)
+        ends = np.cumsum(lengths)
+        last = int(np.searchsorted(ends, n))     # 第n根所在的状态段
+        self.regime = states[last]
+        self.regime_left = int(ends[last] - n)
+        return np.repeat(np.asarray(states[:last + 1], dtype=np.int8), lengths[:last + 1])[:n]
+
+    def generate(self, n, start_ms):
+        """生成n根K线（CANDLE_DTYPE），从start_ms开始，价格接着上一块的收盘价"""
+        rng = self.rng
+        regime = self._regimes(n)
+        sigma = self.sigma * self.regime_mult[regime]
+        ret = self.mu - 0.5 * sigma ** 2 + sigma * rng.standard_normal(n)
+        jumps = rng.random(n) < self.jump_prob
+        ret[jumps] += rng.normal(0.0, self.jump_std, int(jumps.sum()))
+        log_close = np.log(self.price) + np.cumsum(ret)
+        close = np.exp(log_close)
+        open_ = np.empty(n)
+        open_[0] = self.price
+        open_[1:] = close[:-1]
+        # K线内的最高/最低价：在开收盘价之外再加上与当前波动率成比例的影线
+        noise = rng.standard_normal((3, n))
+        wick = np.abs(noise[:2]) * sigma * 0.5
+        arr = np.empty(n, dtype=CANDLE_DTYPE)
+        arr['ts'] = start_ms + np.arange(n, dtype=np.int64) * self.bar_ms
+        arr['open'] = open_
+        arr['close'] = close
+        arr['high'] = np.maximum(open_, close) * np.exp(wick[0])
+        arr['low'] = np.minimum(open_, close) * np.exp(-wick[1])
+        # 成交量随波动放大
+        arr['vol'] = np.round(self.volume * (0.2 + np.abs(ret) / self.sigma) * np.exp(0.5 * noise[2]))
+        self.price = float(close[-1])
+        return arr
+
+    def chunks(self, n, start_ms, chunk=1_000_000):
+        """按块生成，内存占用与总K线数无关"""
+        done = 0
+        while done < n:
+            size = min(chunk, n - done)
+            yield self.generate(size, start_ms + done * self.bar_ms)
+            done += size
+
+
+def generate(n, seed=0, start='20220101', **params):
+    """一次生成n根K线，返回CANDLE_DTYPE结构化数组"""
+    return SyntheticMarket(seed=seed, **params).generate(n, _to_ms(start))
+
+
+def generate_frame(n, seed=0, start='20220101', **params):
+    """与generate相同，返回回测用的DataFrame（datetime, open, high, low, close, vol）"""
+    import pandas as pd
+
+    arr = generate(n, seed, start, **params)
+    df = pd.DataFrame({col: arr[col] for col in ('open', 'high', 'low', 'close', 'vol')})
+    df.insert(0, 'datetime', pd.to_datetime(arr['ts'], unit='ms'))
+    return df
+
+
+def _write_csv(path, arr):
+    """按项目CSV格式写一天的数据（datetime,open,high,low,close,vol）"""
+    stamps = np.datetime_as_string(arr['ts'].astype('datetime64[ms]'), unit='s')
+    stamps = np.char.replace(stamps, 'T', ' ')
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('datetime,open,high,low,close,vol\n')
+        np.savetxt(f, np.column_stack([stamps] + [np.char.mod('%.10g', arr[c])
+                                                  for c in ('open', 'high', 'low', 'close', 'vol')]),
+                   fmt='%s', delimiter=',')
+
+
+def write_store(inst_id, start, days, seed=None, store=None, fmt='csv', chunk_days=365, **params):
+    """
+    生成 days 天的1分钟K线写入CandleStore目录，每天一个文件
+    fmt='csv' 写CSV（同时写.npy缓存），fmt='npy' 只写列式的.npy（CandleStore同样可以读取）
+    seed 默认由instId决定，不同品种的数据互不相同且可复现
+    返回写入的K线数
+    """
+    store = store or CandleStore()
+    if seed is None:
+        seed = zlib.crc32(inst_id.encode())
+    bars_per_day = DAY_MS // BAR_MS
+    market = SyntheticMarket(seed=seed, **params)
+    folder = store.folder(inst_id)
+    os.makedirs(folder, exist_ok=True)
+    start_ms = _to_ms(start)
+    total = 0
+    for block in market.chunks(days * bars_per_day, start_ms, chunk=chunk_days * bars_per_day):
+        for day in block.reshape(-1, bars_per_day):
+            date_str = time.strftime('%Y%m%d', time.gmtime(int(day['ts'][0]) // 1000))
+            path = store.path(inst_id, date_str)
+            if fmt == 'csv':
+                _write_csv(path, day)
+            np.save(path[:-4] + '.npy', day)
+            total += len(day)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成合成1分钟K线')
+    parser.add_argument('--inst', nargs='+', default=['SYN-USDT-SWAP'])
+    parser.add_argument('--start', default='20200101')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--root', default='data')
+    parser.add_argument('--format', choices=('csv', 'npy'), default='csv')
+    parser.add_argument('--price', type=float, default=0.15)
+    parser.add_argument('--vol', type=float, default=0.8, help='年化波动率')
+    parser.add_argument('--jump-rate', type=float, default=20.0, help='每年平均跳跃次数')
+    args = parser.parse_args(argv)
+
+    store = CandleStore(args.root)
+    for k, inst_id in enumerate(args.inst):
+        seed = None if args.seed is None else args.seed + k
+        t0 = time.perf_counter()
+        n = write_store(inst_id, args.start, args.days, seed=seed, store=store, fmt=args.format,
+                        price=args.price, vol=args.vol, jump_rate=args.jump_rate)
+        elapsed = time.perf_counter() - t0
+        print(f"{inst_id}: {n} 根K线写入 {store.folder(inst_id)}，耗时 {elapsed:.1f}秒 "
+              f"({n / elapsed:,.0f} 根/秒)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+编译内核与backtrader版HigherLowStrategy逐笔一致（使用 data/doge1m 下的本地K线）
+    python -m pytest -q test_higher_low_kernel.py
+"""
+import os
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+import pytest
+
+from higher_low_kernel import bt_bollinger_bands, check_equivalence, detector_bands
+from higher_low_strategy1_1 import BollingerBands
+from pivot_detector import PivotDetector
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA = os.path.join(ROOT, 'data', 'doge1m')
+
+PARAM_SETS = [
+    {},
+    dict(n_period=20, min_gap=5, bounce_thresh=0.002, wait_bars=1),
+    dict(n_period=30, std_multiplier=1.5, min_gap=8, wait_bars=0, bounce_thresh=0.001,
+         trailing_stop=0.02, atr_thresh=0.5),
+]
+
+pytestmark = pytest.mark.skipif(not os.path.isdir(DATA), reason='没有本地DOGE 1分钟K线')
+
+
+def load_days(first=None, last=None):
+    """与higher_low_kernel.__main__相同的读取方式：日文件CSV合并后按时间排序"""
+    files = sorted(f for f in os.listdir(DATA) if f.endswith('.csv'))[first:last]
+    df = pd.concat([pd.read_csv(os.path.join(DATA, f)) for f in files], ignore_index=True)
+    df['datetime'] = pd.to_datetime(df['datetime'])
+    return df.sort_values('datetime').reset_index(drop=True)
+
+
+@pytest.fixture(autouse=True)
+def in_repo(monkeypatch):
+    # 资金费率等按相对路径读取
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture(scope='module')
+def month():
+    return load_days(40, 60)
+
+
+@pytest.mark.parametrize('period,devfactor', [(20, 2.0), (40, 2.0), (30, 1.5)])
+def test_bands_match_strategy(month, period, devfactor):
+    close = month['close'].to_numpy()
+
+    class Bands(bt.Strategy):
+        def __init__(self):
+            self.boll = BollingerBands(self.data, period=period, devfactor=devfactor)
+
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.addstrategy(Bands)
+    cerebro.adddata(bt.feeds.PandasData(dataname=month, datetime='datetime', volume='vol',
+                                        openinterest=None))
+    boll = cerebro.run()[0].boll
+    ma, upper, lower = bt_bollinger_bands(close, period, devfactor)
+    assert np.array_equal(np.asarray(boll.ma.array), ma, equal_nan=True)
+    assert np.array_equal(np.asarray(boll.upper.array), upper, equal_nan=True)
+    assert np.array_equal(np.asarray(boll.lower.array), lower, equal_nan=True)
+
+    detector = PivotDetector(period, devfactor)
+    expected = []
+    for h, lo, c in zip(month['high'], month['low'], close):
+        detector.update(h, lo, c)
+        expected.append((detector.upper, detector.lower))
+    upper, lower = detector_bands(close, period, devfactor)
+    assert np.array_equal(np.column_stack((upper, lower)), np.array(expected), equal_nan=True)
+
+
+@pytest.mark.parametrize('params', PARAM_SETS)
+def test_kernel_matches_backtrader(month, params):
+    assert check_equivalence(month, **params)
+
+
+def test_kernel_matches_backtrader_full_history():
+    # 全部198000根K线上曾在第82877根因入场布林带末位不同而分叉
+    assert check_equivalence(load_days(), **PARAM_SETS[1])
@@ -0,0 +1,220 @@
+"""
+本地K线的时间索引：按时间范围读取，不依赖文件名、不解析无关日期
+每个品种/周期一个索引文件 data/<币种小写><周期>/<instId>.tidx.npz，记录
+    每个日文件(.npy)的 首末时间戳、行数
+    每个日文件内每隔 STRIDE 行的时间戳（稀疏采样）
+读取 [start, end) 时：二分找到时间上重叠的日文件 -> 在采样中二分缩小到 STRIDE 行 ->
+对内存映射的 .npy 再二分得到行号 -> 每个文件只读一段连续的行。
+日文件或其CSV有变化时自动重建索引。
+    python time_index.py --inst DOGE-USDT-SWAP --start "2022-04-28 10:00" --end "2022-04-29 02:30"
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from candle_store import CANDLE_DTYPE, CandleStore
+
+STRIDE = 256
+INDEX_VERSION = 1
+
+
+def to_ms(value):
+    """毫秒时间戳 / '20220428' / '2022-04-28 10:00' / datetime 统一转成毫秒时间戳（UTC，与CandleStore一致）"""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(pd.Timestamp(value).to_datetime64().astype('datetime64[ms]').astype(np.int64))
+
+
+class TimeIndex:
+    def __init__(self, inst_id, store=None):
+        self.inst_id = inst_id
+        store = store or CandleStore()
+        # 索引建立在 .npy 日文件上，始终打开缓存
+        self.store = store if store.cache else CandleStore(store.root, store.bar)
+        self.path = os.path.join(self.store.folder(inst_id), f'{inst_id}.tidx.npz')
+        self._index = None
+
+    def _stats(self, dates):
+        """各日文件的 (.npy修改时间, CSV修改时间)，用于判断索引是否过期"""
+        stats = np.zeros((len(dates), 2), dtype=np.int64)
+        for k, date_str in enumerate(dates):
+            csv_path = self.store.path(self.inst_id, date_str)
+            npy_path = csv_path[:-4] + '.npy'
+            if os.path.exists(npy_path):
+                stats[k, 0] = os.stat(npy_path).st_mtime_ns
+            if os.path.exists(csv_path):
+                stats[k, 1] = os.stat(csv_path).st_mtime_ns
+        return stats
+
+    def _fresh(self, index, dates, stats):
+        return (int(index['version']) == INDEX_VERSION and list(index['dates']) == dates
+                and np.array_equal(index['stats'], stats)
+                and bool(np.all(stats[:, 0] >= stats[:, 1])))
+
+    def build(self):
+        """为全部日文件建立索引（缺少或过期的 .npy 先从CSV生成）"""
+        dates = self.store.dates(self.inst_id)
+        first, last, rows, ordered = [], [], [], []
+        samples, sample_start = [], [0]
+        for date_str in dates:
+            self.store.read_day(self.inst_id, date_str)
+            ts = self._mmap(date_str)['ts']
+            n = len(ts)
+            rows.append(n)
+            first.append(ts[0] if n else 0)
+            last.append(ts[-1] if n else -1)
+            ordered.append(bool(np.all(np.diff(ts) >= 0)))
+            samples.append(np.asarray(ts[::STRIDE], dtype=np.int64))
+            sample_start.append(sample_start[-1] + len(samples[-1]))
+        index = {
+            'version': np.int64(INDEX_VERSION),
+            'dates': np.array(dates, dtype=str),
+            'stats': self._stats(dates),
+            'first_ts': np.array(first, dtype=np.int64),
+            'last_ts': np.array(last, dtype=np.int64),
+            'rows': np.array(rows, dtype=np.int64),
+            'ordered': np.array(ordered, dtype=bool),
+            'samples': np.concatenate(samples) if samples else np.zeros(0, dtype=np.int64),
+            'sample_start': np.array(sample_start, dtype=np.int64),
+        }
+        tmp = self.path[:-4] + '.tmp.npz'
+        np.savez(tmp, **index)
+        os.replace(tmp, self.path)
+        self._index = self._with_bounds(index)
+        return self._index
+
+    @staticmethod
+    def _with_bounds(index):
+        # 日文件之间时间有重叠（相邻两天首尾约一小时），用前缀最大/后缀最小把首末时间变成单调的，便于二分
+        last = index['last_ts']
+        first = index['first_ts']
+        index['last_max'] = np.maximum.accumulate(last) if len(last) else last
+        index['first_min'] = np.minimum.accumulate(first[::-1])[::-1] if len(first) else first
+        return index
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self.load_index()
+        return self._index
+
+    def load_index(self):
+        """读取索引，不存在或过期时重建"""
+        if os.path.exists(self.path):
+            dates = self.store.dates(self.inst_id)
+            with np.load(self.path) as f:
+                index = {k: f[k] for k in f.files}
+            if self._fresh(index, dates, self._stats(dates)):
+                return self._with_bounds(index)
+        return self.build()
+
+    def _mmap(self, date_str):
+        return np.load(self.store.path(self.inst_id, date_str)[:-4] + '.npy', mmap_mode='r')
+
+    def _row(self, k, ts, t):
+        """第k个日文件中第一根时间戳 >= t 的行号"""
+        index = self.index
+        samples = index['samples'][index['sample_start'][k]:index['sample_start'][k + 1]]
+        j = int(np.searchsorted(samples, t, 'left'))
+        lo = max(j - 1, 0) * STRIDE
+        hi = min(j * STRIDE + 1, len(ts))
+        return lo + int(np.searchsorted(ts[lo:hi], t, 'left'))
+
+    def files(self, start_ms, end_ms):
+        """与 [start_ms, end_ms) 重叠的日文件序号"""
+        index = self.index
+        lo = int(np.searchsorted(index['last_max'], start_ms, 'left')) if start_ms is not None else 0
+        hi = int(np.searchsorted(index['first_min'], end_ms, 'left')) if end_ms is not None \
+            else len(index['dates'])
+        ks = np.arange(lo, hi)
+        keep = index['rows'][ks] > 0
+        if start_ms is not None:
+            keep &= index['last_ts'][ks] >= start_ms
+        if end_ms is not None:
+            keep &= index['first_ts'][ks] < end_ms
+        return ks[keep].tolist()
+
+    def locate(self, t):
+        """时间戳 -> (日期, 行号)：第一根时间戳 >= t 的K线所在位置，没有返回None"""
+        t = to_ms(t)
+        for k in self.files(t, None):
+            date_str = self.index['dates'][k]
+            row = self._row(k, self._mmap(date_str)['ts'], t)
+            if row < self.index['rows'][k]:
+                return str(date_str), row
+        return None
+
+    def load(self, start=None, end=None):
+        """读取 [start, end) 的K线，按时间排序（与CandleStore.load的合并顺序相同）"""
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        index = self.index
+        parts = []
+        for k in self.files(start_ms, end_ms):
+            arr = self._mmap(index['dates'][k])
+            if index['ordered'][k]:
+                ts = arr['ts']
+                i = self._row(k, ts, start_ms) if start_ms is not None else 0
+                j = self._row(k, ts, end_ms) if end_ms is not None else len(arr)
+                parts.append(np.array(arr[i:j]))
+            else:
+                ts = np.asarray(arr['ts'])
+                mask = np.ones(len(ts), dtype=bool)
+                if start_ms is not None:
+                    mask &= ts >= start_ms
+                if end_ms is not None:
+                    mask &= ts < end_ms
+                parts.append(np.array(arr[mask]))
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        if len(parts) == 1 and index['ordered'].all():
+            return parts[0]
+        arr = np.concatenate(parts)
+        return arr[np.argsort(arr['ts'], kind='stable')]
+
+    def load_frame(self, start=None, end=None):
+        """与load相同，返回回测用的DataFrame（datetime, open, high, low, close, vol）"""
+        arr = self.load(start, end)
+        df = pd.DataFrame({col: arr[col] for col in ('open', 'high', 'low', 'close', 'vol')})
+        df.insert(0, 'datetime', pd.to_datetime(arr['ts'], unit='ms'))
+        return df
+
+
+def load_window(inst_id, start, end, store=None):
+    """按任意时间窗口 [start, end) 读取K线DataFrame"""
+    return TimeIndex(inst_id, store).load_frame(start, end)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='按时间范围读取本地K线')
+    parser.add_argument('--inst', default='DOGE-USDT-SWAP')
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', required=True)
+    parser.add_argument('--root', default='data')
+    parser.add_argument('--rebuild', action='store_true', help='强制重建索引')
+    args = parser.parse_args(argv)
+
+    store = CandleStore(args.root)
+    tindex = TimeIndex(args.inst, store)
+    t0 = time.perf_counter()
+    if args.rebuild:
+        tindex.build()
+    index = tindex.index
+    print(f"索引: {len(index['dates'])} 个日文件，{int(index['rows'].sum())} 根K线，"
+          f"{(time.perf_counter() - t0) * 1000:.1f}毫秒")
+    t0 = time.perf_counter()
+    df = tindex.load_frame(args.start, args.end)
+    elapsed = time.perf_counter() - t0
+    print(f"[{args.start}, {args.end}) 共 {len(df)} 根K线，读取耗时 {elapsed * 1000:.2f}毫秒")
+    if len(df):
+        print(df.head(3).to_string(index=False))
+        print(df.tail(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
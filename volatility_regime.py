@@ -0,0 +1,235 @@
+import hashlib
+import math
+import os
+from collections import deque
+
+import numpy as np
+
+import fast_engine as fe
+
+REGIME_DTYPE = np.dtype([
+    ('atr', 'f8'),       # Wilder ATR（与bt.indicators.ATR相同）
+    ('atr_pct', 'f8'),   # ATR占收盘价的百分比
+    ('rvol', 'f8'),      # 对数收益率的滚动标准差(%)
+    ('regime', 'i1'),    # -1=未知, 0=低波动, 1=正常, 2=高波动
+])
+
+LOW, NORMAL, HIGH, UNKNOWN = 0, 1, 2, -1
+
+DEFAULTS = dict(atr_period=14, vol_window=60, regime_window=1440, low_ratio=0.8, high_ratio=1.25)
+
+
+def _label(ratio, low_ratio, high_ratio):
+    if ratio != ratio:  # nan
+        return UNKNOWN
+    if ratio < low_ratio:
+        return LOW
+    if ratio > high_ratio:
+        return HIGH
+    return NORMAL
+
+
+def _rolling_mean(x, window):
+    """含nan的滚动均值，窗口内有nan时结果为nan"""
+    out = np.full(len(x), np.nan)
+    if len(x) < window:
+        return out
+    valid = ~np.isnan(x)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(valid, x, 0.0))))
+    ccount = np.concatenate(([0], np.cumsum(valid)))
+    s = csum[window:] - csum[:-window]
+    c = ccount[window:] - ccount[:-window]
+    out[window - 1:] = np.where(c == window, s / window, np.nan)
+    return out
+
+
+def wilder_atr(high, low, close, period=14):
+    """Wilder ATR（与bt.indicators.ATR相同），前period根为nan"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    atr = np.full(n, np.nan)
+    p = period
+    if n > p:
+        prev_close = close[:-1]
+        tr = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+        alpha = 1.0 / p
+        alpha1 = 1.0 - alpha
+        value = math.fsum(tr[:p]) / p
+        atr[p] = value
+        # Wilder平滑是递推的，逐个计算（与backtrader的计算顺序相同）
+        for j, x in enumerate(tr[p:].tolist(), start=p + 1):
+            value = value * alpha1 + x * alpha
+            atr[j] = value
+    return atr
+
+
+class AtrState:
+    """Wilder ATR的逐根增量计算，update(high, low, close) 返回当前ATR，与wilder_atr一致"""
+    def __init__(self, period=14):
+        self.period = period
+        self.count = 0
+        self.prev_close = None
+        self.atr = math.nan
+        self._trs = []
+
+    def update(self, high, low, close):
+        self.count += 1
+        p = self.period
+        if self.prev_close is not None:
+            tr = max(high, self.prev_close) - min(low, self.prev_close)
+            if self.count <= p + 1:
+                self._trs.append(tr)
+                if self.count == p + 1:
+                    self.atr = math.fsum(self._trs) / p
+                    self._trs = None
+            else:
+                alpha = 1.0 / p
+                self.atr = self.atr * (1.0 - alpha) + tr * alpha
+        self.prev_close = close
+        return self.atr
+
+
+def compute_regime(high, low, close, atr_period=14, vol_window=60, regime_window=1440,
+                   low_ratio=0.8, high_ratio=1.25):
+    """
+    对整段数据一次性计算波动率状态
+    regime: ATR% 与其 regime_window 根均值之比，低于low_ratio为低波动，高于high_ratio为高波动；
+    只用当前及之前的数据，没有未来函数
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    out = np.empty(n, dtype=REGIME_DTYPE)
+    atr = wilder_atr(high, low, close, atr_period)
+    out['atr'] = atr
+    atr_pct = atr / close * 100
+    out['atr_pct'] = atr_pct
+
+    rvol = np.full(n, np.nan)
+    if n > vol_window:
+        # 滚动方差用累积和计算，不生成 n*vol_window 的中间数组
+        ret = np.diff(np.log(close))
+        ret = ret - ret.mean()   # 去中心化，减小累积和的舍入误差
+        c1 = np.concatenate(([0.0], np.cumsum(ret)))
+        c2 = np.concatenate(([0.0], np.cumsum(ret * ret)))
+        mean = (c1[vol_window:] - c1[:-vol_window]) / vol_window
+        var = (c2[vol_window:] - c2[:-vol_window]) / vol_window - mean * mean
+        rvol[vol_window:] = np.sqrt(np.maximum(var, 0.0)) * 100
+    out['rvol'] = rvol
+
+    ratio = atr_pct / _rolling_mean(atr_pct, regime_window)
+    regime = np.full(n, UNKNOWN, dtype=np.int8)
+    known = ~np.isnan(ratio)
+    regime[known & (ratio < low_ratio)] = LOW
+    regime[known & (ratio > high_ratio)] = HIGH
+    regime[known & (ratio >= low_ratio) & (ratio <= high_ratio)] = NORMAL
+    out['regime'] = regime
+    return out
+
+
+class RegimeState:
+    """
+    逐根K线增量计算，与compute_regime结果一致，供实盘/流式回测使用
+    update(high, low, close) 返回 (atr, atr_pct, rvol, regime)
+    """
+    def __init__(self, atr_period=14, vol_window=60, regime_window=1440, low_ratio=0.8, high_ratio=1.25):
+        self.atr_period = atr_period
+        self.vol_window = vol_window
+        self.regime_window = regime_window
+        self.low_ratio = low_ratio
+        self.high_ratio = high_ratio
+        self.prev_close = None
+        self._atr = AtrState(atr_period)
+        self._rets = deque(maxlen=vol_window)
+        self._pcts = deque(maxlen=regime_window)
+
+    @property
+    def atr(self):
+        return self._atr.atr
+
+    def update(self, high, low, close):
+        atr = self._atr.update(high, low, close)
+        if self.prev_close is not None:
+            self._rets.append(math.log(close / self.prev_close))
+        self.prev_close = close
+
+        atr_pct = atr / close * 100
+        rvol = math.nan
+        if len(self._rets) == self.vol_window:
+            rvol = float(np.std(np.fromiter(self._rets, float, self.vol_window))) * 100
+        self._pcts.append(atr_pct)
+        ratio = math.nan
+        if len(self._pcts) == self.regime_window:
+            base = math.fsum(self._pcts) / self.regime_window
+            ratio = atr_pct / base
+        return atr, atr_pct, rvol, _label(ratio, self.low_ratio, self.high_ratio)
+
+
+def _params_key(params):
+    text = ','.join(f'{k}={params[k]}' for k in sorted(params))
+    return hashlib.md5(text.encode()).hexdigest()[:10]
+
+
+def load_regime(inst_id, start, end, store=None, **params):
+    """
+    读取K线并返回 (candles, regime)
+    计算结果缓存在K线目录下的 regime/ 子目录，K线文件有更新时自动重算
+    """
+    from candle_store import CandleStore, date_range
+
+    store = store or CandleStore()
+    params = dict(DEFAULTS, **params)
+    candles = store.load(inst_id, start, end)
+    folder = os.path.join(store.folder(inst_id), 'regime')
+    cache = os.path.join(folder, f'{inst_id}_{start}_{end}_{_params_key(params)}.npy')
+    sources = [store.path(inst_id, d) for d in date_range(start, end)]
+    newest = max((os.path.getmtime(p) for p in sources if os.path.exists(p)), default=0)
+    if os.path.exists(cache) and os.path.getmtime(cache) >= newest:
+        regime = np.load(cache)
+        if len(regime) == len(candles):
+            return candles, regime
+    regime = compute_regime(candles['high'], candles['low'], candles['close'], **params)
+    os.makedirs(folder, exist_ok=True)
+    np.save(cache, regime)
+    return candles, regime
+
+
+def regime_frame(inst_id, start, end, store=None, **params):
+    """K线和波动率状态合并成一个DataFrame，可直接用于volatility_regime_bt.RegimeData"""
+    import pandas as pd
+
+    candles, regime = load_regime(inst_id, start, end, store, **params)
+    df = pd.DataFrame({col: candles[col] for col in ('open', 'high', 'low', 'close', 'vol')})
+    df.insert(0, 'datetime', pd.to_datetime(candles['ts'], unit='ms'))
+    for col in REGIME_DTYPE.names:
+        df[col] = regime[col]
+    df.attrs['regime_params'] = dict(DEFAULTS, **params)
+    return df
+
+
+class FastVolatilityRegime(fe.Indicator):
+    """fast_engine版：批量回测时compute一次向量化计算，on_bar时用RegimeState增量更新"""
+    lines = REGIME_DTYPE.names
+
+    def __init__(self, feed, **params):
+        self.params = dict(DEFAULTS, **params)
+        self.minperiod = self.params['atr_period'] + 1
+        self._state = None
+        super().__init__(feed)
+
+    def compute(self, n):
+        f = self.feed
+        arr = compute_regime(f.high.array[:n], f.low.array[:n], f.close.array[:n], **self.params)
+        for name in REGIME_DTYPE.names:
+            getattr(self.lines, name).array[:n] = arr[name]
+
+    def update(self, i):
+        if self._state is None:
+            self._state = RegimeState(**self.params)
+        f = self.feed
+        values = self._state.update(f.high.array[i], f.low.array[i], f.close.array[i])
+        for name, value in zip(REGIME_DTYPE.names, values):
+            getattr(self.lines, name).array[i] = value
@@ -0,0 +1,77 @@
+"""
+volatility_regime的backtrader指标和数据源
+单独成模块，fast_engine回测和参数扫描只导入volatility_regime，不加载backtrader
+"""
+from array import array
+
+import backtrader as bt
+import numpy as np
+
+from volatility_regime import DEFAULTS, REGIME_DTYPE, RegimeState, compute_regime
+
+
+class RegimeData(bt.feeds.PandasData):
+    """带预计算波动率列的数据源，VolatilityRegime会直接使用这些列"""
+    lines = REGIME_DTYPE.names
+    params = (
+        ('datetime', 'datetime'),
+        ('volume', 'vol'),
+        ('openinterest', None),
+        ('atr', 'atr'),
+        ('atr_pct', 'atr_pct'),
+        ('rvol', 'rvol'),
+        ('regime', 'regime'),
+    )
+
+
+class VolatilityRegime(bt.Indicator):
+    """
+    ATR / ATR% / 已实现波动率 / 波动率状态
+    runonce模式下整段数据一次性向量化计算（数据源是参数相同的RegimeData时直接复用预计算列），
+    next中只需要读取当前值；非runonce模式（实盘）逐根增量计算
+    """
+    lines = REGIME_DTYPE.names
+    params = tuple(DEFAULTS.items())
+    plotinfo = dict(plot=False)
+
+    def __init__(self):
+        self.addminperiod(self.p.atr_period + 1)
+        self._state = None
+
+    def _precomputed(self):
+        data = self.data
+        df = getattr(data.p, 'dataname', None)
+        if isinstance(data, RegimeData) and getattr(df, 'attrs', {}).get('regime_params') == self.p._getkwargs():
+            return {name: np.asarray(getattr(data.lines, name).array) for name in REGIME_DTYPE.names}
+        d = self.data
+        arr = compute_regime(d.high.array, d.low.array, d.close.array, **self.p._getkwargs())
+        return {name: arr[name] for name in REGIME_DTYPE.names}
+
+    def preonce(self, start, end):
+        self._values = self._precomputed()
+        self._copy(start, end)
+
+    def oncestart(self, start, end):
+        self._copy(start, end)
+
+    def once(self, start, end):
+        self._copy(start, end)
+
+    def _copy(self, start, end):
+        for name in REGIME_DTYPE.names:
+            dst = getattr(self.lines, name).array
+            end = min(end, len(self._values[name]))
+            dst[start:end] = array('d', self._values[name][start:end].astype(np.float64))
+
+    def prenext(self):
+        self.next()
+
+    def next(self):
+        if self._state is None:
+            self._state = RegimeState(**self.p._getkwargs())
+        atr, atr_pct, rvol, regime = self._state.update(self.data.high[0], self.data.low[0],
+                                                        self.data.close[0])
+        self.lines.atr[0] = atr
+        self.lines.atr_pct[0] = atr_pct
+        self.lines.rvol[0] = rvol
+        self.lines.regime[0] = regime